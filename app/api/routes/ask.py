@@ -1,9 +1,11 @@
 import time
 import logging
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, model_validator
 from fastapi import APIRouter, Request
-from typing import Optional
-from app.retrieval.retrieve import run_retrieval
+from typing import Annotated, Optional
+from app.retrieval.query_cache import cached_retrieval
+from app.retrieval.retrieve import run_retrieval_batch
+from app.retrieval.filters import SearchFilters
 from app.core.config import settings
 
 router = APIRouter()
@@ -15,7 +17,23 @@ def _clean_excerpt(text: str, max_chars: int = 420) -> str:
     if len(t) > max_chars:
         t = t[:max_chars].rstrip() + "…"
     return t
-class AskRequest(BaseModel):
+class FilterFields(BaseModel):
+    # optional metadata filters, applied inside the index search
+    sources: Optional[list[str]] = Field(default=None, max_length=1000)
+    doc_type: Optional[str] = Field(default=None, max_length=32)
+    page_min: Optional[int] = Field(default=None, ge=0)
+    page_max: Optional[int] = Field(default=None, ge=0)
+
+    @model_validator(mode="after")
+    def _check_page_range(self):
+        if self.page_min is not None and self.page_max is not None and self.page_min > self.page_max:
+            raise ValueError("page_min must be <= page_max")
+        return self
+
+    def to_filters(self) -> Optional[SearchFilters]:
+        return SearchFilters.build(self.sources, self.doc_type, self.page_min, self.page_max)
+
+class AskRequest(FilterFields):
     question: str = Field(min_length=1, max_length=4000)
 
 class AskResponse(BaseModel):
@@ -27,7 +45,7 @@ class AskResponse(BaseModel):
     debug: Optional[dict] = None
     abstained: bool
 
-class SearchRequest(BaseModel):
+class SearchRequest(FilterFields):
     query: str = Field(min_length=1, max_length=4000)
 
 class SearchHit(BaseModel):
@@ -43,30 +61,77 @@ class SearchResponse(BaseModel):
     latency_ms: float
     debug: Optional[dict] = None
 
+class SearchBatchRequest(FilterFields):
+    queries: list[Annotated[str, Field(min_length=1, max_length=4000)]] = Field(
+        min_length=1, max_length=settings.search_batch_max_queries
+    )
+
+class SearchBatchResult(BaseModel):
+    query: str
+    hits: list[SearchHit]
+    abstained: bool
+    debug: Optional[dict] = None
+
+class SearchBatchResponse(BaseModel):
+    results: list[SearchBatchResult]
+    request_id: str
+    latency_ms: float
+    timings_ms: Optional[dict] = None
+
+def _to_hits(rows: list[dict]) -> list[SearchHit]:
+    return [
+        SearchHit(
+            source=r.get("source"),
+            page=r.get("page"),
+            chunk_id=r.get("chunk_id"),
+            score=r.get("_score"),
+            text=_clean_excerpt(r.get("text", ""), max_chars=1200),
+        )
+        for r in rows
+    ]
+
 @router.post("/search", response_model=SearchResponse)
 def search_endpoint(payload: SearchRequest, request: Request):
     request_id = getattr(request.state, "request_id", "-")
 
-    rows, dbg, latency_ms = run_retrieval(payload.query)
-
-    hits = []
-    for r in rows:
-        hits.append(
-            SearchHit(
-                source=r.get("source"),
-                page=r.get("page"),
-                chunk_id=r.get("chunk_id"),
-                score=r.get("_score"),
-                text=_clean_excerpt(r.get("text", ""), max_chars=1200),
-            )
-        )
+    rows, dbg, latency_ms = cached_retrieval(payload.query, payload.to_filters())
 
     return SearchResponse(
-        hits=hits,
+        hits=_to_hits(rows),
         request_id=request_id,
         latency_ms=latency_ms,
         debug = dbg if settings.debug_rag else None,
     )
+
+@router.post("/search/batch", response_model=SearchBatchResponse)
+def search_batch_endpoint(payload: SearchBatchRequest, request: Request):
+    # one encode, one index.search and one DB round-trip for all queries;
+    # each result is what /search would return for that query
+    request_id = getattr(request.state, "request_id", "-")
+
+    results, timings = run_retrieval_batch(payload.queries, filters=payload.to_filters())
+
+    logger.info(
+        "search_batch queries=%d latency_ms=%.1f",
+        len(payload.queries),
+        timings["total"],
+        extra={"request_id": request_id},
+    )
+
+    return SearchBatchResponse(
+        results=[
+            SearchBatchResult(
+                query=q,
+                hits=_to_hits(rows),
+                abstained=not rows,
+                debug=dbg if settings.debug_rag else None,
+            )
+            for q, (rows, dbg) in zip(payload.queries, results)
+        ],
+        request_id=request_id,
+        latency_ms=timings["total"],
+        timings_ms=timings if settings.debug_rag else None,
+    )
 @router.post("/ask", response_model=AskResponse)
 def ask(payload: AskRequest, request: Request):
     request_id = getattr(request.state, "request_id", "-")
@@ -77,7 +142,7 @@ def ask(payload: AskRequest, request: Request):
         extra={"request_id": request_id},
     )
 
-    rows, dbg, latency_ms = run_retrieval(payload.question)
+    rows, dbg, latency_ms = cached_retrieval(payload.question, payload.to_filters())
 
     if not rows:
         return AskResponse(
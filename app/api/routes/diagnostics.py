@@ -0,0 +1,35 @@
+import os
+from fastapi import APIRouter
+
+from app.core.config import settings
+from app.core.procmem import file_mapping_memory, process_memory
+from app.retrieval.index_store import get_batcher, load_index_bundle
+
+router = APIRouter()
+
+
+@router.get("/diagnostics")
+def diagnostics():
+    b = load_index_bundle()
+    mapping = file_mapping_memory(b.path) if b.path else None
+    batcher = get_batcher()
+    return {
+        "pid": os.getpid(),
+        "process": process_memory(),
+        "index": {
+            "version": b.version,
+            "path": b.path,
+            "load_mode": b.load_mode,
+            "index_type": b.meta.get("index_type", "flat"),
+            "num_vectors": int(b.index.ntotal),
+            "file_bytes": os.path.getsize(b.path) if b.path and os.path.exists(b.path) else None,
+            # None => the index lives in this process' private heap
+            "mmap": mapping,
+            "mmap_effective": mapping is not None,
+        },
+        "retrieval_mode": settings.retrieval_mode,
+        "query_cache_enabled": settings.query_cache_enabled,
+        "chunk_store": {"num_chunks": len(b.chunks), "bytes": b.chunks.nbytes()} if b.chunks is not None else None,
+        # batch-size distribution of the query micro-batcher (None when disabled)
+        "batching": batcher.stats() if batcher is not None else None,
+    }
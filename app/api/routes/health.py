@@ -1,4 +1,7 @@
 from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+
+from app.core.readiness import readiness
 
 router = APIRouter()
 
@@ -6,3 +9,19 @@ router = APIRouter()
 @router.get("/health")
 def health():
     return {"status": "ok"}
+
+
+@router.get("/health/live")
+def health_live():
+    # the process is up and serving HTTP (may still be loading). 503 once a
+    # background startup gave up, so the liveness probe restarts the worker
+    if readiness.is_failed():
+        return JSONResponse({"status": "failed", "error": readiness.error}, status_code=503)
+    return {"status": "ok"}
+
+
+@router.get("/health/ready")
+def health_ready():
+    # 200 only once the model and index are loaded and warmed up
+    snap = readiness.snapshot()
+    return JSONResponse(snap, status_code=200 if snap["status"] == "ready" else 503)
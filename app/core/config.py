@@ -16,20 +16,107 @@ class Settings(BaseSettings):
     database_url: str = Field(alias="DATABASE_URL")
     redis_url: str = Field(alias="REDIS_URL")
 
+    # Postgres connection pool (psycopg_pool)
+    db_pool_min_size: int = Field(default=1, alias="DB_POOL_MIN_SIZE")
+    db_pool_max_size: int = Field(default=10, alias="DB_POOL_MAX_SIZE")
+    db_pool_max_lifetime_s: float = Field(default=1800.0, alias="DB_POOL_MAX_LIFETIME_S")
+    db_pool_max_idle_s: float = Field(default=300.0, alias="DB_POOL_MAX_IDLE_S")
+    db_pool_timeout_s: float = Field(default=10.0, alias="DB_POOL_TIMEOUT_S")
+
     # RAG / Retrieval settings
     embedding_model_name: str = Field(
         default="sentence-transformers/all-MiniLM-L6-v2",
         alias="EMBEDDING_MODEL_NAME",
     )
     index_dir: str = Field(default="data/index", alias="INDEX_DIR")
+    # memory: private copy per process | mmap: share IVF lists via the page cache
+    index_load_mode: str = Field(default="memory", alias="INDEX_LOAD_MODE")
+    # versioned publishing / hot reload
+    index_keep_versions: int = Field(default=3, alias="INDEX_KEEP_VERSIONS")
+    index_reload_interval_s: float = Field(default=10.0, alias="INDEX_RELOAD_INTERVAL_S")
     top_k: int = Field(default=5, alias="TOP_K")
 
+    # Ingest chunking: "chars" (1000/150 character windows) or "tokens" (sized
+    # with the embedding model tokenizer so nothing is truncated at encode time;
+    # CHUNK_MAX_TOKENS is capped by the model max_seq_length)
+    chunking_mode: str = Field(default="chars", alias="CHUNKING_MODE")
+    chunk_max_tokens: int = Field(default=256, alias="CHUNK_MAX_TOKENS")
+    chunk_overlap_tokens: int = Field(default=32, alias="CHUNK_OVERLAP_TOKENS")
+
+    # Near-duplicate chunks at ingest (MinHash/LSH, app/ingest/dedup.py): a chunk
+    # whose estimated Jaccard similarity (word 3-grams) with an existing one is
+    # >= DEDUP_THRESHOLD points at it and gets no vector. Filters still match it
+    # by its own source/doc_type/page (through the canonical's vector); hits
+    # cite the canonical chunk
+    dedup_enabled: bool = Field(default=False, alias="DEDUP_ENABLED")
+    dedup_threshold: float = Field(default=0.8, alias="DEDUP_THRESHOLD")
+
+    # Index build (streaming)
+    build_batch_size: int = Field(default=512, alias="BUILD_BATCH_SIZE")
+    build_checkpoint_every: int = Field(default=20, alias="BUILD_CHECKPOINT_EVERY")
+    embedding_cache_enabled: bool = Field(default=True, alias="EMBEDDING_CACHE_ENABLED")
+
+    # Index type (see app/retrieval/index_factory.py): flat | hnsw | ivf_flat | ivf_pq
+    # | sq_fp16 | sq_int8 | binary_rescore
+    index_type: str = Field(default="flat", alias="INDEX_TYPE")
+    hnsw_m: int = Field(default=32, alias="HNSW_M")
+    hnsw_ef_construction: int = Field(default=200, alias="HNSW_EF_CONSTRUCTION")
+    hnsw_ef_search: int = Field(default=64, alias="HNSW_EF_SEARCH")
+    ivf_nlist: int = Field(default=256, alias="IVF_NLIST")
+    ivf_nprobe: int = Field(default=16, alias="IVF_NPROBE")
+    ivf_train_size: int = Field(default=50_000, alias="IVF_TRAIN_SIZE")
+    pq_m: int = Field(default=48, alias="PQ_M")
+    pq_nbits: int = Field(default=8, alias="PQ_NBITS")
+    # compact storage: sq_fp16 (2 B/dim), sq_int8 (1 B/dim, trained ranges),
+    # binary_rescore (1 bit/dim Hamming search + exact rescoring on fp16)
+    sq_train_size: int = Field(default=50_000, alias="SQ_TRAIN_SIZE")
+    binary_rescore_factor: int = Field(default=10, alias="BINARY_RESCORE_FACTOR")
+
     # NEW: separate thresholds
     min_top_score: float = Field(default=0.80, alias="MIN_TOP_SCORE")
     min_top_score_margin: float = Field(default=0.05, alias="MIN_TOP_SCORE_MARGIN")
     min_row_score: float = Field(default=0.30, alias="MIN_ROW_SCORE")
     min_score_gap: float = Field(default=0.02, alias="MIN_SCORE_GAP")
 
+    # Query result cache (Redis, in-process LRU fallback)
+    query_cache_enabled: bool = Field(default=True, alias="QUERY_CACHE_ENABLED")
+    query_cache_ttl_s: int = Field(default=600, alias="QUERY_CACHE_TTL_S")
+    query_cache_max_entries: int = Field(default=2048, alias="QUERY_CACHE_MAX_ENTRIES")
+    query_cache_max_value_bytes: int = Field(default=256 * 1024, alias="QUERY_CACHE_MAX_VALUE_BYTES")
+    query_cache_redis_timeout_s: float = Field(default=0.05, alias="QUERY_CACHE_REDIS_TIMEOUT_S")
+    query_cache_redis_retry_s: float = Field(default=30.0, alias="QUERY_CACHE_REDIS_RETRY_S")
+
+    # Cross-request micro-batching of query encode + index search
+    query_batching_enabled: bool = Field(default=False, alias="QUERY_BATCHING_ENABLED")
+    query_batch_window_ms: float = Field(default=3.0, alias="QUERY_BATCH_WINDOW_MS")
+    query_batch_max_size: int = Field(default=32, alias="QUERY_BATCH_MAX_SIZE")
+
+    # "blocking": load model + index before serving (default). "background":
+    # serve /health/live immediately and load in a thread; other routes answer
+    # 503 until /health/ready does
+    startup_mode: str = Field(default="blocking", alias="STARTUP_MODE")
+    # background mode: attempts after a failed startup (Postgres not up yet, no
+    # index published, model download), with the delay doubling from
+    # STARTUP_RETRY_BACKOFF_S up to 60s. Then the worker is marked failed and
+    # /health/live answers 503 so the orchestrator restarts it
+    startup_retries: int = Field(default=5, alias="STARTUP_RETRIES")
+    startup_retry_backoff_s: float = Field(default=2.0, alias="STARTUP_RETRY_BACKOFF_S")
+
+    # Embedding backend: "sentence_transformers" (fp32 torch) or "onnx"
+    # (onnxruntime on CPU, exported from the local HF model, optional int8)
+    embedding_backend: str = Field(default="sentence_transformers", alias="EMBEDDING_BACKEND")
+    onnx_quantize: bool = Field(default=False, alias="ONNX_QUANTIZE")
+    onnx_cache_dir: str = Field(default="data/onnx", alias="ONNX_CACHE_DIR")
+    onnx_threads: int = Field(default=0, alias="ONNX_THREADS")  # 0 = onnxruntime default
+    onnx_batch_size: int = Field(default=32, alias="ONNX_BATCH_SIZE")
+
+    # Where hits get text/page/source: "db" (Postgres join) or "local" (chunk
+    # store published with the index; falls back to the DB for older versions)
+    retrieval_mode: str = Field(default="db", alias="RETRIEVAL_MODE")
+
+    # POST /search/batch
+    search_batch_max_queries: int = Field(default=256, alias="SEARCH_BATCH_MAX_QUERIES")
+
     debug_rag: bool = Field(default=False, alias="DEBUG_RAG")
     search_candidates_k: int = Field(default=15, alias="SEARCH_CANDIDATES_K")
     max_citations: int = Field(default=5, alias="MAX_CITATIONS")
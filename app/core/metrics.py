@@ -0,0 +1,85 @@
+import os
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+# Always-on instrumentation, independent of DEBUG_RAG. Observing a histogram is
+# a lock + a few adds, negligible next to an encode.
+# With several uvicorn workers set PROMETHEUS_MULTIPROC_DIR (empty dir, shared
+# by the workers) so /metrics aggregates all of them.
+
+# ms-range buckets: the interesting stages take 0.1 ms .. 1 s
+LATENCY_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+)
+
+STAGE_LATENCY = Histogram(
+    "docassistant_retrieval_stage_seconds",
+    "Retrieval latency per stage: embed, faiss_search, db_fetch, store_fetch, postprocess, total",
+    ["stage"],
+    buckets=LATENCY_BUCKETS,
+)
+
+HTTP_LATENCY = Histogram(
+    "docassistant_http_request_seconds",
+    "End-to-end HTTP latency by route template",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+
+SEARCH_BATCH_SIZE = Histogram(
+    "docassistant_search_batch_size",
+    "Queries per encode + index.search call (micro-batcher and /search/batch)",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256),
+)
+
+ABSTENTIONS = Counter(
+    "docassistant_abstentions_total",
+    "Queries answered with no evidence, by reason",
+    ["reason"],
+)
+
+QUERY_CACHE = Counter(
+    "docassistant_query_cache_total",
+    "Query cache lookups by result",
+    ["result"],
+)
+
+INDEX_LOADED = Gauge(
+    "docassistant_index_loaded",
+    "1 for the index version this worker serves",
+    ["version", "index_type"],
+    multiprocess_mode="liveall",
+)
+
+INDEX_VECTORS = Gauge(
+    "docassistant_index_vectors",
+    "Vectors in the served index",
+    multiprocess_mode="liveall",
+)
+
+
+def observe_stages(timings_ms: dict) -> None:
+    for stage, ms in timings_ms.items():
+        STAGE_LATENCY.labels(stage).observe(ms / 1000)
+
+
+def set_index(version: str, index_type: str, num_vectors: int) -> None:
+    INDEX_LOADED.clear()
+    INDEX_LOADED.labels(version, index_type).set(1)
+    INDEX_VECTORS.set(num_vectors)
+
+
+def render() -> tuple[bytes, str]:
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -5,6 +5,8 @@ from starlette.middleware.base import BaseHTTPMiddleware
 from starlette.requests import Request
 from starlette.responses import Response
 
+from app.core.metrics import HTTP_LATENCY
+
 
 logger = logging.getLogger("app.request")
 
@@ -18,6 +20,10 @@ class RequestIdMiddleware(BaseHTTPMiddleware):
         response: Response = await call_next(request)
         elapsed_ms = (time.perf_counter() - start) * 1000
 
+        # route template ("/search"), not the raw path, to keep label cardinality bounded
+        route = getattr(request.scope.get("route"), "path", "unmatched")
+        HTTP_LATENCY.labels(request.method, route, str(response.status_code)).observe(elapsed_ms / 1000)
+
         # PII-safe: do not log request body; only metadata
         logger.info(
             "handled_request method=%s path=%s status=%s latency_ms=%.2f",
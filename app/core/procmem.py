@@ -0,0 +1,66 @@
+import os
+from typing import Optional
+
+# Linux-only helpers reading /proc/self; they return None elsewhere.
+
+_STATUS_KEYS = {
+    "VmRSS": "rss_bytes",
+    "RssAnon": "rss_anon_bytes",
+    "RssFile": "rss_file_bytes",
+    "RssShmem": "rss_shmem_bytes",
+}
+
+_SMAPS_KEYS = {
+    "Size": "size_bytes",
+    "Rss": "rss_bytes",
+    "Pss": "pss_bytes",
+    "Shared_Clean": "shared_clean_bytes",
+    "Shared_Dirty": "shared_dirty_bytes",
+    "Private_Clean": "private_clean_bytes",
+    "Private_Dirty": "private_dirty_bytes",
+}
+
+
+def process_memory() -> Optional[dict]:
+    try:
+        with open("/proc/self/status", "r", encoding="utf-8") as f:
+            lines = f.readlines()
+    except OSError:
+        return None
+
+    out = {}
+    for line in lines:
+        key, _, rest = line.partition(":")
+        if key in _STATUS_KEYS:
+            out[_STATUS_KEYS[key]] = int(rest.split()[0]) * 1024  # kB
+    return out
+
+
+def file_mapping_memory(path: str) -> Optional[dict]:
+    """
+    Sum /proc/self/smaps counters over every mapping of `path`.
+    Shared_* pages are also mapped by other processes (e.g. other uvicorn workers).
+    Returns None if the file is not mapped (or not on Linux).
+    """
+    target = os.path.realpath(path)
+    try:
+        with open("/proc/self/smaps", "r", encoding="utf-8") as f:
+            lines = f.readlines()
+    except OSError:
+        return None
+
+    totals = {v: 0 for v in _SMAPS_KEYS.values()}
+    mapped = False
+    in_target = False
+    for line in lines:
+        head = line.split(None, 5)
+        # mapping header: "start-end perms offset dev inode [path]"
+        if head and "-" in head[0] and len(head) >= 5 and not head[0].endswith(":"):
+            in_target = len(head) == 6 and head[5].strip() == target
+            mapped = mapped or in_target
+            continue
+        if in_target:
+            key, _, rest = line.partition(":")
+            if key in _SMAPS_KEYS:
+                totals[_SMAPS_KEYS[key]] += int(rest.split()[0]) * 1024
+    return totals if mapped else None
@@ -0,0 +1,68 @@
+import time
+import threading
+from contextlib import contextmanager
+from typing import Optional
+
+# Startup state of this worker, reported by /health/ready. "starting" until the
+# pool, model and index are loaded and warmed up, then "ready" (or "failed").
+# A background startup that is being retried stays "starting", with the last
+# error and the number of failed attempts.
+
+
+class Readiness:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.state = "starting"
+        self.error: Optional[str] = None
+        self.failed_attempts = 0
+        self.phases_ms: dict[str, float] = {}
+        self._t0 = time.perf_counter()
+        self.ready_after_ms: Optional[float] = None
+
+    @contextmanager
+    def phase(self, name: str):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, (time.perf_counter() - t0) * 1000)
+
+    def record(self, name: str, ms: float) -> None:
+        with self._lock:
+            self.phases_ms[name] = ms
+
+    def mark_ready(self) -> None:
+        with self._lock:
+            self.state = "ready"
+            self.error = None
+            self.ready_after_ms = (time.perf_counter() - self._t0) * 1000
+
+    def mark_failed(self, exc: BaseException) -> None:
+        with self._lock:
+            self.state = "failed"
+            self.error = f"{type(exc).__name__}: {exc}"
+            self.failed_attempts += 1
+
+    def mark_retrying(self, exc: BaseException) -> None:
+        with self._lock:
+            self.error = f"{type(exc).__name__}: {exc}"
+            self.failed_attempts += 1
+
+    def is_ready(self) -> bool:
+        return self.state == "ready"
+
+    def is_failed(self) -> bool:
+        return self.state == "failed"
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "status": self.state,
+                "error": self.error,
+                "failed_attempts": self.failed_attempts,
+                "phases_ms": dict(self.phases_ms),
+                "ready_after_ms": self.ready_after_ms,
+            }
+
+
+readiness = Readiness()
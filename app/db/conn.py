@@ -1,8 +1,60 @@
-import psycopg
+import threading
+from psycopg_pool import ConnectionPool
 from app.core.config import settings
 
-def get_conn():
+_pool: ConnectionPool | None = None
+_pool_lock = threading.Lock()
+
+def _dsn() -> str:
     # psycopg v3 uses "postgresql://..." DSN
     # Our DATABASE_URL currently is "postgresql+psycopg://..."
-    dsn = settings.database_url.replace("postgresql+psycopg://", "postgresql://")
-    return psycopg.connect(dsn)
+    return settings.database_url.replace("postgresql+psycopg://", "postgresql://")
+
+def open_pool(wait: bool = False) -> ConnectionPool:
+    """
+    Process-wide pool. The API opens it in `lifespan`; CLIs (ingest, build_index)
+    get it lazily on the first `get_conn()`.
+    """
+    global _pool
+    if _pool is not None:
+        return _pool
+
+    with _pool_lock:
+        if _pool is not None:
+            return _pool
+
+        pool = ConnectionPool(
+            _dsn(),
+            min_size=settings.db_pool_min_size,
+            max_size=settings.db_pool_max_size,
+            max_lifetime=settings.db_pool_max_lifetime_s,
+            max_idle=settings.db_pool_max_idle_s,
+            timeout=settings.db_pool_timeout_s,
+            # health check on checkout: a connection killed by a Postgres restart
+            # is discarded instead of failing the request
+            check=ConnectionPool.check_connection,
+            name="docassistant",
+            open=False,
+        )
+        try:
+            pool.open(wait=wait, timeout=settings.db_pool_timeout_s)
+        except Exception:
+            # Postgres not reachable within the timeout: don't leave the pool's
+            # workers behind, the caller may retry
+            pool.close()
+            raise
+        _pool = pool
+        return _pool
+
+def close_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            return
+        _pool.close()
+        _pool = None
+
+def get_conn():
+    # Context manager: `with get_conn() as conn:` commits on success, rolls back
+    # on error and returns the connection to the pool.
+    return open_pool().connection()
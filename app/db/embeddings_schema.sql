@@ -6,3 +6,14 @@ CREATE TABLE IF NOT EXISTS chunk_embeddings (
 );
 
 CREATE INDEX IF NOT EXISTS idx_chunk_embeddings_model ON chunk_embeddings(model_name);
+
+-- Content-addressed embedding cache: (model, sha256(text)) -> float32 vector bytes.
+-- Survives re-chunking, re-ingestion and chunk/index resets.
+CREATE TABLE IF NOT EXISTS embedding_cache (
+  model_name TEXT NOT NULL,
+  text_sha256 TEXT NOT NULL,
+  dim INT NOT NULL,
+  vector BYTEA NOT NULL,
+  created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+  PRIMARY KEY (model_name, text_sha256)
+);
@@ -1,4 +1,4 @@
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Iterable, Iterator, Optional
 from app.db.conn import get_conn
 
 def fetch_all_chunks() -> List[Dict[str, Any]]:
@@ -23,6 +23,197 @@ def fetch_all_chunks() -> List[Dict[str, Any]]:
         out.append({"chunk_id": chunk_id, "text": text, "page": page, "source": source})
     return out
 
+def iter_chunk_batches(
+    batch_size: int,
+    after_chunk_id: int = 0,
+    missing_for_model: Optional[str] = None,
+    include_duplicates: bool = False,
+) -> Iterator[List[Dict[str, Any]]]:
+    """
+    Stream chunks in chunk_id order through a server-side cursor, batch_size rows
+    at a time, so the caller never holds the whole corpus in memory.
+    after_chunk_id: keyset resume point (exclusive).
+    missing_for_model: only chunks with no chunk_embeddings row for that model.
+    Near-duplicates (canonical_chunk_id set) are skipped, since they get no
+    vector, unless include_duplicates.
+    """
+    sql = "SELECT c.id, c.text FROM chunks c WHERE c.id > %s"
+    if not include_duplicates:
+        sql += " AND c.canonical_chunk_id IS NULL"
+    params: list = [after_chunk_id]
+    if missing_for_model is not None:
+        sql += """
+          AND NOT EXISTS (
+            SELECT 1 FROM chunk_embeddings e
+            WHERE e.chunk_id = c.id AND e.model_name = %s
+          )"""
+        params.append(missing_for_model)
+    sql += " ORDER BY c.id ASC"
+
+    with get_conn() as conn:
+        with conn.cursor(name="iter_chunk_batches") as cur:
+            cur.itersize = batch_size
+            cur.execute(sql, params)
+            while True:
+                rows = cur.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield [{"chunk_id": int(chunk_id), "text": text} for chunk_id, text in rows]
+
+def iter_chunk_rows(batch_size: int) -> Iterator[List[Dict[str, Any]]]:
+    # Same streaming as iter_chunk_batches, plus what a search hit needs
+    # (page, source, doc_type); used to write the local chunk store. Includes
+    # near-duplicates, with canonical_chunk_id, for the store's filter aliases.
+    sql = """
+        SELECT c.id, c.text, c.page, d.source, d.doc_type, c.canonical_chunk_id
+        FROM chunks c
+        JOIN documents d ON d.id = c.document_id
+        ORDER BY c.id ASC
+    """
+    with get_conn() as conn:
+        with conn.cursor(name="iter_chunk_rows") as cur:
+            cur.itersize = batch_size
+            cur.execute(sql)
+            while True:
+                rows = cur.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield [
+                    {
+                        "chunk_id": int(chunk_id),
+                        "text": text,
+                        "page": page,
+                        "source": source,
+                        "doc_type": doc_type,
+                        "canonical_chunk_id": canonical_chunk_id,
+                    }
+                    for chunk_id, text, page, source, doc_type, canonical_chunk_id in rows
+                ]
+
+def fetch_faiss_ids_matching(
+    model_name: str,
+    sources: Optional[List[str]] = None,
+    doc_type: Optional[str] = None,
+    page_min: Optional[int] = None,
+    page_max: Optional[int] = None,
+) -> List[int]:
+    # filtered search for index versions without a chunk store; a
+    # near-duplicate matches with its own metadata through its canonical
+    # chunk's vector
+    sql = """
+        SELECT DISTINCT e.faiss_id
+        FROM chunks c
+        JOIN chunk_embeddings e ON e.chunk_id = COALESCE(c.canonical_chunk_id, c.id)
+        JOIN documents d ON d.id = c.document_id
+        WHERE e.model_name = %s
+    """
+    params: list = [model_name]
+    if sources:
+        sql += " AND d.source = ANY(%s)"
+        params.append(list(sources))
+    if doc_type:
+        sql += " AND d.doc_type = %s"
+        params.append(doc_type)
+    if page_min is not None:
+        sql += " AND c.page >= %s"
+        params.append(page_min)
+    if page_max is not None:
+        sql += " AND c.page <= %s"
+        params.append(page_max)
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute(sql, params)
+            return [int(r[0]) for r in cur.fetchall()]
+
+def count_duplicate_chunks() -> int:
+    # chunks that point at a canonical chunk instead of having a vector
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT count(*) FROM chunks WHERE canonical_chunk_id IS NOT NULL")
+            return int(cur.fetchone()[0])
+
+def fetch_embedded_chunk_ids(model_name: str) -> List[int]:
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                "SELECT chunk_id FROM chunk_embeddings WHERE model_name = %s ORDER BY chunk_id",
+                (model_name,),
+            )
+            return [int(r[0]) for r in cur.fetchall()]
+
+def bulk_upsert_chunk_embeddings(
+    conn,
+    chunk_ids: Iterable[int],
+    model_name: str,
+    dim: int,
+    replace_all: bool = False,
+) -> int:
+    """
+    COPY chunk_id -> faiss_id pairs (faiss_id == chunk_id) into a staging table and
+    merge them into chunk_embeddings with one INSERT ... ON CONFLICT.
+    Runs on the caller's connection so it can share a transaction with publishing
+    the index. replace_all: drop every existing mapping first (full rebuild).
+    Returns the number of rows merged.
+    """
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            CREATE TEMP TABLE IF NOT EXISTS chunk_embeddings_stage (
+              chunk_id BIGINT NOT NULL,
+              faiss_id BIGINT NOT NULL
+            ) ON COMMIT DELETE ROWS
+            """
+        )
+        with cur.copy("COPY chunk_embeddings_stage (chunk_id, faiss_id) FROM STDIN") as copy:
+            for chunk_id in chunk_ids:
+                copy.write_row((chunk_id, chunk_id))
+
+        if replace_all:
+            cur.execute("DELETE FROM chunk_embeddings")
+
+        # the JOIN skips chunks deleted while the build was running
+        cur.execute(
+            """
+            INSERT INTO chunk_embeddings (chunk_id, model_name, dim, faiss_id)
+            SELECT s.chunk_id, %s, %s, s.faiss_id
+            FROM chunk_embeddings_stage s
+            JOIN chunks c ON c.id = s.chunk_id
+            ON CONFLICT (chunk_id) DO UPDATE
+            SET model_name=EXCLUDED.model_name, dim=EXCLUDED.dim, faiss_id=EXCLUDED.faiss_id
+            """,
+            (model_name, dim),
+        )
+        return cur.rowcount
+
+def fetch_cached_embeddings(model_name: str, digests: List[str]) -> Dict[str, bytes]:
+    if not digests:
+        return {}
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                SELECT text_sha256, vector
+                FROM embedding_cache
+                WHERE model_name = %s AND text_sha256 = ANY(%s)
+                """,
+                (model_name, digests),
+            )
+            return {digest: bytes(vec) for digest, vec in cur.fetchall()}
+
+def store_cached_embeddings(model_name: str, dim: int, items: Dict[str, bytes]) -> None:
+    if not items:
+        return
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            cur.executemany(
+                """
+                INSERT INTO embedding_cache (model_name, text_sha256, dim, vector)
+                VALUES (%s, %s, %s, %s)
+                ON CONFLICT (model_name, text_sha256) DO NOTHING
+                """,
+                [(model_name, digest, dim, vec) for digest, vec in items.items()],
+            )
+
 def upsert_chunk_embedding(chunk_id: int, model_name: str, dim: int, faiss_id: int) -> None:
     with get_conn() as conn:
         with conn.cursor() as cur:
@@ -36,10 +227,10 @@ def upsert_chunk_embedding(chunk_id: int, model_name: str, dim: int, faiss_id: i
                 (chunk_id, model_name, dim, faiss_id),
             )
 
-def fetch_chunks_by_faiss_ids(faiss_ids: List[int], model_name: str) -> List[Dict[str, Any]]:
-    # keep order of faiss_ids
+def fetch_chunk_map_by_faiss_ids(faiss_ids: List[int], model_name: str) -> Dict[int, Dict[str, Any]]:
+    # faiss_id -> chunk row, in one round-trip (batch retrieval passes the union of ids)
     if not faiss_ids:
-        return []
+        return {}
     with get_conn() as conn:
         with conn.cursor() as cur:
             cur.execute(
@@ -55,7 +246,7 @@ def fetch_chunks_by_faiss_ids(faiss_ids: List[int], model_name: str) -> List[Dic
                 JOIN documents d ON d.id = c.document_id
                 WHERE e.model_name = %s AND e.faiss_id = ANY(%s)
                 """,
-                (model_name, faiss_ids),
+                (model_name, list(faiss_ids)),
             )
             rows = cur.fetchall()
 
@@ -68,5 +259,10 @@ def fetch_chunks_by_faiss_ids(faiss_ids: List[int], model_name: str) -> List[Dic
             "page": page,
             "source": source,
         }
+    return by_faiss
+
 
+def fetch_chunks_by_faiss_ids(faiss_ids: List[int], model_name: str) -> List[Dict[str, Any]]:
+    # keep order of faiss_ids
+    by_faiss = fetch_chunk_map_by_faiss_ids(faiss_ids, model_name)
     return [by_faiss[fid] for fid in faiss_ids if fid in by_faiss]
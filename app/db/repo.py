@@ -1,4 +1,4 @@
-from typing import Optional
+from typing import Iterable, Optional
 from app.db.conn import get_conn
 
 def upsert_document(source: str, doc_type: str, sha256: str, bytes_size: int) -> int:
@@ -35,3 +35,206 @@ def insert_chunk(document_id: int, chunk_index: int, page: Optional[int], char_s
                 """,
                 (document_id, chunk_index, page, char_start, char_end, text),
             )
+
+def fetch_ingested_documents() -> set[tuple[str, str]]:
+    # (source, sha256) of documents whose chunks are fully committed
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT source, sha256 FROM documents WHERE ingested_at IS NOT NULL")
+            return {(source, sha256) for source, sha256 in cur.fetchall()}
+
+def write_document_chunks(
+    source: str,
+    doc_type: str,
+    sha256: str,
+    bytes_size: int,
+    chunks: Iterable[dict],
+    repoint: Optional[dict[int, tuple[Optional[int], Optional[int]]]] = None,
+) -> tuple[int, int, int]:
+    """
+    Upsert the document and stream all its chunks with COPY, in a single
+    transaction. Older versions of the same source (other sha256) are deleted
+    in that transaction; their chunks and chunk_embeddings go with them (CASCADE).
+    chunks: dicts with {chunk_index, page, char_start, char_end, text}, plus from
+    near-duplicate detection minhash + buckets (registered in chunk_minhash)
+    and, for duplicates, canonical_chunk_id (an existing chunk) or
+    canonical_index (an earlier chunk of this document).
+    repoint: canonical chunk of a replaced version -> (chunk_index, chunk_id)
+    its duplicates move to (see dedup.match_replaced). Duplicates of replaced
+    chunks without a match get one of them promoted to canonical, so dedup
+    survives the delete instead of falling back to ON DELETE SET NULL.
+    Returns (document_id, chunks_inserted, versions_replaced).
+    """
+    with get_conn() as conn:
+        with conn.transaction():
+            with conn.cursor() as cur:
+                cur.execute(
+                    """
+                    INSERT INTO documents (source, doc_type, sha256, bytes)
+                    VALUES (%s, %s, %s, %s)
+                    ON CONFLICT (source, sha256) DO UPDATE SET bytes = EXCLUDED.bytes
+                    RETURNING id
+                    """,
+                    (source, doc_type, sha256, bytes_size),
+                )
+                doc_id = cur.fetchone()[0]
+
+                # COPY can't do ON CONFLICT, so stage first and merge once
+                cur.execute(
+                    """
+                    CREATE TEMP TABLE IF NOT EXISTS chunks_stage (
+                      chunk_index INT NOT NULL,
+                      page INT NULL,
+                      char_start INT NOT NULL,
+                      char_end INT NOT NULL,
+                      text TEXT NOT NULL,
+                      canonical_chunk_id BIGINT NULL,
+                      canonical_index INT NULL,
+                      signature BYTEA NULL,
+                      buckets BIGINT[] NULL
+                    ) ON COMMIT DELETE ROWS
+                    """
+                )
+                with cur.copy(
+                    """
+                    COPY chunks_stage (chunk_index, page, char_start, char_end, text,
+                                       canonical_chunk_id, canonical_index, signature, buckets)
+                    FROM STDIN
+                    """
+                ) as copy:
+                    for ch in chunks:
+                        buckets = ch.get("buckets")
+                        copy.write_row((
+                            ch["chunk_index"], ch["page"], ch["char_start"], ch["char_end"], ch["text"],
+                            ch.get("canonical_chunk_id"), ch.get("canonical_index"),
+                            ch["minhash"].tobytes() if buckets else None, buckets,
+                        ))
+
+                cur.execute(
+                    """
+                    INSERT INTO chunks (document_id, chunk_index, page, char_start, char_end, text, canonical_chunk_id)
+                    SELECT %s, chunk_index, page, char_start, char_end, text, canonical_chunk_id
+                    FROM chunks_stage
+                    ORDER BY chunk_index
+                    ON CONFLICT (document_id, chunk_index) DO NOTHING
+                    """,
+                    (doc_id,),
+                )
+                inserted = cur.rowcount
+
+                # duplicates of an earlier chunk of this same document, whose id
+                # only exists now
+                cur.execute(
+                    """
+                    UPDATE chunks c SET canonical_chunk_id = src.id
+                    FROM chunks_stage s
+                    JOIN chunks src ON src.document_id = %s AND src.chunk_index = s.canonical_index
+                    WHERE c.document_id = %s AND c.chunk_index = s.chunk_index
+                      AND s.canonical_index IS NOT NULL AND c.canonical_chunk_id IS NULL
+                    """,
+                    (doc_id, doc_id),
+                )
+                cur.execute(
+                    """
+                    INSERT INTO chunk_minhash (chunk_id, signature, buckets)
+                    SELECT c.id, s.signature, s.buckets
+                    FROM chunks_stage s
+                    JOIN chunks c ON c.document_id = %s AND c.chunk_index = s.chunk_index
+                    WHERE s.signature IS NOT NULL
+                    ON CONFLICT (chunk_id) DO NOTHING
+                    """,
+                    (doc_id,),
+                )
+
+                if repoint:
+                    cur.execute(
+                        """
+                        CREATE TEMP TABLE IF NOT EXISTS chunks_repoint (
+                          old_chunk_id BIGINT NOT NULL,
+                          chunk_index INT NULL,
+                          chunk_id BIGINT NULL
+                        ) ON COMMIT DELETE ROWS
+                        """
+                    )
+                    with cur.copy("COPY chunks_repoint (old_chunk_id, chunk_index, chunk_id) FROM STDIN") as copy:
+                        for old_id, (chunk_index, chunk_id) in repoint.items():
+                            copy.write_row((old_id, chunk_index, chunk_id))
+                    cur.execute(
+                        """
+                        UPDATE chunks d SET canonical_chunk_id = COALESCE(r.chunk_id, n.id)
+                        FROM chunks_repoint r
+                        LEFT JOIN chunks n ON n.document_id = %s AND n.chunk_index = r.chunk_index
+                        WHERE d.canonical_chunk_id = r.old_chunk_id
+                          AND COALESCE(r.chunk_id, n.id) IS NOT NULL
+                        """,
+                        (doc_id,),
+                    )
+
+                # duplicates (in other sources) still pointing at a chunk that is
+                # about to be deleted: the lowest id becomes canonical, the rest
+                # point at it
+                cur.execute(
+                    """
+                    WITH orphans AS (
+                      SELECT d.id, d.canonical_chunk_id AS old_id
+                      FROM chunks d
+                      JOIN documents dd ON dd.id = d.document_id
+                      JOIN chunks o ON o.id = d.canonical_chunk_id
+                      JOIN documents od ON od.id = o.document_id
+                      WHERE od.source = %s AND od.id <> %s AND dd.source <> %s
+                    ),
+                    heads AS (
+                      SELECT old_id, min(id) AS head FROM orphans GROUP BY old_id
+                    )
+                    UPDATE chunks c SET canonical_chunk_id = NULLIF(h.head, c.id)
+                    FROM orphans o
+                    JOIN heads h ON h.old_id = o.old_id
+                    WHERE c.id = o.id
+                    """,
+                    (source, doc_id, source),
+                )
+
+                cur.execute("UPDATE documents SET ingested_at = now() WHERE id = %s", (doc_id,))
+                cur.execute("DELETE FROM documents WHERE source = %s AND id <> %s", (source, doc_id))
+                replaced = cur.rowcount
+    return doc_id, inserted, replaced
+
+def fetch_minhash_candidates(buckets: list[int], exclude_source: str) -> list[tuple[int, bytes]]:
+    """
+    (chunk_id, signature) of canonical chunks sharing at least one LSH bucket,
+    outside `exclude_source` (its previous versions are about to be replaced).
+    Duplicates have signatures too but are never candidates.
+    """
+    if not buckets:
+        return []
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                SELECT m.chunk_id, m.signature
+                FROM chunk_minhash m
+                JOIN chunks c ON c.id = m.chunk_id
+                JOIN documents d ON d.id = c.document_id
+                WHERE m.buckets && %s::bigint[] AND d.source <> %s AND c.canonical_chunk_id IS NULL
+                """,
+                (buckets, exclude_source),
+            )
+            return [(int(chunk_id), bytes(sig)) for chunk_id, sig in cur.fetchall()]
+
+def fetch_replaced_canonicals(source: str, sha256: str) -> list[tuple[int, bytes]]:
+    # (chunk_id, signature) of canonical chunks in other versions of `source`
+    # that duplicates elsewhere point at
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                SELECT o.id, m.signature
+                FROM chunks o
+                JOIN documents od ON od.id = o.document_id
+                JOIN chunk_minhash m ON m.chunk_id = o.id
+                WHERE od.source = %s AND od.sha256 <> %s
+                  AND EXISTS (SELECT 1 FROM chunks d WHERE d.canonical_chunk_id = o.id)
+                """,
+                (source, sha256),
+            )
+            return [(int(chunk_id), bytes(sig)) for chunk_id, sig in cur.fetchall()]
@@ -5,9 +5,13 @@ CREATE TABLE IF NOT EXISTS documents (
   sha256 TEXT NOT NULL,
   bytes BIGINT NOT NULL,
   created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+  ingested_at TIMESTAMPTZ NULL,    -- set once all chunks are committed
   UNIQUE(source, sha256)
 );
 
+-- for databases created before ingested_at existed
+ALTER TABLE documents ADD COLUMN IF NOT EXISTS ingested_at TIMESTAMPTZ NULL;
+
 CREATE TABLE IF NOT EXISTS chunks (
   id BIGSERIAL PRIMARY KEY,
   document_id BIGINT NOT NULL REFERENCES documents(id) ON DELETE CASCADE,
@@ -17,7 +21,23 @@ CREATE TABLE IF NOT EXISTS chunks (
   char_end INT NOT NULL,
   text TEXT NOT NULL,
   created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+  -- near-duplicate of this chunk (see app/ingest/dedup.py); such chunks get no vector
+  canonical_chunk_id BIGINT NULL REFERENCES chunks(id) ON DELETE SET NULL,
   UNIQUE(document_id, chunk_index)
 );
 
+-- for databases created before near-duplicate detection existed
+ALTER TABLE chunks ADD COLUMN IF NOT EXISTS canonical_chunk_id BIGINT NULL REFERENCES chunks(id) ON DELETE SET NULL;
+
+-- MinHash signature (uint32[128]) and LSH band keys of every chunk; only
+-- canonical chunks are looked up, duplicates keep theirs for promotion
+CREATE TABLE IF NOT EXISTS chunk_minhash (
+  chunk_id BIGINT PRIMARY KEY REFERENCES chunks(id) ON DELETE CASCADE,
+  signature BYTEA NOT NULL,
+  buckets BIGINT[] NOT NULL
+);
+
 CREATE INDEX IF NOT EXISTS idx_chunks_document_id ON chunks(document_id);
+CREATE INDEX IF NOT EXISTS idx_documents_source ON documents(source);
+CREATE INDEX IF NOT EXISTS idx_chunks_canonical ON chunks(canonical_chunk_id) WHERE canonical_chunk_id IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_chunk_minhash_buckets ON chunk_minhash USING GIN (buckets);
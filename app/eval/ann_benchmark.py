@@ -0,0 +1,183 @@
+import argparse
+import json
+import os
+import time
+from typing import Any
+
+import faiss
+import numpy as np
+
+from app.core.config import settings
+from app.eval.retrieval_eval import _load_jsonl
+from app.retrieval.embeddings import Embedder
+from app.retrieval.index_factory import (
+    INDEX_TYPES,
+    create_index,
+    index_nbytes,
+    index_params_from_settings,
+    read_index,
+    train_size,
+)
+from app.retrieval import versions
+
+# Candidate configs when --configs is not given
+DEFAULT_CONFIGS = [
+    "hnsw:hnsw_m=32,hnsw_ef_search=32",
+    "hnsw:hnsw_m=32,hnsw_ef_search=128",
+    "ivf_flat:ivf_nprobe=8",
+    "ivf_flat:ivf_nprobe=32",
+    "ivf_pq:ivf_nprobe=16",
+    "sq_fp16",
+    "sq_int8",
+    "binary_rescore:rescore_factor=4",
+    "binary_rescore:rescore_factor=10",
+    "binary_rescore:rescore_factor=32",
+]
+
+
+def _parse_config(spec: str) -> dict:
+    """
+    "ivf_pq:ivf_nlist=512,ivf_nprobe=16,pq_m=48" -> full index_params dict.
+    Unspecified knobs take the INDEX_TYPE-specific defaults from settings.
+    """
+    kind, _, rest = spec.partition(":")
+    if kind not in INDEX_TYPES:
+        raise SystemExit(f"Unknown index type in {spec!r}. Expected one of {INDEX_TYPES}")
+
+    params = index_params_from_settings(kind)
+
+    for kv in filter(None, rest.split(",")):
+        k, _, v = kv.partition("=")
+        if k not in params:
+            raise SystemExit(f"Unknown knob {k!r} for {kind}. Known: {sorted(params)}")
+        params[k] = int(v)
+    return params
+
+
+def _load_vectors() -> tuple[np.ndarray, np.ndarray, dict]:
+    # the published index must be exact (flat) so its vectors can be reconstructed
+    base_dir = versions.current_dir()
+    if base_dir is None:
+        raise SystemExit(f"No published index in {settings.index_dir}. Run build_index first.")
+    meta = versions.load_meta(base_dir)
+    index = read_index(os.path.join(base_dir, "index.faiss"))
+
+    if hasattr(index, "id_map"):
+        ids = faiss.vector_to_array(index.id_map).astype("int64")
+        base = faiss.downcast_index(index.index)
+    else:
+        ids = np.arange(index.ntotal, dtype="int64")
+        base = index
+    if not isinstance(base, faiss.IndexFlat):
+        raise SystemExit("ann_benchmark needs a flat published index as the exact baseline. Build with INDEX_TYPE=flat.")
+
+    xb = base.reconstruct_n(0, base.ntotal)
+    return np.ascontiguousarray(xb, dtype="float32"), ids, meta
+
+
+def _time_single_queries(index: faiss.Index, xq: np.ndarray, k: int) -> tuple[np.ndarray, list[float]]:
+    # one query at a time, like the API does
+    out = np.empty((xq.shape[0], k), dtype="int64")
+    lat_ms = []
+    for i in range(xq.shape[0]):
+        t0 = time.perf_counter()
+        _, I = index.search(xq[i : i + 1], k)
+        lat_ms.append((time.perf_counter() - t0) * 1000)
+        out[i] = I[0]
+    return out, lat_ms
+
+
+def _recall_vs_exact(approx: np.ndarray, exact: np.ndarray, k: int) -> float:
+    hits = 0
+    for a, e in zip(approx, exact):
+        hits += len(set(a[:k].tolist()) & set(x for x in e[:k].tolist() if x != -1))
+    return hits / (exact.shape[0] * k)
+
+
+def _pct(xs: list[float], p: float) -> float:
+    return float(np.percentile(np.asarray(xs), p)) if xs else 0.0
+
+
+def _bench(name: str, index: faiss.Index, xq: np.ndarray, exact: np.ndarray, k: int, build_s: float) -> dict[str, Any]:
+    # warmup
+    index.search(xq[:1], k)
+    approx, lat = _time_single_queries(index, xq, k)
+    nbytes = index_nbytes(index)
+    return {
+        "config": name,
+        f"recall_at_{k}_vs_exact": _recall_vs_exact(approx, exact, k),
+        "latency_ms_p50": _pct(lat, 50),
+        "latency_ms_p95": _pct(lat, 95),
+        "latency_ms_mean": float(np.mean(lat)),
+        "build_s": build_s,
+        # serialized size ~ resident size of the vectors/codes once loaded
+        "index_bytes": nbytes,
+        "bytes_per_vector": nbytes / index.ntotal if index.ntotal else 0.0,
+    }
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--data", nargs="+", default=["data/eval/retrieval_gold.jsonl"])
+    ap.add_argument("--out", default="data/eval/ann_report.json")
+    ap.add_argument("--k", type=int, default=settings.search_candidates_k)
+    ap.add_argument("--configs", nargs="+", default=DEFAULT_CONFIGS, help='e.g. "hnsw:hnsw_m=32,hnsw_ef_search=64"')
+    args = ap.parse_args()
+
+    xb, ids, meta = _load_vectors()
+    dim = xb.shape[1]
+
+    queries = [case["query"] for path in args.data for case in _load_jsonl(path)]
+    embedder = Embedder(meta.get("model_name", settings.embedding_model_name))
+    xq = embedder.encode(queries, show_progress_bar=False)
+
+    results = []
+
+    t0 = time.perf_counter()
+    flat = create_index(dim, {"index_type": "flat"})
+    flat.add_with_ids(xb, ids)
+    flat_build_s = time.perf_counter() - t0
+    _, exact = flat.search(xq, args.k)
+    results.append(_bench("flat", flat, xq, exact, args.k, flat_build_s))
+
+    for spec in args.configs:
+        params = _parse_config(spec)
+        t0 = time.perf_counter()
+        index = create_index(dim, params)
+        if not index.is_trained:
+            n_train = min(train_size(params) or xb.shape[0], xb.shape[0])
+            sample = xb[np.random.default_rng(0).choice(xb.shape[0], n_train, replace=False)]
+            index.train(sample)
+        index.add_with_ids(xb, ids)
+        build_s = time.perf_counter() - t0
+        results.append(_bench(spec, index, xq, exact, args.k, build_s))
+
+    # memory relative to the float32 flat baseline
+    for r in results:
+        r["memory_vs_flat"] = r["index_bytes"] / results[0]["index_bytes"] if results[0]["index_bytes"] else None
+
+    report = {
+        "k": args.k,
+        "num_vectors": int(xb.shape[0]),
+        "dim": dim,
+        "num_queries": len(queries),
+        "data": args.data,
+        "results": results,
+    }
+    os.makedirs(os.path.dirname(args.out), exist_ok=True)
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    print(f"ANN benchmark (n={xb.shape[0]}, dim={dim}, queries={len(queries)}, k={args.k})")
+    print(f"{'config':<45} {'recall':>7} {'p50 ms':>8} {'p95 ms':>8} {'build s':>8} {'MB':>8} {'B/vec':>7} {'mem':>6}")
+    for r in results:
+        print(
+            f"{r['config']:<45} {r[f'recall_at_{args.k}_vs_exact']:>7.3f} {r['latency_ms_p50']:>8.3f} "
+            f"{r['latency_ms_p95']:>8.3f} {r['build_s']:>8.2f} {r['index_bytes'] / 1e6:>8.1f} "
+            f"{r['bytes_per_vector']:>7.0f} {r['memory_vs_flat']:>6.2f}"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
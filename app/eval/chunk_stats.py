@@ -0,0 +1,122 @@
+import argparse
+import json
+import os
+import time
+from typing import Any
+
+import numpy as np
+
+from app.core.config import settings
+from app.db.queries import iter_chunk_batches
+from app.ingest.chunking import load_tokenizer
+
+# How much of each ingested chunk the embedding model actually sees: tokenizes
+# every chunk (batched, no truncation) and reports the share of chunks over the
+# model window and the tokens / characters the encoder silently drops. Run it
+# before and after re-ingesting with CHUNKING_MODE=tokens. Near-duplicates
+# (DEDUP_ENABLED) are counted too: they are chunks of the corpus even if only
+# their canonical chunk is embedded.
+
+HIST_EDGES = (0, 64, 128, 192, 256, 384, 512, 768, 1024)
+
+
+def _chunk_lengths(texts: list[str], tokenizer, max_seq_length: int) -> tuple[np.ndarray, np.ndarray]:
+    # (tokens incl. special tokens, characters past the last token that fits)
+    enc = tokenizer(
+        texts,
+        add_special_tokens=True,
+        return_offsets_mapping=True,
+        return_attention_mask=False,
+        return_token_type_ids=False,
+        truncation=False,
+        verbose=False,
+    )
+    n_tokens = np.array([len(ids) for ids in enc["input_ids"]], dtype="int64")
+    dropped = np.zeros(len(texts), dtype="int64")
+    for i, (text, offsets) in enumerate(zip(texts, enc["offset_mapping"])):
+        if n_tokens[i] <= max_seq_length:
+            continue
+        # special tokens have empty (0, 0) offsets; the last content token kept
+        # is the last non-empty one inside the window
+        kept = [e for s, e in offsets[:max_seq_length] if e > s]
+        dropped[i] = len(text) - (kept[-1] if kept else 0)
+    return n_tokens, dropped
+
+
+def _histogram(n_tokens: np.ndarray) -> dict[str, int]:
+    edges = list(HIST_EDGES) + [max(int(n_tokens.max(initial=0)) + 1, HIST_EDGES[-1] + 1)]
+    counts, _ = np.histogram(n_tokens, bins=edges)
+    return {f"{lo}-{hi - 1}": int(c) for lo, hi, c in zip(edges[:-1], edges[1:], counts)}
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--out", default="data/eval/chunk_stats.json")
+    ap.add_argument("--batch-size", type=int, default=1024)
+    ap.add_argument("--limit", type=int, default=0, help="Only the first N chunks (0 = all)")
+    args = ap.parse_args()
+
+    tokenizer, max_seq_length = load_tokenizer(settings.embedding_model_name)
+
+    t0 = time.perf_counter()
+    tokens_l, dropped_l, chars_l = [], [], []
+    seen = 0
+    for batch in iter_chunk_batches(args.batch_size, include_duplicates=True):
+        if args.limit:
+            batch = batch[: args.limit - seen]
+        texts = [c["text"] for c in batch]
+        n_tokens, dropped = _chunk_lengths(texts, tokenizer, max_seq_length)
+        tokens_l.append(n_tokens)
+        dropped_l.append(dropped)
+        chars_l.append(np.array([len(t) for t in texts], dtype="int64"))
+        seen += len(batch)
+        if args.limit and seen >= args.limit:
+            break
+    elapsed = time.perf_counter() - t0
+
+    if not seen:
+        raise SystemExit("No chunks in the database. Run the ingest first.")
+    n_tokens = np.concatenate(tokens_l)
+    dropped_chars = np.concatenate(dropped_l)
+    n_chars = np.concatenate(chars_l)
+    over = n_tokens > max_seq_length
+
+    report: dict[str, Any] = {
+        "model": settings.embedding_model_name,
+        "max_seq_length": max_seq_length,
+        "chunking_mode": settings.chunking_mode,
+        "chunks": int(seen),
+        "dedup_enabled": settings.dedup_enabled,
+        "chunks_over_limit": int(over.sum()),
+        "chunks_over_limit_frac": float(over.mean()),
+        "tokens_total": int(n_tokens.sum()),
+        "tokens_dropped": int(np.maximum(n_tokens - max_seq_length, 0).sum()),
+        "chars_total": int(n_chars.sum()),
+        "chars_dropped": int(dropped_chars.sum()),
+        "tokens_per_chunk": {
+            "mean": float(n_tokens.mean()),
+            **{f"p{p}": float(np.percentile(n_tokens, p)) for p in (50, 95, 99)},
+            "max": int(n_tokens.max()),
+        },
+        "token_histogram": _histogram(n_tokens),
+        "elapsed_s": elapsed,
+    }
+    report["tokens_dropped_frac"] = report["tokens_dropped"] / max(report["tokens_total"], 1)
+    report["chars_dropped_frac"] = report["chars_dropped"] / max(report["chars_total"], 1)
+
+    os.makedirs(os.path.dirname(args.out), exist_ok=True)
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    tpc = report["tokens_per_chunk"]
+    print(f"Chunks: {seen} (mode={settings.chunking_mode}, model window={max_seq_length} tokens)")
+    print(f"- over the window: {report['chunks_over_limit']} ({report['chunks_over_limit_frac']:.1%})")
+    print(f"- tokens dropped:  {report['tokens_dropped']} ({report['tokens_dropped_frac']:.1%})")
+    print(f"- chars dropped:   {report['chars_dropped']} ({report['chars_dropped_frac']:.1%})")
+    print(f"- tokens/chunk:    mean={tpc['mean']:.0f} p50={tpc['p50']:.0f} p95={tpc['p95']:.0f} max={tpc['max']}")
+    print(f"Report: {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,197 @@
+import argparse
+import json
+import os
+import time
+from typing import Any
+
+import faiss
+import numpy as np
+
+from app.core.config import settings
+from app.db.queries import fetch_chunk_map_by_faiss_ids, iter_chunk_batches
+from app.eval.retrieval_eval import _case_has_gold, _load_jsonl, _match_expected
+from app.retrieval.embeddings import BACKENDS, Embedder
+from app.retrieval.index_factory import apply_search_params, read_index, with_query_settings
+from app.retrieval.retrieve import RetrievalParams, abstention, select_rows
+from app.retrieval import versions
+
+# Compare a candidate embedding backend against the reference one on the gold set:
+# vector agreement (cosine), candidate overlap in the published index, and
+# Recall@K / MRR through the same abstention + selection as run_retrieval.
+
+
+def _variant_spec(spec: str) -> tuple[str, bool]:
+    # "sentence_transformers" | "onnx" | "onnx-int8"
+    backend, _, tag = spec.partition("-")
+    if backend not in BACKENDS or tag not in ("", "int8") or (tag and backend != "onnx"):
+        raise SystemExit(f"Unknown backend {spec!r}. Expected sentence_transformers, onnx or onnx-int8")
+    return backend, tag == "int8"
+
+
+def _encode_timed(embedder: Embedder, texts: list[str]) -> tuple[np.ndarray, list[float]]:
+    # one text at a time, like a /search request
+    embedder.encode(texts[:1], show_progress_bar=False)  # warmup
+    lat_ms = []
+    rows = []
+    for t in texts:
+        t0 = time.perf_counter()
+        rows.append(embedder.encode([t], show_progress_bar=False)[0])
+        lat_ms.append((time.perf_counter() - t0) * 1000)
+    return np.stack(rows), lat_ms
+
+
+def _cosine_stats(a: np.ndarray, b: np.ndarray) -> dict[str, float]:
+    # both sides are L2-normalized
+    cos = np.sum(a * b, axis=1)
+    return {"mean": float(cos.mean()), "min": float(cos.min()), "p5": float(np.percentile(cos, 5))}
+
+
+def _pct(xs: list[float], p: float) -> float:
+    return float(np.percentile(np.asarray(xs), p)) if xs else 0.0
+
+
+def _evaluate(
+    index: faiss.Index,
+    xq: np.ndarray,
+    cases: list[dict],
+    params: RetrievalParams,
+    k: int,
+    page_offset: int,
+    page_tolerance: int,
+) -> tuple[dict[str, Any], np.ndarray]:
+    D, I = index.search(xq, params.search_candidates_k)
+    candidates = []
+    for d_row, i_row in zip(D.tolist(), I.tolist()):
+        ids = [int(x) for x in i_row if int(x) != -1]
+        candidates.append((ids, [float(x) for x in d_row[: len(ids)]]))
+
+    chunk_map = fetch_chunk_map_by_faiss_ids(
+        sorted({fid for ids, _ in candidates for fid in ids}), settings.embedding_model_name
+    )
+
+    n_gold = hits = abstained = 0
+    mrr = 0.0
+    for case, (ids, scores) in zip(cases, candidates):
+        reason, _ = abstention(ids, scores, params)
+        rows = select_rows(ids, scores, chunk_map, params) if reason is None else []
+        if not rows:
+            abstained += 1
+        if not _case_has_gold(case):
+            continue
+        n_gold += 1
+        hit, rr = _match_expected(rows, case["expected"], k, page_offset, page_tolerance)
+        hits += int(hit)
+        mrr += rr
+
+    metrics = {
+        "cases_scored_gold": n_gold,
+        f"recall_at_{k}": hits / n_gold if n_gold else None,
+        "mrr": mrr / n_gold if n_gold else None,
+        "abstained": abstained,
+    }
+    return metrics, I
+
+
+def _overlap(a: np.ndarray, b: np.ndarray) -> float:
+    # mean |top-k(a) ∩ top-k(b)| / k over queries
+    k = a.shape[1]
+    return float(np.mean([len(set(x.tolist()) & set(y.tolist())) / k for x, y in zip(a, b)]))
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--data", default="data/eval/retrieval_gold.jsonl")
+    ap.add_argument("--out", default="data/eval/embedding_parity.json")
+    ap.add_argument("--k", type=int, default=5)
+    ap.add_argument("--reference", default="sentence_transformers")
+    ap.add_argument("--candidate", default="onnx-int8", help="sentence_transformers | onnx | onnx-int8")
+    ap.add_argument("--chunk-sample", type=int, default=512, help="Also compare vectors of the first N chunks (0 = skip)")
+    ap.add_argument("--page-offset", type=int, default=0)
+    ap.add_argument("--page-tolerance", type=int, default=0)
+    ap.add_argument(
+        "--max-recall-drop", type=float, default=None, help="Fail if candidate Recall@K is lower by more than this"
+    )
+    args = ap.parse_args()
+
+    cases = _load_jsonl(args.data)
+    queries = [c["query"] for c in cases]
+
+    base_dir = versions.current_dir()
+    if base_dir is None:
+        raise SystemExit(f"No published index in {settings.index_dir}. Run build_index first.")
+    meta = versions.load_meta(base_dir)
+    index = read_index(os.path.join(base_dir, "index.faiss"))
+    apply_search_params(index, with_query_settings(meta.get("index_params") or {}))
+    params = RetrievalParams.from_settings()
+
+    report: dict[str, Any] = {
+        "k": args.k,
+        "num_queries": len(queries),
+        "index_version": meta.get("version"),
+        "index_embedding_variant": meta.get("embedding_variant", meta.get("model_name")),
+        "data": args.data,
+    }
+
+    chunk_texts: list[str] = []
+    if args.chunk_sample:
+        for batch in iter_chunk_batches(args.chunk_sample):
+            chunk_texts = [c["text"] for c in batch]
+            break
+
+    xq = {}
+    id_lists = {}
+    chunk_vecs = {}
+    for role, spec in (("reference", args.reference), ("candidate", args.candidate)):
+        backend, quantize = _variant_spec(spec)
+        t0 = time.perf_counter()
+        embedder = Embedder(settings.embedding_model_name, backend=backend, quantize=quantize)
+        load_s = time.perf_counter() - t0
+        vecs, lat = _encode_timed(embedder, queries)
+        metrics, ids = _evaluate(index, vecs, cases, params, args.k, args.page_offset, args.page_tolerance)
+        xq[role] = vecs
+        id_lists[role] = ids
+        report[role] = {
+            "variant": embedder.variant,
+            "load_s": load_s,
+            "encode_ms_p50": _pct(lat, 50),
+            "encode_ms_p95": _pct(lat, 95),
+            **metrics,
+        }
+        if chunk_texts:
+            chunk_vecs[role] = embedder.encode(chunk_texts, show_progress_bar=False)
+
+    report["query_cosine"] = _cosine_stats(xq["reference"], xq["candidate"])
+    report[f"candidate_overlap_at_{params.search_candidates_k}"] = _overlap(id_lists["reference"], id_lists["candidate"])
+    if chunk_vecs:
+        # document side: what a rebuild with the candidate backend would change
+        report["chunk_cosine"] = _cosine_stats(chunk_vecs["reference"], chunk_vecs["candidate"])
+        report["chunk_sample"] = len(chunk_texts)
+
+    os.makedirs(os.path.dirname(args.out), exist_ok=True)
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    rk = f"recall_at_{args.k}"
+    ref, cand = report["reference"], report["candidate"]
+    print(f"Embedding parity (queries={len(queries)}, index={report['index_version']})")
+    print(f"{'variant':<55} {'Recall@' + str(args.k):>9} {'MRR':>6} {'abst.':>6} {'p50 ms':>8} {'p95 ms':>8}")
+    for r in (ref, cand):
+        print(
+            f"{r['variant']:<55} {r[rk] if r[rk] is not None else float('nan'):>9.3f} "
+            f"{r['mrr'] if r['mrr'] is not None else float('nan'):>6.3f} {r['abstained']:>6} "
+            f"{r['encode_ms_p50']:>8.2f} {r['encode_ms_p95']:>8.2f}"
+        )
+    print(f"- query cosine: {report['query_cosine']}")
+    if "chunk_cosine" in report:
+        print(f"- chunk cosine: {report['chunk_cosine']}")
+    print(f"- candidate overlap@{params.search_candidates_k}: {report[f'candidate_overlap_at_{params.search_candidates_k}']:.3f}")
+
+    if args.max_recall_drop is not None and ref[rk] is not None and cand[rk] is not None:
+        if ref[rk] - cand[rk] > args.max_recall_drop:
+            print(f"FAIL: Recall@{args.k} drops {ref[rk] - cand[rk]:.3f} > {args.max_recall_drop:.3f}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,303 @@
+import argparse
+import itertools
+import json
+import os
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+import numpy as np
+
+from app.core.config import settings
+from app.core.procmem import process_memory
+from app.eval.retrieval_eval import _load_jsonl
+
+# Replays a query workload against the retrieval pipeline in-process or against a
+# running API over HTTP, at one or more concurrency levels, and writes a JSON
+# report (latency percentiles, per-stage percentiles, req/s, RSS) that
+# --compare can diff against a previous run.
+
+DEFAULT_WORKLOAD = ["data/eval/retrieval_gold.jsonl", "data/eval/retrieval_no_evidence.jsonl"]
+PERCENTILES = (50, 95, 99)
+
+
+def _load_workload(paths: list[str]) -> list[str]:
+    # any JSONL whose lines carry "query" (eval sets) or "question" (/ask payloads)
+    queries = []
+    for path in paths:
+        for item in _load_jsonl(path):
+            q = item.get("query") or item.get("question")
+            if q:
+                queries.append(q)
+    if not queries:
+        raise SystemExit(f"No queries found in {paths}")
+    return queries
+
+
+def _pcts(xs: list[float]) -> dict[str, float]:
+    if not xs:
+        return {}
+    arr = np.asarray(xs)
+    out = {f"p{p}": float(np.percentile(arr, p)) for p in PERCENTILES}
+    out["mean"] = float(arr.mean())
+    return out
+
+
+class _Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latency_ms: list[float] = []
+        self.server_ms: list[float] = []
+        self.stages: dict[str, list[float]] = {}
+        self.errors = 0
+        self.abstained = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def add(
+        self,
+        latency_ms: float,
+        server_ms: Optional[float],
+        timings: Optional[dict],
+        abstained: bool,
+        cache: Optional[str],
+    ) -> None:
+        with self.lock:
+            self.latency_ms.append(latency_ms)
+            if server_ms is not None:
+                self.server_ms.append(server_ms)
+            # a cache hit carries the stage timings of the request that filled it
+            if cache != "hit":
+                for stage, ms in (timings or {}).items():
+                    self.stages.setdefault(stage, []).append(ms)
+            self.abstained += int(abstained)
+            self.cache_hits += int(cache == "hit")
+            self.cache_misses += int(cache == "miss")
+
+    def cache_hit_ratio(self) -> Optional[float]:
+        # None when the cache status isn't reported (cache off, or no DEBUG_RAG)
+        seen = self.cache_hits + self.cache_misses
+        return self.cache_hits / seen if seen else None
+
+    def error(self) -> None:
+        with self.lock:
+            self.errors += 1
+
+
+# call(query) -> (server latency ms, stage timings, abstained, cache "hit"/"miss"/None)
+Call = Callable[[str], tuple[Optional[float], Optional[dict], bool, Optional[str]]]
+
+
+def _inprocess_call(use_cache: bool) -> Call:
+    from app.retrieval.index_store import load_index_bundle
+    from app.retrieval.query_cache import cached_retrieval
+    from app.retrieval.retrieve import run_retrieval
+
+    load_index_bundle()
+    fn = cached_retrieval if use_cache else run_retrieval
+
+    def call(q: str):
+        rows, dbg, latency_ms = fn(q)
+        dbg = dbg or {}
+        return latency_ms, dbg.get("timings_ms"), not rows, dbg.get("cache")
+
+    return call
+
+
+def _http_call(base_url: str, endpoint: str, concurrency: int):
+    import httpx
+
+    client = httpx.Client(
+        base_url=base_url,
+        timeout=30.0,
+        limits=httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency),
+    )
+    path, field = {"search": ("/search", "query"), "ask": ("/ask", "question")}[endpoint]
+
+    def call(q: str):
+        r = client.post(path, json={field: q})
+        r.raise_for_status()
+        data = r.json()
+        abstained = data.get("abstained", not data.get("hits"))
+        # stage timings and the cache status are only in the response when the
+        # server runs with DEBUG_RAG=1
+        dbg = data.get("debug") or {}
+        return data.get("latency_ms"), dbg.get("timings_ms"), abstained, dbg.get("cache")
+
+    return call, client
+
+
+def _server_diagnostics(base_url: str) -> dict:
+    # RSS and index info of the worker that answered
+    import httpx
+
+    try:
+        return httpx.get(base_url.rstrip("/") + "/diagnostics", timeout=5.0).json()
+    except Exception:
+        return {}
+
+
+def _run_level(call: Call, queries: list[str], concurrency: int, n_requests: int, warmup: int) -> dict[str, Any]:
+    for q in queries[:warmup]:
+        call(q)
+
+    rec = _Recorder()
+    workload = list(itertools.islice(itertools.cycle(queries), n_requests))
+
+    def one(q: str) -> None:
+        t0 = time.perf_counter()
+        try:
+            server_ms, timings, abstained, cache = call(q)
+        except Exception:
+            rec.error()
+            return
+        rec.add((time.perf_counter() - t0) * 1000, server_ms, timings, abstained, cache)
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as ex:
+        list(ex.map(one, workload))
+    wall_s = time.perf_counter() - t0
+
+    return {
+        "concurrency": concurrency,
+        "requests": n_requests,
+        "errors": rec.errors,
+        "abstained": rec.abstained,
+        "cache_hit_ratio": rec.cache_hit_ratio(),
+        "wall_s": wall_s,
+        "rps": len(rec.latency_ms) / wall_s if wall_s > 0 else 0.0,
+        "latency_ms": _pcts(rec.latency_ms),
+        "server_latency_ms": _pcts(rec.server_ms),
+        "stages_ms": {stage: _pcts(xs) for stage, xs in sorted(rec.stages.items())},
+    }
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def _compare(report: dict, baseline_path: str, max_regression: Optional[float]) -> int:
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        base = json.load(f)
+    base_levels = {r["concurrency"]: r for r in base.get("results", [])}
+
+    print(f"\nCompare with {baseline_path} (commit {base.get('commit')} -> {report.get('commit')})")
+    print(f"{'conc':>5} {'metric':<8} {'before':>10} {'after':>10} {'delta':>8}")
+    failed = False
+    for r in report["results"]:
+        b = base_levels.get(r["concurrency"])
+        if b is None:
+            continue
+        rows = [(f"p{p}", b["latency_ms"].get(f"p{p}"), r["latency_ms"].get(f"p{p}")) for p in PERCENTILES]
+        rows.append(("rps", b["rps"], r["rps"]))
+        for name, before, after in rows:
+            if not before or after is None:
+                continue
+            delta = (after - before) / before
+            print(f"{r['concurrency']:>5} {name:<8} {before:>10.2f} {after:>10.2f} {delta:>+8.1%}")
+            # latency going up / throughput going down are regressions
+            worse = delta if name != "rps" else -delta
+            if max_regression is not None and name in ("p95", "rps") and worse > max_regression:
+                failed = True
+    if failed:
+        print(f"FAIL: p95 or req/s regressed by more than {max_regression:.0%}")
+        return 1
+    return 0
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--workload", nargs="+", default=DEFAULT_WORKLOAD, help="JSONL files with query/question fields")
+    ap.add_argument("--mode", choices=("inprocess", "http"), default="inprocess")
+    ap.add_argument("--url", default="http://localhost:8000")
+    ap.add_argument("--endpoint", choices=("search", "ask"), default="search", help="HTTP mode only")
+    ap.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    ap.add_argument("--requests", type=int, default=500, help="Requests per concurrency level")
+    ap.add_argument("--warmup", type=int, default=10)
+    ap.add_argument("--cache", action="store_true", help="In-process: go through the query cache like /search")
+    ap.add_argument("--out", default=None, help="Default: data/bench/loadtest_<mode>_<timestamp>.json")
+    ap.add_argument("--compare", default=None, help="Previous report to diff against")
+    ap.add_argument("--max-regression", type=float, default=None, help="With --compare: fail if p95/rps worse by more (0.1 = 10%)")
+    args = ap.parse_args()
+
+    queries = _load_workload(args.workload)
+
+    if not settings.debug_rag and args.mode == "inprocess":
+        print("Note: run with DEBUG_RAG=1 to get per-stage timings")
+    if args.mode == "http" and _server_diagnostics(args.url).get("query_cache_enabled", True):
+        # the workload cycles over a few hundred queries: after the first pass
+        # nearly every request is a cache hit
+        print(
+            "Note: the server has the query cache on, so repeated queries measure the cache. "
+            "Run it with QUERY_CACHE_ENABLED=0 (or use a workload without repeats) to measure retrieval"
+        )
+    inprocess = _inprocess_call(args.cache) if args.mode == "inprocess" else None
+
+    results = []
+    for conc in args.concurrency:
+        if inprocess is not None:
+            level = _run_level(inprocess, queries, conc, args.requests, args.warmup)
+            level["rss"] = process_memory()
+        else:
+            call, client = _http_call(args.url, args.endpoint, conc)
+            try:
+                level = _run_level(call, queries, conc, args.requests, args.warmup)
+            finally:
+                client.close()
+            level["rss"] = _server_diagnostics(args.url).get("process")
+        results.append(level)
+        lat = level["latency_ms"]
+        print(
+            f"conc={conc:<3} rps={level['rps']:>8.1f} p50={lat.get('p50', 0):>8.2f} "
+            f"p95={lat.get('p95', 0):>8.2f} p99={lat.get('p99', 0):>8.2f} ms errors={level['errors']}"
+            + (f" cache_hits={level['cache_hit_ratio']:.0%}" if level["cache_hit_ratio"] is not None else "")
+        )
+        for stage, p in level["stages_ms"].items():
+            print(f"    {stage:<14} p50={p['p50']:>8.2f} p95={p['p95']:>8.2f} p99={p['p99']:>8.2f} ms")
+
+    report = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "commit": _git_commit(),
+        "mode": args.mode,
+        "endpoint": args.endpoint if args.mode == "http" else "retrieval",
+        "url": args.url if args.mode == "http" else None,
+        "workload": args.workload,
+        "num_queries": len(queries),
+        # HTTP mode: what the server reports; in-process: local settings
+        "server": {k: v for k, v in _server_diagnostics(args.url).items() if k != "process"}
+        if args.mode == "http"
+        else None,
+        "config": {
+            "index_type": settings.index_type,
+            "index_load_mode": settings.index_load_mode,
+            "embedding_backend": settings.embedding_backend,
+            "onnx_quantize": settings.onnx_quantize,
+            "retrieval_mode": settings.retrieval_mode,
+            "query_batching_enabled": settings.query_batching_enabled,
+            "query_cache": args.cache,
+        }
+        if args.mode == "inprocess"
+        else None,
+        "results": results,
+    }
+
+    out = args.out or os.path.join("data/bench", f"loadtest_{args.mode}_{time.strftime('%Y%m%dT%H%M%S')}.json")
+    os.makedirs(os.path.dirname(out), exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"Report: {out}")
+
+    if args.compare:
+        return _compare(report, args.compare, args.max_regression)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,10 +1,11 @@
 import argparse
 import json
 import os
+import time
 from dataclasses import dataclass
 from typing import Any, Optional, Sequence, Tuple
 
-from app.retrieval.retrieve import run_retrieval
+from app.retrieval.retrieve import run_retrieval, run_retrieval_batch
 
 
 def _basename(p: str) -> str:
@@ -111,32 +112,26 @@ def _match_expected(
     return hit, rr
 
 
-def main() -> int:
-    ap = argparse.ArgumentParser()
-    ap.add_argument("--data", default="data/eval/retrieval_gold.jsonl")
-    ap.add_argument("--out", default="data/eval/report.json")
-    ap.add_argument("--k", type=int, default=5)
-    ap.add_argument("--fail-under", type=float, default=None, help="Fail if Recall@K < threshold (0..1)")
-
-    # NEW: to deal with page indexing mismatches
-    ap.add_argument("--page-offset", type=int, default=0, help="Shift retrieved pages by this offset (e.g. +1)")
-    ap.add_argument("--page-tolerance", type=int, default=0, help="Allow matching within ±tolerance pages (e.g. 1)")
-
-    args = ap.parse_args()
-
-    cases = _load_jsonl(args.data)
-
+def score_cases(
+    cases: list[dict],
+    retrieved: list[list[dict]],
+    k: int,
+    page_offset: int,
+    page_tolerance: int,
+) -> tuple[GoldMetrics, NoEvidenceMetrics, list[dict[str, Any]]]:
+    """
+    Score the rows retrieved for each case: Recall/MRR on gold cases,
+    abstention on no-evidence cases (expected empty).
+    """
     gold_m = GoldMetrics()
     ne_m = NoEvidenceMetrics()
 
     details: list[dict[str, Any]] = []
 
-    for case in cases:
+    for case, rows in zip(cases, retrieved):
         q = case["query"]
         expected = case.get("expected") or []
 
-        rows, _dbg, _latency_ms = run_retrieval(q)
-
         has_gold = _case_has_gold(case)
 
         # --- No-evidence evaluation set ---
@@ -154,7 +149,7 @@ def main() -> int:
                     "kind": "no_evidence",
                     "scored": False,
                     "expected": expected,
-                    "retrieved": [{"source": r.get("source"), "page": r.get("page")} for r in rows[: args.k]],
+                    "retrieved": [{"source": r.get("source"), "page": r.get("page")} for r in rows[:k]],
                     "predicted_empty": predicted_empty,
                 }
             )
@@ -165,9 +160,9 @@ def main() -> int:
         hit, rr = _match_expected(
             rows=rows,
             expected=expected,
-            k=args.k,
-            page_offset=args.page_offset,
-            page_tolerance=args.page_tolerance,
+            k=k,
+            page_offset=page_offset,
+            page_tolerance=page_tolerance,
         )
 
         if hit:
@@ -182,17 +177,76 @@ def main() -> int:
                 "expected": expected,
                 "hit": hit,
                 "rr": rr,
-                "retrieved": [{"source": r.get("source"), "page": r.get("page")} for r in rows[: args.k]],
-                "retrieved_page_offset_applied": args.page_offset,
-                "page_tolerance": args.page_tolerance,
+                "retrieved": [{"source": r.get("source"), "page": r.get("page")} for r in rows[:k]],
+                "retrieved_page_offset_applied": page_offset,
+                "page_tolerance": page_tolerance,
             }
         )
 
-    recall = (gold_m.recall_hits / gold_m.n_gold) if gold_m.n_gold else None
-    mrr = (gold_m.mrr_sum / gold_m.n_gold) if gold_m.n_gold else None
+    return gold_m, ne_m, details
+
+
+def summarize(gold_m: GoldMetrics, ne_m: NoEvidenceMetrics) -> dict[str, Optional[float]]:
+    return {
+        "recall_at_k": (gold_m.recall_hits / gold_m.n_gold) if gold_m.n_gold else None,
+        "mrr": (gold_m.mrr_sum / gold_m.n_gold) if gold_m.n_gold else None,
+        "no_evidence_accuracy": (ne_m.no_evidence_correct / ne_m.n_no_evidence) if ne_m.n_no_evidence else None,
+        "false_evidence_rate": (ne_m.false_evidence / ne_m.n_no_evidence) if ne_m.n_no_evidence else None,
+    }
+
+
+def _retrieve_all(queries: list[str], batched: bool, batch_size: int) -> tuple[list[list[dict]], dict[str, float]]:
+    """
+    Rows for every query plus per-stage timing totals (ms).
+    batched: one encode + one index.search + one chunk fetch per batch_size
+    queries (run_retrieval_batch, same thresholds/dedupe as run_retrieval).
+    Otherwise run_retrieval per query; its stage timings need DEBUG_RAG=1.
+    """
+    totals: dict[str, float] = {}
+    all_rows: list[list[dict]] = []
+    t0 = time.perf_counter()
+    if batched:
+        for start in range(0, len(queries), batch_size):
+            results, timings = run_retrieval_batch(queries[start : start + batch_size])
+            all_rows.extend(rows for rows, _ in results)
+            for stage, ms in timings.items():
+                totals[stage] = totals.get(stage, 0.0) + ms
+    else:
+        for q in queries:
+            rows, dbg, latency_ms = run_retrieval(q)
+            all_rows.append(rows)
+            for stage, ms in ((dbg or {}).get("timings_ms") or {"total": latency_ms}).items():
+                totals[stage] = totals.get(stage, 0.0) + ms
+    totals["wall"] = (time.perf_counter() - t0) * 1000
+    return all_rows, totals
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--data", default="data/eval/retrieval_gold.jsonl")
+    ap.add_argument("--out", default="data/eval/report.json")
+    ap.add_argument("--k", type=int, default=5)
+    ap.add_argument("--fail-under", type=float, default=None, help="Fail if Recall@K < threshold (0..1)")
+
+    # NEW: to deal with page indexing mismatches
+    ap.add_argument("--page-offset", type=int, default=0, help="Shift retrieved pages by this offset (e.g. +1)")
+    ap.add_argument("--page-tolerance", type=int, default=0, help="Allow matching within ±tolerance pages (e.g. 1)")
+    ap.add_argument(
+        "--batched",
+        action="store_true",
+        help="Encode/search/fetch all cases in batches instead of one run_retrieval per case",
+    )
+    ap.add_argument("--batch-size", type=int, default=256)
+
+    args = ap.parse_args()
+
+    cases = _load_jsonl(args.data)
 
-    no_evidence_accuracy = (ne_m.no_evidence_correct / ne_m.n_no_evidence) if ne_m.n_no_evidence else None
-    false_evidence_rate = (ne_m.false_evidence / ne_m.n_no_evidence) if ne_m.n_no_evidence else None
+    retrieved, timings_total_ms = _retrieve_all([c["query"] for c in cases], args.batched, args.batch_size)
+    gold_m, ne_m, details = score_cases(cases, retrieved, args.k, args.page_offset, args.page_tolerance)
+    summary = summarize(gold_m, ne_m)
+    recall, mrr = summary["recall_at_k"], summary["mrr"]
+    no_evidence_accuracy, false_evidence_rate = summary["no_evidence_accuracy"], summary["false_evidence_rate"]
 
     report = {
         "k": args.k,
@@ -205,6 +259,8 @@ def main() -> int:
         "false_evidence_rate": false_evidence_rate,
         "page_offset": args.page_offset,
         "page_tolerance": args.page_tolerance,
+        "batched": args.batched,
+        "timings_total_ms": timings_total_ms,
         "details": details,
     }
 
@@ -221,6 +277,8 @@ def main() -> int:
     print(f"- no_evidence_total: {ne_m.n_no_evidence}")
     print(f"- no_evidence_accuracy: {no_evidence_accuracy}")
     print(f"- false_evidence_rate: {false_evidence_rate}")
+    print(f"- timings_total_ms ({'batched' if args.batched else 'per case'}): "
+          + ", ".join(f"{k}={v:.1f}" for k, v in timings_total_ms.items()))
 
     if args.fail_under is not None and recall is not None:
         if recall < args.fail_under:
@@ -0,0 +1,198 @@
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import time
+from typing import Any, Optional
+
+from app.core.config import settings
+from app.eval.retrieval_eval import _load_jsonl, score_cases, summarize
+from app.retrieval.index_store import index_fingerprint, load_index_bundle, search_batch
+from app.retrieval.retrieve import RetrievalParams, _fetch_chunks, abstention, select_rows
+
+# Retrieve raw candidates once per case at the largest k of the grid (cached on
+# disk per index + workload), then replay abstention + selection for every
+# threshold combination in memory. Smaller k values use the top-k prefix of
+# the cached candidates, which is what a search with that k returns for flat
+# indexes (and very nearly for ANN ones).
+
+DEFAULT_DATA = ["data/eval/retrieval_gold.jsonl", "data/eval/retrieval_no_evidence.jsonl"]
+
+
+def _floats(values: list[str]) -> list[Optional[float]]:
+    # "none" disables that rule
+    return [None if v.lower() == "none" else float(v) for v in values]
+
+
+def _default_grid(current: Optional[float], deltas: tuple[float, ...]) -> list[str]:
+    if current is None:
+        return ["none"]
+    return sorted({f"{max(current + d, 0.0):.3f}" for d in deltas})
+
+
+def _candidates(queries: list[str], max_k: int, cache_path: str, refresh: bool) -> dict[str, Any]:
+    fingerprint = index_fingerprint(load_index_bundle().meta)
+    workload = hashlib.sha256(json.dumps(queries).encode("utf-8")).hexdigest()[:16]
+
+    if not refresh and os.path.exists(cache_path):
+        with open(cache_path, "r", encoding="utf-8") as f:
+            cached = json.load(f)
+        if cached["index"] == fingerprint and cached["workload"] == workload and cached["max_k"] >= max_k:
+            print(f"Using cached candidates from {cache_path}")
+            return cached
+
+    t0 = time.perf_counter()
+    candidates = search_batch(queries, max_k)
+    wanted = sorted({fid for ids, _ in candidates for fid in ids})
+    chunk_map, _ = _fetch_chunks(wanted)
+    # only what selection and scoring read (no text)
+    chunks = {
+        str(fid): {k: r.get(k) for k in ("faiss_id", "chunk_id", "source", "page")}
+        for fid, r in chunk_map.items()
+    }
+    payload = {
+        "index": fingerprint,
+        "workload": workload,
+        "max_k": max_k,
+        "retrieval_s": time.perf_counter() - t0,
+        "candidates": [[ids, scores] for ids, scores in candidates],
+        "chunks": chunks,
+    }
+    os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+    with open(cache_path, "w", encoding="utf-8") as f:
+        json.dump(payload, f)
+    print(f"Retrieved {len(queries)} queries at k={max_k} in {payload['retrieval_s']:.1f}s")
+    return payload
+
+
+def _pareto(rows: list[dict]) -> list[dict]:
+    """
+    Combinations not dominated on (recall, no-evidence accuracy), by recall.
+    Between equal points, a higher MRR wins. Combinations with identical
+    metrics are listed once (the first in grid order), with the number of
+    others in "equivalent".
+    """
+    def objectives(r):
+        return (r["recall_at_k"] or 0.0, r["no_evidence_accuracy"] or 0.0)
+
+    def mrr(r):
+        return r["mrr"] or 0.0
+
+    unique: dict[tuple, dict] = {}
+    for r in rows:
+        metrics = (*objectives(r), mrr(r))
+        if metrics in unique:
+            unique[metrics]["equivalent"] += 1
+        else:
+            unique[metrics] = {**r, "equivalent": 0}
+    points = list(unique.values())
+
+    def dominates(o, r):
+        ko, kr = objectives(o), objectives(r)
+        if ko == kr:
+            return mrr(o) > mrr(r)
+        return all(a >= b for a, b in zip(ko, kr))
+
+    front = [r for r in points if not any(dominates(o, r) for o in points)]
+    front.sort(key=lambda r: (*objectives(r), mrr(r)), reverse=True)
+    return front
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--data", nargs="+", default=DEFAULT_DATA)
+    ap.add_argument("--out", default="data/eval/threshold_sweep.json")
+    ap.add_argument("--cache", default="data/eval/sweep_candidates.json")
+    ap.add_argument("--refresh", action="store_true", help="Ignore cached candidates")
+    ap.add_argument("--k", type=int, default=5, help="Recall@K / MRR cutoff")
+    ap.add_argument("--page-offset", type=int, default=0)
+    ap.add_argument("--page-tolerance", type=int, default=0)
+
+    # grids; "none" disables a rule. Defaults: current settings ± a few steps
+    ap.add_argument("--search-candidates-k", nargs="+", type=int, default=None)
+    ap.add_argument("--min-top-score", nargs="+", default=None)
+    ap.add_argument("--min-top-score-margin", nargs="+", default=None)
+    ap.add_argument("--min-row-score", nargs="+", default=None)
+    ap.add_argument("--min-score-gap", nargs="+", default=None)
+    ap.add_argument("--max-citations", type=int, default=settings.max_citations)
+    args = ap.parse_args()
+
+    steps = (-0.1, -0.05, 0.0, 0.05, 0.1)
+    grid = {
+        "search_candidates_k": args.search_candidates_k
+        or sorted({max(settings.search_candidates_k // 2, 1), settings.search_candidates_k, settings.search_candidates_k * 2}),
+        "min_top_score": _floats(args.min_top_score or _default_grid(settings.min_top_score, steps)),
+        "min_top_score_margin": _floats(args.min_top_score_margin or _default_grid(settings.min_top_score_margin, (0.0,))),
+        "min_row_score": _floats(args.min_row_score or _default_grid(settings.min_row_score, steps)),
+        "min_score_gap": _floats(args.min_score_gap or _default_grid(settings.min_score_gap, (-0.01, 0.0, 0.01))),
+    }
+
+    cases = [c for path in args.data for c in _load_jsonl(path)]
+    queries = [c["query"] for c in cases]
+    max_k = max(grid["search_candidates_k"])
+    cached = _candidates(queries, max_k, args.cache, args.refresh)
+    candidates = cached["candidates"]
+    chunk_map = {int(fid): row for fid, row in cached["chunks"].items()}
+
+    t0 = time.perf_counter()
+    results = []
+    names = list(grid)
+    for combo in itertools.product(*(grid[n] for n in names)):
+        values = dict(zip(names, combo))
+        params = RetrievalParams(max_citations=args.max_citations, **values)
+        k = params.search_candidates_k
+
+        retrieved = []
+        for ids, scores in candidates:
+            ids, scores = ids[:k], scores[:k]
+            reason, _ = abstention(ids, scores, params)
+            retrieved.append(select_rows(ids, scores, chunk_map, params) if reason is None else [])
+
+        gold_m, ne_m, _ = score_cases(cases, retrieved, args.k, args.page_offset, args.page_tolerance)
+        results.append({**values, **summarize(gold_m, ne_m)})
+    sweep_s = time.perf_counter() - t0
+
+    front = _pareto(results)
+    current = {
+        "search_candidates_k": settings.search_candidates_k,
+        "min_top_score": settings.min_top_score,
+        "min_top_score_margin": settings.min_top_score_margin,
+        "min_row_score": settings.min_row_score,
+        "min_score_gap": settings.min_score_gap,
+    }
+    report = {
+        "k": args.k,
+        "data": args.data,
+        "cases_total": len(cases),
+        "index": cached["index"],
+        "max_candidates_k": max_k,
+        "combinations": len(results),
+        "sweep_s": sweep_s,
+        "current_settings": current,
+        "grid": grid,
+        "pareto_front": front,
+        "results": results,
+    }
+    os.makedirs(os.path.dirname(args.out), exist_ok=True)
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    def fmt(x):
+        return "  none" if x is None else f"{x:6.3f}"
+
+    print(f"Threshold sweep: {len(results)} combinations over {len(cases)} cases in {sweep_s:.2f}s")
+    print(f"Pareto front (Recall@{args.k} vs no-evidence accuracy):")
+    print(f"{'k':>4} {'top':>6} {'margin':>6} {'row':>6} {'gap':>6} | {'recall':>6} {'mrr':>6} {'ne_acc':>6} {'fer':>6}")
+    for r in front:
+        print(
+            f"{r['search_candidates_k']:>4} {fmt(r['min_top_score'])} {fmt(r['min_top_score_margin'])} "
+            f"{fmt(r['min_row_score'])} {fmt(r['min_score_gap'])} | {fmt(r['recall_at_k'])} {fmt(r['mrr'])} "
+            f"{fmt(r['no_evidence_accuracy'])} {fmt(r['false_evidence_rate'])}"
+        )
+    print(f"Report: {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
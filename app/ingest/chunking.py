@@ -1,8 +1,25 @@
+import os
+import json
+import re
+from functools import lru_cache
 from typing import List, Tuple, Optional
 
+from app.core.config import settings
+
+# CHUNKING_MODE values
+MODES = ("chars", "tokens")
+
+# end of a sentence followed by a space, in whitespace-collapsed text
+_SENTENCE_END = re.compile(r"[.!?;:](?= )")
+
+
+def _clean(text: str) -> str:
+    return " ".join(text.split())
+
+
 def chunk_text(page: Optional[int], text: str, chunk_size: int = 1000, overlap: int = 150):
     # yields dicts: {page, char_start, char_end, text}
-    cleaned = " ".join(text.split())
+    cleaned = _clean(text)
     if not cleaned:
         return []
 
@@ -23,3 +40,136 @@ def chunk_text(page: Optional[int], text: str, chunk_size: int = 1000, overlap:
             break
         start = max(0, end - overlap)
     return chunks
+
+
+def _cut(cleaned: str, start: int, limit: int) -> int:
+    # Best end (exclusive) in cleaned[start:limit]: after the last sentence end in
+    # the second half of the window, else before the last space, else the token
+    # boundary at limit.
+    window = cleaned[start:limit]
+    ends = [m.end() for m in _SENTENCE_END.finditer(window)]
+    if ends and ends[-1] > len(window) // 2:
+        return start + ends[-1]
+    space = window.rfind(" ")
+    if space > 0:
+        return start + space
+    return limit
+
+
+def token_chunk_text(
+    page: Optional[int],
+    cleaned: str,
+    offsets: List[Tuple[int, int]],
+    max_tokens: int,
+    overlap: int,
+) -> list[dict]:
+    """
+    Split whitespace-collapsed text into chunks of at most max_tokens tokens.
+    offsets: (char_start, char_end) of every token of cleaned, without special
+    tokens (a fast tokenizer's offset_mapping). Chunks end on a sentence or word
+    boundary when there is one in the window and consecutive chunks share about
+    `overlap` tokens. text == cleaned[char_start:char_end] for every chunk.
+    """
+    offsets = [(s, e) for s, e in offsets if e > s]
+    n = len(offsets)
+    if not cleaned or n == 0:
+        return []
+
+    chunks = []
+    i = 0
+    while i < n:
+        start = offsets[i][0]
+        j = i + max_tokens
+        if j >= n:
+            end = len(cleaned)
+        else:
+            end = _cut(cleaned, start, offsets[j][0])
+        chunks.append({
+            "page": page,
+            "char_start": start,
+            "char_end": end,
+            "text": cleaned[start:end],
+        })
+        if j >= n:
+            break
+
+        # first token past the cut, then back by `overlap` tokens to a word start
+        k = i + 1
+        while k < n and offsets[k][0] < end:
+            k += 1
+        nxt = max(k - overlap, i + 1)
+        while nxt > i + 1 and cleaned[offsets[nxt][0] - 1] != " ":
+            nxt -= 1
+        i = nxt
+    return chunks
+
+
+@lru_cache(maxsize=None)
+def load_tokenizer(model_name: str):
+    """
+    Fast tokenizer of the embedding model and the sequence length it encodes
+    (sentence-transformers max_seq_length, special tokens included). Cached per
+    process, so each ingest worker loads it once.
+    """
+    from transformers import AutoTokenizer
+
+    from app.retrieval.embeddings import _local_model_dir
+
+    src = _local_model_dir(model_name)
+    tokenizer = AutoTokenizer.from_pretrained(src, use_fast=True)
+    if not tokenizer.is_fast:
+        raise RuntimeError(f"{model_name}: token chunking needs a fast tokenizer (offset mapping)")
+    max_seq_length = tokenizer.model_max_length
+    st_config = os.path.join(src, "sentence_bert_config.json")
+    if os.path.exists(st_config):
+        with open(st_config, "r", encoding="utf-8") as f:
+            max_seq_length = int(json.load(f).get("max_seq_length") or max_seq_length)
+    return tokenizer, int(max_seq_length)
+
+
+def token_budget(model_name: str, max_tokens: int) -> int:
+    # content tokens per chunk: CHUNK_MAX_TOKENS capped by the model window,
+    # minus the [CLS]/[SEP] (or equivalent) the encoder adds
+    tokenizer, max_seq_length = load_tokenizer(model_name)
+    return min(max_tokens, max_seq_length) - tokenizer.num_special_tokens_to_add(pair=False)
+
+
+def chunk_pages(pages: List[Tuple[Optional[int], str]], mode: Optional[str] = None) -> list[dict]:
+    """
+    Chunk the (page, text) pairs of one document (or page range) in page order.
+    mode "chars": fixed 1000/150 character windows. "tokens": windows sized with
+    the embedding model tokenizer, all pages tokenized in one batched call.
+    """
+    mode = mode or settings.chunking_mode
+    if mode not in MODES:
+        raise ValueError(f"Unknown CHUNKING_MODE={mode!r}. Expected one of {MODES}")
+
+    if mode == "chars":
+        chunks = []
+        for page_num, text in pages:
+            chunks.extend(chunk_text(page_num, text))
+        return chunks
+
+    cleaned = [(page_num, _clean(text)) for page_num, text in pages]
+    cleaned = [(page_num, text) for page_num, text in cleaned if text]
+    if not cleaned:
+        return []
+
+    model_name = settings.embedding_model_name
+    tokenizer, _ = load_tokenizer(model_name)
+    budget = token_budget(model_name, settings.chunk_max_tokens)
+    overlap = min(settings.chunk_overlap_tokens, budget // 2)
+    enc = tokenizer(
+        [text for _, text in cleaned],
+        add_special_tokens=False,
+        return_offsets_mapping=True,
+        return_attention_mask=False,
+        return_token_type_ids=False,
+        truncation=False,
+        verbose=False,
+    )
+
+    chunks = []
+    for (page_num, text), offsets in zip(cleaned, enc["offset_mapping"]):
+        chunks.extend(token_chunk_text(page_num, text, offsets, budget, overlap))
+    return chunks
@@ -0,0 +1,149 @@
+import re
+import zlib
+import hashlib
+from typing import Optional
+
+import numpy as np
+
+# Near-duplicate chunks (repeated headers, disclaimers, slide templates) via
+# MinHash over word 3-gram shingles + LSH banding. A duplicate keeps its row in
+# `chunks` but points at a canonical chunk (chunks.canonical_chunk_id) and gets
+# no vector of its own. Every chunk's signature is kept in chunk_minhash, but
+# only canonical chunks are returned as candidates. When the document owning a
+# canonical chunk is replaced, its duplicates are re-pointed at the matching
+# chunk of the new version (match_replaced) or one of them is promoted.
+#
+# Signatures are persisted: NUM_PERM, BANDS and the hash functions below are
+# part of the on-disk format and must not change without re-ingesting.
+
+NUM_PERM = 128
+BANDS = 16  # 8 rows per band: candidate pairs from Jaccard ~0.7 up
+SHINGLE = 3
+
+_PRIME = (1 << 31) - 1
+_WORD = re.compile(r"\w+")
+
+
+def _perm_params() -> tuple[np.ndarray, np.ndarray]:
+    # derived from fixed labels rather than a RNG so they never drift between
+    # numpy versions
+    a, b = [], []
+    for i in range(NUM_PERM):
+        h = hashlib.blake2b(f"minhash-{i}".encode(), digest_size=8).digest()
+        a.append(int.from_bytes(h[:4], "little") % (_PRIME - 1) + 1)
+        b.append(int.from_bytes(h[4:], "little") % _PRIME)
+    return np.asarray(a, dtype=np.uint64), np.asarray(b, dtype=np.uint64)
+
+
+_A, _B = _perm_params()
+
+
+def shingles(text: str) -> np.ndarray:
+    words = _WORD.findall(text.lower())
+    if not words:
+        return np.zeros(0, dtype=np.uint64)
+    grams = {" ".join(words[i : i + SHINGLE]) for i in range(max(len(words) - SHINGLE + 1, 1))}
+    return np.asarray([zlib.crc32(g.encode("utf-8")) % _PRIME for g in grams], dtype=np.uint64)
+
+
+def signature(text: str) -> Optional[np.ndarray]:
+    # uint32[NUM_PERM], or None for text without words (never deduplicated)
+    x = shingles(text)
+    if x.size == 0:
+        return None
+    # a < 2^31, x < 2^31: a * x + b fits in uint64
+    hashed = (_A[:, None] * x[None, :] + _B[:, None]) % _PRIME
+    return hashed.min(axis=1).astype(np.uint32)
+
+
+def buckets(sig: np.ndarray) -> list[int]:
+    # one signed 64-bit key per band; the band number is part of the key, so
+    # all keys can live in a single BIGINT[] column
+    rows = len(sig) // BANDS
+    out = []
+    for band in range(BANDS):
+        h = hashlib.blake2b(bytes([band]) + sig[band * rows : (band + 1) * rows].tobytes(), digest_size=8)
+        out.append(int.from_bytes(h.digest(), "little", signed=True))
+    return out
+
+
+def similarity(a: np.ndarray, b: np.ndarray) -> float:
+    # MinHash estimate of the Jaccard similarity of the shingle sets
+    return float(np.mean(a == b))
+
+
+def assign_canonical(chunks: list[dict], candidates: list[tuple[int, bytes]], threshold: float) -> int:
+    """
+    Mark near-duplicates in one document's chunks (each with "minhash", a
+    signature or None, and "chunk_index"), in order. A chunk matches a canonical
+    chunk already in the DB (candidates: (chunk_id, signature bytes)), or an
+    earlier canonical chunk of the same document. Sets "canonical_chunk_id" or
+    "canonical_index" on duplicates, and "buckets" on every chunk with a
+    signature (duplicates keep theirs in case they get promoted).
+    Returns the number of duplicates.
+    """
+    # bucket -> [(kind, id, signature)]; kind "db" => chunk_id, "doc" => chunk_index
+    table: dict[int, list[tuple[str, int, np.ndarray]]] = {}
+    for chunk_id, sig_bytes in candidates:
+        sig = np.frombuffer(sig_bytes, dtype=np.uint32)
+        for key in buckets(sig):
+            table.setdefault(key, []).append(("db", chunk_id, sig))
+
+    duplicates = 0
+    for ch in chunks:
+        sig = ch.get("minhash")
+        if sig is None:
+            continue
+        keys = ch["buckets"] = buckets(sig)
+        best: Optional[tuple[float, str, int]] = None
+        seen: set[tuple[str, int]] = set()
+        for key in keys:
+            for kind, ref, other in table.get(key, ()):
+                if (kind, ref) in seen:
+                    continue
+                seen.add((kind, ref))
+                sim = similarity(sig, other)
+                if sim >= threshold and (best is None or sim > best[0]):
+                    best = (sim, kind, ref)
+
+        if best is None:
+            for key in keys:
+                table.setdefault(key, []).append(("doc", ch["chunk_index"], sig))
+            continue
+        duplicates += 1
+        if best[1] == "db":
+            ch["canonical_chunk_id"] = best[2]
+        else:
+            ch["canonical_index"] = best[2]
+    return duplicates
+
+
+def match_replaced(
+    chunks: list[dict], replaced: list[tuple[int, bytes]], threshold: float
+) -> dict[int, tuple[Optional[int], Optional[int]]]:
+    """
+    Canonical chunks of the version being replaced that have duplicates
+    elsewhere (replaced: (chunk_id, signature bytes)) -> what those duplicates
+    should point at instead, after assign_canonical ran on the new version:
+    (chunk_index, None) for a canonical chunk of the new version, (None,
+    chunk_id) when the matching new chunk is itself a duplicate of an existing
+    chunk. Old chunks without a match are left out; the caller promotes one of
+    their duplicates.
+    """
+    new = [ch for ch in chunks if ch.get("minhash") is not None]
+    if not new or not replaced:
+        return {}
+    sigs = np.stack([ch["minhash"] for ch in new])
+
+    out = {}
+    for chunk_id, sig_bytes in replaced:
+        sims = np.mean(sigs == np.frombuffer(sig_bytes, dtype=np.uint32), axis=1)
+        best = int(np.argmax(sims))
+        if sims[best] < threshold:
+            continue
+        ch = new[best]
+        if ch.get("canonical_chunk_id") is not None:
+            out[chunk_id] = (None, ch["canonical_chunk_id"])
+        else:
+            out[chunk_id] = (ch.get("canonical_index", ch["chunk_index"]), None)
+    return out
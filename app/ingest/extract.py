@@ -6,10 +6,16 @@ def extract_text_from_md_or_txt(path: Path) -> List[Tuple[Optional[int], str]]:
     # returns list of (page, text). For md/txt page=None
     return [(None, path.read_text(encoding="utf-8", errors="ignore"))]
 
-def extract_text_from_pdf(path: Path) -> List[Tuple[Optional[int], str]]:
+def pdf_page_count(path: Path) -> int:
+    return len(PdfReader(str(path)).pages)
+
+def extract_text_from_pdf(path: Path, start: int = 0, stop: Optional[int] = None) -> List[Tuple[Optional[int], str]]:
+    # start/stop: 0-based page range, so large PDFs can be split across workers
     reader = PdfReader(str(path))
+    n = len(reader.pages)
+    stop = n if stop is None else min(stop, n)
     out: List[Tuple[Optional[int], str]] = []
-    for i, page in enumerate(reader.pages):
-        txt = page.extract_text() or ""
+    for i in range(start, stop):
+        txt = reader.pages[i].extract_text() or ""
         out.append((i + 1, txt))
     return out
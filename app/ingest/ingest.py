@@ -1,12 +1,36 @@
+import argparse
 import hashlib
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
 from pathlib import Path
 from typing import Optional
-from app.ingest.extract import extract_text_from_md_or_txt, extract_text_from_pdf
-from app.ingest.chunking import chunk_text
-from app.db.repo import upsert_document, insert_chunk
+from app.ingest.extract import extract_text_from_md_or_txt, extract_text_from_pdf, pdf_page_count
+from app.core.config import settings
+from app.ingest.chunking import chunk_pages
+from app.ingest.dedup import assign_canonical, buckets, match_replaced, signature
+from app.db.repo import (
+    fetch_ingested_documents,
+    fetch_minhash_candidates,
+    fetch_replaced_canonicals,
+    write_document_chunks,
+)
 
 SUPPORTED = {".md", ".txt", ".pdf"}
 
+# PDFs longer than this are split into page ranges, one task per range
+PDF_PAGES_PER_TASK = 64
+
+@dataclass
+class IngestStats:
+    new: int = 0
+    unchanged: int = 0
+    replaced: int = 0
+    chunks: int = 0
+    duplicates: int = 0
+    dedup_s: float = 0.0
+
 def sha256_file(path: Path) -> str:
     h = hashlib.sha256()
     with path.open("rb") as f:
@@ -24,45 +48,142 @@ def detect_type(path: Path) -> str:
         return "pdf"
     return "unknown"
 
-def ingest_dir(docs_dir: Path) -> int:
-    total_chunks = 0
-    for path in docs_dir.rglob("*"):
-        if not path.is_file():
-            continue
-        if path.suffix.lower() not in SUPPORTED:
+def list_documents(docs_dir: Path) -> list[Path]:
+    # sorted => same document order (and chunk ids) on every run
+    return sorted(
+        p for p in docs_dir.rglob("*")
+        if p.is_file() and p.suffix.lower() in SUPPORTED
+    )
+
+def extract_and_chunk(path: str, doc_type: str, start: int = 0, stop: Optional[int] = None) -> list[dict]:
+    # Worker entrypoint (top-level so it pickles). Returns chunks in page order,
+    # without chunk_index: the writer assigns it.
+    if doc_type in ("md", "txt"):
+        pages = extract_text_from_md_or_txt(Path(path))
+    else:
+        pages = extract_text_from_pdf(Path(path), start, stop)
+
+    chunks = chunk_pages(pages)
+    if settings.dedup_enabled:
+        # signatures are computed here, in the workers; matching needs the
+        # DB and runs in the writer
+        for ch in chunks:
+            ch["minhash"] = signature(ch["text"])
+    return chunks
+
+def _page_ranges(path: Path, doc_type: str) -> list[tuple[int, Optional[int]]]:
+    if doc_type != "pdf":
+        return [(0, None)]
+    n = pdf_page_count(path)
+    if n <= PDF_PAGES_PER_TASK:
+        return [(0, None)]
+    return [(s, min(s + PDF_PAGES_PER_TASK, n)) for s in range(0, n, PDF_PAGES_PER_TASK)]
+
+def _describe(path: Path, docs_dir: Path) -> dict:
+    return {
+        "path": path,
+        "source": str(path.relative_to(docs_dir)),
+        "doc_type": detect_type(path),
+        "sha256": sha256_file(path),
+        "bytes": path.stat().st_size,
+    }
+
+def _write(doc: dict, chunks: list[dict], stats: IngestStats) -> None:
+    for i, ch in enumerate(chunks):
+        ch["chunk_index"] = i
+    repoint = None
+    if settings.dedup_enabled:
+        t0 = time.perf_counter()
+        keys = sorted({k for ch in chunks if ch.get("minhash") is not None for k in buckets(ch["minhash"])})
+        candidates = fetch_minhash_candidates(keys, doc["source"])
+        stats.duplicates += assign_canonical(chunks, candidates, settings.dedup_threshold)
+        # duplicates elsewhere of the version being replaced follow its successor
+        replaced_canonicals = fetch_replaced_canonicals(doc["source"], doc["sha256"])
+        repoint = match_replaced(chunks, replaced_canonicals, settings.dedup_threshold)
+        stats.dedup_s += time.perf_counter() - t0
+    # one transaction per document: document row + all its chunks, and the
+    # previous versions of this source are retired in the same transaction
+    _, _, replaced = write_document_chunks(
+        doc["source"], doc["doc_type"], doc["sha256"], doc["bytes"], chunks, repoint=repoint
+    )
+    if replaced:
+        stats.replaced += 1
+    else:
+        stats.new += 1
+    stats.chunks += len(chunks)
+
+def ingest_dir(docs_dir: Path, workers: int = 1) -> IngestStats:
+    stats = IngestStats()
+    ingested = fetch_ingested_documents()
+
+    # Hash first: documents already fully ingested with the same content are
+    # skipped before any extraction work.
+    docs = []
+    for path in list_documents(docs_dir):
+        doc = _describe(path, docs_dir)
+        if (doc["source"], doc["sha256"]) in ingested:
+            stats.unchanged += 1
             continue
+        docs.append(doc)
 
-        doc_type = detect_type(path)
-        digest = sha256_file(path)
-        size = path.stat().st_size
-        source = str(path.relative_to(docs_dir))
-
-        doc_id = upsert_document(source, doc_type, digest, size)
-
-        if doc_type in ("md", "txt"):
-            pages = extract_text_from_md_or_txt(path)
-        else:
-            pages = extract_text_from_pdf(path)
-
-        chunk_index = 0
-        for page_num, text in pages:
-            for ch in chunk_text(page_num, text):
-                insert_chunk(
-                    document_id=doc_id,
-                    chunk_index=chunk_index,
-                    page=ch["page"],
-                    char_start=ch["char_start"],
-                    char_end=ch["char_end"],
-                    text=ch["text"],
-                )
-                total_chunks += 1
-                chunk_index += 1
-
-    return total_chunks
+    if workers <= 1:
+        for doc in docs:
+            _write(doc, extract_and_chunk(str(doc["path"]), doc["doc_type"]), stats)
+        return stats
 
-if __name__ == "__main__":
-    docs = Path("data/docs")
+    # Workers extract + chunk; this process is the single DB writer. Documents are
+    # written in list order and page ranges concatenated in order, so chunk_index
+    # is identical to a serial run. At most `2 * workers` documents are in flight
+    # to keep memory bounded when the writer is slower than extraction.
+    with ProcessPoolExecutor(max_workers=workers) as ex:
+        pending: deque = deque()
+        todo = iter(docs)
+
+        def submit_next() -> bool:
+            doc = next(todo, None)
+            if doc is None:
+                return False
+            futures = [
+                ex.submit(extract_and_chunk, str(doc["path"]), doc["doc_type"], start, stop)
+                for start, stop in _page_ranges(doc["path"], doc["doc_type"])
+            ]
+            pending.append((doc, futures))
+            return True
+
+        while len(pending) < 2 * workers and submit_next():
+            pass
+
+        while pending:
+            doc, futures = pending.popleft()
+            chunks: list[dict] = []
+            for fut in futures:
+                chunks.extend(fut.result())
+            _write(doc, chunks, stats)
+            submit_next()
+
+    return stats
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--docs-dir", default="data/docs")
+    ap.add_argument("--workers", type=int, default=1, help="Extraction/chunking processes (1 = serial)")
+    args = ap.parse_args()
+
+    docs = Path(args.docs_dir)
     if not docs.exists():
-        raise SystemExit("Missing data/docs. Create it and add .md/.txt/.pdf files.")
-    n = ingest_dir(docs)
+        raise SystemExit(f"Missing {docs}. Create it and add .md/.txt/.pdf files.")
+
+    t0 = time.perf_counter()
+    stats = ingest_dir(docs, workers=args.workers)
+    elapsed = time.perf_counter() - t0
+    n = stats.chunks
+    print(f"Documents: new={stats.new} unchanged={stats.unchanged} replaced={stats.replaced}")
     print(f"Ingested chunks: {n}")
+    if settings.dedup_enabled:
+        share = stats.duplicates / n if n else 0.0
+        print(f"Near-duplicates: {stats.duplicates} ({share:.1%}, no vector of their own) in {stats.dedup_s:.1f}s")
+    print(f"Elapsed: {elapsed:.1f}s ({n / elapsed if elapsed > 0 else 0.0:.1f} chunks/s)")
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
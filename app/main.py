@@ -1,25 +1,89 @@
+import time
+
+_t_import = time.perf_counter()
+
 import logging
+import threading
 from contextlib import asynccontextmanager
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI, HTTPException
 
 from app.core.config import settings
 from app.core.logging import configure_logging
 from app.core.middleware import RequestIdMiddleware
+from app.core.readiness import readiness
 from app.api.routes.health import router as health_router
 from app.api.routes.ask import router as ask_router
-from app.retrieval.index_store import load_index_bundle
+from app.api.routes.diagnostics import router as diagnostics_router
+from app.api.routes.metrics import router as metrics_router
+from app.retrieval.index_store import load_index_bundle, start_reloader, stop_batcher, stop_reloader
+from app.db.conn import open_pool, close_pool
 
 configure_logging(settings.log_level)
+logger = logging.getLogger("app.startup")
+
+readiness.record("imports", (time.perf_counter() - _t_import) * 1000)
+
+def _startup() -> None:
+    with readiness.phase("db_pool"):
+        # in local retrieval mode queries don't need Postgres, so don't block
+        # startup on it (the pool keeps reconnecting in the background)
+        open_pool(wait=settings.retrieval_mode != "local")
+    with readiness.phase("index_load"):
+        bundle = load_index_bundle()
+    for name, ms in bundle.timings_ms.items():
+        readiness.record(f"index_load.{name}", ms)
+    start_reloader()
+    readiness.mark_ready()
+    logger.info("startup_ready phases_ms=%s", readiness.snapshot()["phases_ms"])
+
+STARTUP_MAX_BACKOFF_S = 60.0
+
+def _startup_in_background() -> None:
+    # transient failures are retried with exponential backoff; once the retries
+    # run out the worker is marked failed and /health/live turns 503, so the
+    # orchestrator restarts it like a crashed blocking startup
+    delay = settings.startup_retry_backoff_s
+    for attempt in range(settings.startup_retries + 1):
+        try:
+            _startup()
+            return
+        except Exception as exc:
+            if attempt == settings.startup_retries:
+                readiness.mark_failed(exc)
+                logger.exception("startup_failed attempts=%d", attempt + 1)
+                return
+            readiness.mark_retrying(exc)
+            logger.warning("startup_retry attempt=%d delay_s=%.1f error=%r", attempt + 1, delay, exc)
+            time.sleep(delay)
+            delay = min(delay * 2, STARTUP_MAX_BACKOFF_S)
+
+def require_ready() -> None:
+    # background startup: refuse traffic until the model and index are warm
+    if settings.startup_mode == "background" and not readiness.is_ready():
+        raise HTTPException(status_code=503, detail=f"Service {readiness.state}")
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # startup
-    load_index_bundle()
+    if settings.startup_mode == "background":
+        # accept connections right away (/health/live answers), load in a thread
+        threading.Thread(target=_startup_in_background, name="startup", daemon=True).start()
+    else:
+        try:
+            _startup()
+        except Exception as exc:
+            readiness.mark_failed(exc)
+            raise
     yield
-    # shutdown (si algún día quieres cerrar cosas)
+    # shutdown
+    stop_reloader()
+    stop_batcher()
+    close_pool()
 
 app = FastAPI(title=settings.app_name, lifespan=lifespan)
 
 app.add_middleware(RequestIdMiddleware)
 app.include_router(health_router)
-app.include_router(ask_router)
+app.include_router(metrics_router)
+app.include_router(ask_router, dependencies=[Depends(require_ready)])
+app.include_router(diagnostics_router, dependencies=[Depends(require_ready)])
@@ -0,0 +1,108 @@
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+from typing import Callable, Optional
+
+SearchResult = tuple[list[int], list[float]]
+BatchFn = Callable[[list[str], int], list[SearchResult]]
+
+
+class MicroBatcher:
+    """
+    Collects queries from concurrent requests for up to `window_ms` (or until
+    `max_batch` are waiting), runs them through `fn` as one batch on a single
+    worker thread and hands each caller its own result.
+    """
+
+    def __init__(self, fn: BatchFn, window_ms: float, max_batch: int):
+        self._fn = fn
+        self._window_s = window_ms / 1000.0
+        self._max_batch = max(1, max_batch)
+        self._queue: "queue.Queue[Optional[tuple[str, int, Future]]]" = queue.Queue()
+        self._sizes: Counter = Counter()
+        self._stats_lock = threading.Lock()
+        # submit/close ordering: nothing is queued after the shutdown marker
+        self._closed = False
+        self._closed_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="query-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, query: str, top_k: int) -> SearchResult:
+        fut: Future = Future()
+        with self._closed_lock:
+            closed = self._closed
+            if not closed:
+                self._queue.put((query, top_k, fut))
+        if closed:
+            # shutting down: run it unbatched rather than wait on a dead worker
+            ids, scores = self._fn([query], top_k)[0]
+            return ids[:top_k], scores[:top_k]
+        return fut.result()
+
+    def close(self) -> None:
+        with self._closed_lock:
+            self._closed = True
+            self._queue.put(None)
+        self._thread.join(timeout=5)
+        # the worker stopped (or is stuck past the timeout): fail whatever it
+        # didn't pick up instead of leaving callers blocked forever
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not None and not item[2].done():
+                item[2].set_exception(RuntimeError("query batcher closed"))
+        if self._thread.is_alive():
+            self._queue.put(None)
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            sizes = dict(sorted(self._sizes.items()))
+        batches = sum(sizes.values())
+        queries = sum(size * n for size, n in sizes.items())
+        return {
+            "batches": batches,
+            "queries": queries,
+            "mean_batch_size": (queries / batches) if batches else 0.0,
+            "batch_size_counts": sizes,
+        }
+
+    def _collect(self, first: tuple[str, int, Future]) -> list[tuple[str, int, Future]]:
+        batch = [first]
+        deadline = time.monotonic() + self._window_s
+        while len(batch) < self._max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                self._queue.put(None)  # let the loop see the shutdown
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            batch = self._collect(first)
+
+            with self._stats_lock:
+                self._sizes[len(batch)] += 1
+
+            top_k = max(k for _, k, _ in batch)
+            try:
+                results = self._fn([q for q, _, _ in batch], top_k)
+            except Exception as exc:
+                for _, _, fut in batch:
+                    fut.set_exception(exc)
+                continue
+            for (_, k, fut), (ids, scores) in zip(batch, results):
+                fut.set_result((ids[:k], scores[:k]))
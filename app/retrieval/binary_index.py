@@ -0,0 +1,206 @@
+import json
+import threading
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+
+# INDEX_TYPE=binary_rescore: 1 bit per dimension (sign of the normalized vector)
+# searched by Hamming distance with faiss.IndexBinaryFlat, then the best
+# k * rescore_factor candidates are re-scored exactly (inner product) against
+# float16 copies of the vectors. 48 B of codes + 768 B of fp16 per vector at
+# dim 384, against 1536 B for IndexFlatIP.
+#
+# Not a faiss index, but it quacks like the part of one that the build and
+# the API use: add_with_ids, remove_ids, search, ntotal, is_trained. Written to
+# index.faiss in its own format (MAGIC + JSON header + raw arrays) so the fp16
+# vectors can be memory-mapped with INDEX_LOAD_MODE=mmap.
+
+MAGIC = b"DABRIDX1"
+_ALIGN = 64
+# what faiss returns for missing results with METRIC_INNER_PRODUCT
+_EMPTY_SCORE = np.float32(-3.4028235e38)
+
+
+@dataclass(frozen=True)
+class RescoreSearchParams:
+    """Per-call restriction to `ids` (filtered search); see index_factory.search_parameters."""
+
+    ids: np.ndarray
+
+
+def is_binary_rescore_file(path: str) -> bool:
+    with open(path, "rb") as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def _pack(x: np.ndarray) -> np.ndarray:
+    return np.packbits(np.asarray(x) > 0, axis=1)
+
+
+def _aligned(n: int) -> int:
+    return (n + _ALIGN - 1) // _ALIGN * _ALIGN
+
+
+class BinaryRescoreIndex:
+    def __init__(self, d: int, rescore_factor: int = 10):
+        if d % 8:
+            raise ValueError(f"binary_rescore needs a dimension multiple of 8, got {d}")
+        self.d = d
+        self.rescore_factor = rescore_factor
+        self.is_trained = True
+        self.ids = np.zeros(0, dtype="int64")
+        self.codes = np.zeros((0, d // 8), dtype=np.uint8)
+        self.vectors = np.zeros((0, d), dtype=np.float16)
+        # batches added since the last consolidation (streaming build)
+        self._pending: list[tuple[np.ndarray, np.ndarray, np.ndarray]] = []
+        self._binary = None
+        self._order: Optional[np.ndarray] = None
+        self._lock = threading.Lock()
+
+    @property
+    def ntotal(self) -> int:
+        return len(self.ids) + sum(len(p[0]) for p in self._pending)
+
+    def _consolidate(self) -> None:
+        if not self._pending:
+            return
+        ids, codes, vectors = zip(*self._pending)
+        self.ids = np.concatenate([self.ids, *ids])
+        self.codes = np.concatenate([self.codes, *codes])
+        self.vectors = np.concatenate([self.vectors, *vectors])
+        self._pending = []
+
+    def _invalidate(self) -> None:
+        self._binary = None
+        self._order = None
+
+    def id_array(self) -> np.ndarray:
+        self._consolidate()
+        return np.array(self.ids, dtype="int64")
+
+    def add_with_ids(self, x: np.ndarray, ids: np.ndarray) -> None:
+        x = np.asarray(x, dtype="float32")
+        self._pending.append((np.asarray(ids, dtype="int64").copy(), _pack(x), x.astype(np.float16)))
+        self._invalidate()
+
+    def remove_ids(self, ids: np.ndarray) -> int:
+        self._consolidate()
+        keep = ~np.isin(self.ids, np.asarray(ids, dtype="int64"))
+        removed = int(len(keep) - keep.sum())
+        if removed:
+            self.ids, self.codes, self.vectors = self.ids[keep], self.codes[keep], self.vectors[keep]
+            self._invalidate()
+        return removed
+
+    def _prepare(self):
+        # faiss binary index over the codes + id order for filtered lookups;
+        # built once after a load/add (the warm-up query does it)
+        with self._lock:
+            self._consolidate()
+            if self._binary is None:
+                import faiss
+
+                binary = faiss.IndexBinaryFlat(self.d)
+                if len(self.codes):
+                    binary.add(np.ascontiguousarray(self.codes))
+                self._order = np.argsort(self.ids, kind="stable")
+                self._binary = binary
+            return self._binary, self._order
+
+    def _positions(self, ids: np.ndarray, order: np.ndarray) -> np.ndarray:
+        ids = np.asarray(ids, dtype="int64")
+        sorted_ids = self.ids[order]
+        pos = np.searchsorted(sorted_ids, ids)
+        pos = np.clip(pos, 0, max(len(sorted_ids) - 1, 0))
+        found = sorted_ids[pos] == ids if len(sorted_ids) else np.zeros(len(ids), dtype=bool)
+        return order[pos[found]]
+
+    def search(self, x: np.ndarray, k: int, params: Optional[RescoreSearchParams] = None):
+        x = np.ascontiguousarray(x, dtype="float32")
+        D = np.full((x.shape[0], k), _EMPTY_SCORE, dtype="float32")
+        I = np.full((x.shape[0], k), -1, dtype="int64")
+        binary, order = self._prepare()
+        if not len(self.ids):
+            return D, I
+
+        n_cand = max(k * self.rescore_factor, k)
+        codes = _pack(x)
+        if params is None:
+            _, cand = binary.search(codes, min(n_cand, len(self.ids)))
+        else:
+            allowed = self._positions(params.ids, order)
+            if len(allowed) <= n_cand:
+                cand = np.broadcast_to(allowed, (x.shape[0], len(allowed)))
+            else:
+                import faiss
+
+                # Hamming scan of the allowed codes only
+                sub = faiss.IndexBinaryFlat(self.d)
+                sub.add(np.ascontiguousarray(self.codes[allowed]))
+                _, sub_cand = sub.search(codes, n_cand)
+                cand = np.where(sub_cand >= 0, allowed[np.maximum(sub_cand, 0)], -1)
+
+        for r in range(x.shape[0]):
+            pos = cand[r][cand[r] >= 0]
+            if not len(pos):
+                continue
+            scores = self.vectors[pos].astype("float32") @ x[r]
+            top = np.argsort(-scores, kind="stable")[:k]
+            D[r, : len(top)] = scores[top]
+            I[r, : len(top)] = self.ids[pos[top]]
+        return D, I
+
+    def nbytes(self) -> int:
+        self._consolidate()
+        return int(self.ids.nbytes + self.codes.nbytes + self.vectors.nbytes)
+
+    def write(self, path: str) -> None:
+        self._consolidate()
+        n = len(self.ids)
+        layout = {}
+        offset = 0
+        for name, arr in (("ids", self.ids), ("codes", self.codes), ("vectors", self.vectors)):
+            layout[name] = offset
+            offset = _aligned(offset + arr.nbytes)
+        header = json.dumps({
+            "d": self.d,
+            "n": n,
+            "rescore_factor": self.rescore_factor,
+            "offsets": layout,
+        }).encode("utf-8")
+        data_start = _aligned(len(MAGIC) + 8 + len(header))
+
+        with open(path, "wb") as f:
+            f.write(MAGIC)
+            f.write(len(header).to_bytes(8, "little"))
+            f.write(header)
+            for name, arr in (("ids", self.ids), ("codes", self.codes), ("vectors", self.vectors)):
+                f.seek(data_start + layout[name])
+                np.ascontiguousarray(arr).tofile(f)
+            f.truncate(data_start + offset)
+
+    @classmethod
+    def read(cls, path: str, mmap: bool = False) -> "BinaryRescoreIndex":
+        with open(path, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise RuntimeError(f"{path} is not a binary_rescore index")
+            header_len = int.from_bytes(f.read(8), "little")
+            header = json.loads(f.read(header_len))
+        data_start = _aligned(len(MAGIC) + 8 + header_len)
+        d, n = int(header["d"]), int(header["n"])
+
+        index = cls(d, int(header["rescore_factor"]))
+        shapes = {"ids": ((n,), "int64"), "codes": ((n, d // 8), np.uint8), "vectors": ((n, d), np.float16)}
+        for name, (shape, dtype) in shapes.items():
+            start = data_start + header["offsets"][name]
+            if not n:
+                arr = np.zeros(shape, dtype=dtype)
+            elif mmap:
+                # fp16 vectors stay in the page cache; rescoring touches only candidates
+                arr = np.memmap(path, dtype=dtype, mode="r", offset=start, shape=shape)
+            else:
+                count = int(np.prod(shape))
+                arr = np.fromfile(path, dtype=dtype, count=count, offset=start).reshape(shape)
+            setattr(index, name, arr)
+        return index
@@ -1,53 +1,384 @@
 import os
 import json
+import time
+import shutil
+import argparse
 from pathlib import Path
 import faiss
 import numpy as np
 
 from app.core.config import settings
-from app.db.queries import fetch_all_chunks, upsert_chunk_embedding
+from app.db.conn import get_conn
+from app.db.queries import (
+    bulk_upsert_chunk_embeddings,
+    count_duplicate_chunks,
+    fetch_embedded_chunk_ids,
+    iter_chunk_batches,
+    iter_chunk_rows,
+)
 from app.retrieval.embeddings import Embedder
+from app.retrieval.embedding_cache import EmbeddingCache
+from app.retrieval.index_factory import (
+    build_params,
+    create_index,
+    index_ids,
+    index_params_from_settings,
+    min_train_vectors,
+    read_index,
+    supports_remove,
+    train_size,
+    with_query_settings,
+    write_index,
+)
+from app.retrieval import chunk_store, versions
+
+# faiss_id == chunks.id: vectors are added with explicit ids through an IndexIDMap2,
+# so ids are stable across builds and single vectors can be added/removed.
+ID_SCHEME = "chunk_id"
+
+# Resumable build state lives here until the build is published
+CHECKPOINT_DIR = ".build"
 
 def ensure_dir(path: str) -> None:
     Path(path).mkdir(parents=True, exist_ok=True)
 
-def main():
-    chunks = fetch_all_chunks()
-    if not chunks:
-        raise SystemExit("No chunks found in DB. Run ingestion first.")
+def _load_existing(embedder: Embedder) -> tuple[faiss.Index, dict] | None:
+    base = versions.current_dir()
+    if base is None or not os.path.exists(os.path.join(base, "meta.json")):
+        return None
+    meta = versions.load_meta(base)
+    if meta.get("id_scheme") != ID_SCHEME or meta.get("model_name") != settings.embedding_model_name:
+        return None
+    # vectors from another backend (torch vs ONNX, int8) must not be mixed in;
+    # indexes built before embedding_variant existed are torch fp32
+    if meta.get("embedding_variant", meta["model_name"]) != embedder.variant:
+        return None
+    # changing INDEX_TYPE or its build knobs needs a full rebuild; query knobs
+    # (nprobe / efSearch) and sample sizes don't
+    if build_params(_index_params(meta)) != build_params(index_params_from_settings()):
+        return None
+    return read_index(os.path.join(base, "index.faiss")), meta
 
-    texts = [c["text"] for c in chunks]
-    chunk_ids = [int(c["chunk_id"]) for c in chunks]
+def _index_params(meta: dict) -> dict:
+    # indexes built before index_params existed are flat
+    return meta.get("index_params") or {"index_type": meta.get("index_type", "flat")}
 
-    embedder = Embedder(settings.embedding_model_name)
-    embs = embedder.encode(texts)  # [n, dim], normalized
+def _publish(
+    index: faiss.Index,
+    dim: int,
+    index_params: dict,
+    chunk_ids: np.ndarray,
+    replace_all: bool,
+    embedder: Embedder,
+    embed_s_per_chunk: float | None = None,
+) -> str:
+    """
+    Write the index and its chunk store into a new immutable version dir, then merge the
+    chunk_id -> faiss_id mapping and flip CURRENT to the new version in a single
+    DB transaction: the flip is its last step, so a failed flip rolls the mapping
+    back and a failed commit restores the previous CURRENT. The DB mapping and
+    the published index never disagree.
+    """
+    version = versions.new_version()
+    out_dir = versions.version_dir(version)
+    ensure_dir(out_dir)
 
-    n, dim = embs.shape
+    flipped = False
+    previous = None
+    try:
+        write_index(index, os.path.join(out_dir, "index.faiss"))
+        # text/page/source for every vector, so queries can skip the DB join
+        # (RETRIEVAL_MODE=local); rewritten in full on every publish
+        t0 = time.perf_counter()
+        stored = chunk_store.write(
+            out_dir,
+            iter_chunk_rows(settings.build_batch_size),
+            index_ids(index),
+        )
+        print(f"Chunk store: {stored} chunks in {time.perf_counter() - t0:.1f}s")
+        dedup = _dedup_report(index, os.path.getsize(os.path.join(out_dir, "index.faiss")), embed_s_per_chunk)
 
-    # Use inner product on normalized vectors => cosine similarity
-    index = faiss.IndexFlatIP(dim)
-    index.add(embs)
+        meta = {
+            "version": version,
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "model_name": settings.embedding_model_name,
+            # backend that embedded the chunks (model@onnx-int8 etc.)
+            "embedding_variant": embedder.variant,
+            "dim": dim,
+            "num_vectors": int(index.ntotal),
+            "id_scheme": ID_SCHEME,
+            "index_type": index_params["index_type"],
+            "index_params": index_params,
+            "chunk_store": {"format": chunk_store.FORMAT, "num_chunks": stored},
+            "dedup": dedup,
+            "checksums": versions.checksum_files(out_dir, ["index.faiss", *chunk_store.FILES]),
+        }
+        with open(os.path.join(out_dir, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f, indent=2)
 
-    ensure_dir(settings.index_dir)
-    faiss_path = os.path.join(settings.index_dir, "index.faiss")
-    meta_path = os.path.join(settings.index_dir, "meta.json")
+        with get_conn() as conn:
+            with conn.transaction():
+                merged = bulk_upsert_chunk_embeddings(
+                    conn, chunk_ids.tolist(), settings.embedding_model_name, dim, replace_all=replace_all
+                )
+                previous = versions.swap_current(version)
+                flipped = True
+    except Exception:
+        if flipped:
+            versions.restore_current(previous)
+        shutil.rmtree(out_dir, ignore_errors=True)
+        raise
 
-    faiss.write_index(index, faiss_path)
+    removed = versions.gc_versions(settings.index_keep_versions)
+    print(f"Mappings written: {merged}")
+    print(f"Published version {version} (previous: {previous}, pruned: {len(removed)})")
+    return out_dir
 
-    meta = {
-        "model_name": settings.embedding_model_name,
-        "dim": dim,
-        "num_vectors": n,
+def _dedup_report(index: faiss.Index, index_bytes: int, embed_s_per_chunk: float | None) -> dict:
+    # near-duplicate chunks left out of the index (app/ingest/dedup.py) and what
+    # embedding + storing them would have cost, at this build's rates
+    duplicates = count_duplicate_chunks()
+    vectors = int(index.ntotal)
+    report = {
+        "duplicates_skipped": duplicates,
+        "index_size_reduction": duplicates / (duplicates + vectors) if duplicates + vectors else 0.0,
+        "est_index_bytes_saved": int(index_bytes / vectors * duplicates) if vectors else 0,
+        "est_embed_s_saved": embed_s_per_chunk * duplicates if embed_s_per_chunk is not None else None,
     }
-    with open(meta_path, "w", encoding="utf-8") as f:
-        json.dump(meta, f, indent=2)
+    if duplicates:
+        saved_s = report["est_embed_s_saved"]
+        print(
+            f"Near-duplicates skipped: {duplicates} ({report['index_size_reduction']:.1%} fewer vectors, "
+            f"~{report['est_index_bytes_saved'] / 1e6:.1f} MB of index"
+            + (f", ~{saved_s:.1f}s of embedding)" if saved_s is not None else ")")
+        )
+    return report
+
+def _embed_s_per_chunk(state: dict) -> float | None:
+    # cache hits make this lower than a cold encode; still what this build paid
+    return state["embed_s"] / state["added"] if state.get("added") and "embed_s" in state else None
+
+# --- checkpoints ---
+
+def _checkpoint_dir() -> str:
+    return os.path.join(settings.index_dir, CHECKPOINT_DIR)
+
+def _save_checkpoint(index: faiss.Index, state: dict) -> None:
+    # Each checkpoint gets its own index file and state.json is switched to it
+    # atomically, so a kill at any point leaves a consistent (index, state) pair.
+    base = _checkpoint_dir()
+    ensure_dir(base)
+    state["generation"] = state.get("generation", 0) + 1
+    index_file = f"index.partial.{state['generation']}.faiss"
+    write_index(index, os.path.join(base, index_file))
+
+    previous = state.get("index_file")
+    state["index_file"] = index_file
+    tmp = os.path.join(base, "state.json.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp, os.path.join(base, "state.json"))
+
+    if previous and previous != index_file:
+        try:
+            os.remove(os.path.join(base, previous))
+        except FileNotFoundError:
+            pass
+
+def _load_checkpoint(mode: str, embedder: Embedder) -> tuple[faiss.Index, dict] | None:
+    state_path = os.path.join(_checkpoint_dir(), "state.json")
+    if not os.path.exists(state_path):
+        return None
+    with open(state_path, "r", encoding="utf-8") as f:
+        state = json.load(f)
+    if state.get("mode") != mode or state.get("model_name") != settings.embedding_model_name:
+        return None
+    if state.get("embedding_variant") != embedder.variant:
+        return None
+    index = read_index(os.path.join(_checkpoint_dir(), state["index_file"]))
+    return index, state
+
+def _clear_checkpoint() -> None:
+    shutil.rmtree(_checkpoint_dir(), ignore_errors=True)
+
+# --- build ---
+
+def _train(index: faiss.Index, embs: np.ndarray) -> None:
+    needed = min_train_vectors(index)
+    if embs.shape[0] < needed:
+        # only IVF asks for more than one vector (one per list)
+        hint = f" (IVF_NLIST={needed}). Lower IVF_NLIST" if needed > 1 else ""
+        raise SystemExit(f"Need at least {needed} vectors to train the index{hint}, got {embs.shape[0]}.")
+    t0 = time.perf_counter()
+    index.train(embs)
+    print(f"  trained on {embs.shape[0]} vectors in {time.perf_counter() - t0:.1f}s")
+
+def _stream_into(index: faiss.Index, embedder: Embedder, state: dict, missing_only: bool) -> None:
+    """
+    Stream chunks after state["last_chunk_id"] in fixed-size batches: encode each
+    batch and add it to the index right away. Only one batch of texts/vectors is
+    alive at a time, except for untrained (IVF, sq_int8) indexes, which first
+    buffer ivf_train_size / sq_train_size vectors as the training sample.
+    """
+    sample_size = train_size(state["index_params"])
+    pending_ids: list[np.ndarray] = []
+    pending_embs: list[np.ndarray] = []
+
+    since_checkpoint = 0
+    t0 = time.perf_counter()
+
+    def add(ids: np.ndarray, embs: np.ndarray) -> None:
+        nonlocal since_checkpoint
+        index.add_with_ids(embs, ids)
+        state["last_chunk_id"] = int(ids[-1])
+        state["added"] += len(ids)
+        since_checkpoint += 1
+        if since_checkpoint >= settings.build_checkpoint_every:
+            _save_checkpoint(index, state)
+            since_checkpoint = 0
+
+        elapsed = time.perf_counter() - t0
+        print(f"  embedded {state['added']} chunks ({state['added'] / elapsed if elapsed > 0 else 0.0:.0f}/s)")
+
+    def flush_training_sample() -> None:
+        ids, embs = np.concatenate(pending_ids), np.concatenate(pending_embs)
+        pending_ids.clear()
+        pending_embs.clear()
+        _train(index, embs)
+        add(ids, embs)
+
+    for batch in iter_chunk_batches(
+        settings.build_batch_size,
+        after_chunk_id=state["last_chunk_id"],
+        missing_for_model=settings.embedding_model_name if missing_only else None,
+    ):
+        ids = np.asarray([c["chunk_id"] for c in batch], dtype="int64")
+        t_embed = time.perf_counter()
+        embs = embedder.encode([c["text"] for c in batch], show_progress_bar=False)
+        state["embed_s"] = state.get("embed_s", 0.0) + time.perf_counter() - t_embed
+
+        if not index.is_trained:
+            pending_ids.append(ids)
+            pending_embs.append(embs)
+            if sum(len(x) for x in pending_ids) >= sample_size:
+                flush_training_sample()
+            continue
+
+        add(ids, embs)
+
+    # corpus smaller than the training sample
+    if pending_ids:
+        flush_training_sample()
+
+def build_full(embedder: Embedder, resume: bool) -> None:
+    checkpoint = _load_checkpoint("full", embedder) if resume else None
+    if checkpoint is not None:
+        index, state = checkpoint
+        print(f"Resuming full build after chunk_id={state['last_chunk_id']} ({state['added']} done)")
+    else:
+        _clear_checkpoint()
+        dim = embedder.dim
+        index_params = index_params_from_settings()
+        # Use inner product on normalized vectors => cosine similarity
+        index = create_index(dim, index_params)
+        state = {"mode": "full", "model_name": settings.embedding_model_name,
+                 "embedding_variant": embedder.variant, "dim": dim, "index_params": index_params,
+                 "last_chunk_id": 0, "added": 0, "removed": 0}
+
+    _stream_into(index, embedder, state, missing_only=False)
+    if index.ntotal == 0:
+        raise SystemExit("No chunks found in DB. Run ingestion first.")
+
+    dim = int(state["dim"])
+    # Persist mapping chunk_id -> faiss_id (faiss_id is the chunk id)
+    chunk_ids = index_ids(index)
+    out_dir = _publish(
+        index, dim, state["index_params"], chunk_ids, replace_all=True, embedder=embedder,
+        embed_s_per_chunk=_embed_s_per_chunk(state),
+    )
+    _clear_checkpoint()
+
+    print(f"Built FAISS index: {out_dir} ({state['index_params']['index_type']})")
+    print(f"Vectors: {index.ntotal}, dim: {dim}")
+
+def build_incremental(embedder: Embedder, index: faiss.Index, meta: dict, resume: bool) -> None:
+    model_name = settings.embedding_model_name
+
+    checkpoint = _load_checkpoint("incremental", embedder) if resume else None
+    if checkpoint is not None:
+        index, state = checkpoint
+        print(f"Resuming incremental build after chunk_id={state['last_chunk_id']} ({state['added']} done)")
+    else:
+        _clear_checkpoint()
+        # recorded in the new meta with the current query knobs
+        index_params = with_query_settings(_index_params(meta))
+        state = {"mode": "incremental", "model_name": model_name,
+                 "embedding_variant": embedder.variant, "dim": int(meta["dim"]), "index_params": index_params,
+                 "last_chunk_id": 0, "added": 0, "removed": 0}
+
+        # 1) drop vectors whose chunk_embeddings row is gone (chunk deleted or its
+        #    document replaced; the row goes with the chunk via ON DELETE CASCADE)
+        in_index = index_ids(index)
+        embedded = np.asarray(fetch_embedded_chunk_ids(model_name), dtype="int64")
+        stale = np.setdiff1d(in_index, embedded)
+        if stale.size:
+            if not supports_remove(index_params):
+                print(f"{stale.size} vectors to remove but {index_params['index_type']} can't delete. Running a full build.")
+                build_full(embedder, resume=False)
+                return
+            index.remove_ids(stale)
+        state["removed"] = int(stale.size)
+
+    # 2) embed only chunks that have no mapping for this model yet
+    _stream_into(index, embedder, state, missing_only=True)
+
+    dim = int(state["dim"])
+    embedded = np.asarray(fetch_embedded_chunk_ids(model_name), dtype="int64")
+    new_ids = np.setdiff1d(index_ids(index), embedded)
+    out_dir = _publish(
+        index, dim, state["index_params"], new_ids, replace_all=False, embedder=embedder,
+        embed_s_per_chunk=_embed_s_per_chunk(state),
+    )
+    _clear_checkpoint()
+
+    print(f"Updated FAISS index: {out_dir}")
+    print(f"Added: {state['added']}, removed: {state['removed']}, vectors: {index.ntotal}, dim: {dim}")
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Embed only new chunks and drop vectors of deleted ones (falls back to a full build "
+             "if there is no compatible index on disk)",
+    )
+    ap.add_argument(
+        "--resume",
+        action="store_true",
+        help=f"Continue an interrupted build from its last checkpoint in {settings.index_dir}/{CHECKPOINT_DIR}",
+    )
+    ap.add_argument("--no-cache", action="store_true", help="Bypass the embedding cache")
+    args = ap.parse_args()
+
+    embedder = Embedder(settings.embedding_model_name)
+    cache = None
+    if settings.embedding_cache_enabled and not args.no_cache:
+        # keyed by backend variant: ONNX/int8 vectors never mix with torch ones
+        cache = EmbeddingCache(embedder.variant)
+        embedder.cache = cache
+
+    existing = _load_existing(embedder) if args.incremental else None
+    if args.incremental and existing is None:
+        print("No compatible index found (model, embedding backend, id scheme or index type changed). Running a full build.")
 
-    # Persist mapping chunk_id -> faiss_id (faiss_id is the vector position)
-    for faiss_id, chunk_id in enumerate(chunk_ids):
-        upsert_chunk_embedding(chunk_id=chunk_id, model_name=settings.embedding_model_name, dim=dim, faiss_id=faiss_id)
+    if existing is not None:
+        build_incremental(embedder, *existing, resume=args.resume)
+    else:
+        build_full(embedder, resume=args.resume)
 
-    print(f"Built FAISS index: {faiss_path}")
-    print(f"Vectors: {n}, dim: {dim}")
+    if cache is not None:
+        print(f"Embedding cache: hits={cache.hits} misses={cache.misses} hit_rate={cache.hit_rate:.1%}")
+    return 0
 
 if __name__ == "__main__":
-    main()
+    raise SystemExit(main())
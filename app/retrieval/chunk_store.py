@@ -0,0 +1,171 @@
+import os
+import json
+from typing import Iterable, Iterator
+
+import numpy as np
+
+# Read-only sidecar next to index.faiss with what a hit needs (text, page,
+# source), so queries can skip the Postgres join:
+#   chunks.npy        structured rows sorted by faiss_id (offsets into the blob)
+#   chunks.text.bin   UTF-8 texts, concatenated
+#   chunks.docs.json  [{source, doc_type}], indexed by rows["doc"]
+#   chunks.alias.npy  (faiss_id, page, doc) of near-duplicate chunks (DEDUP_ENABLED),
+#                     which have no vector: faiss_id is their canonical chunk's,
+#                     so metadata filters still reach the duplicated text
+# Everything is memory-mapped, so workers on the same host share the pages.
+
+ROWS_FILE = "chunks.npy"
+TEXT_FILE = "chunks.text.bin"
+DOCS_FILE = "chunks.docs.json"
+ALIAS_FILE = "chunks.alias.npy"
+# versions published before the alias file existed don't have it
+REQUIRED_FILES = (ROWS_FILE, TEXT_FILE, DOCS_FILE)
+FILES = (*REQUIRED_FILES, ALIAS_FILE)
+FORMAT = 1
+NO_PAGE = -1  # chunks.page is NULL for non-pdf documents
+
+ROW_DTYPE = np.dtype([
+    ("faiss_id", "<i8"),
+    ("offset", "<i8"),
+    ("length", "<i4"),
+    ("page", "<i4"),
+    ("doc", "<i4"),
+])
+
+ALIAS_DTYPE = np.dtype([
+    ("faiss_id", "<i8"),
+    ("page", "<i4"),
+    ("doc", "<i4"),
+])
+
+
+def exists(dir_path: str) -> bool:
+    return all(os.path.exists(os.path.join(dir_path, name)) for name in REQUIRED_FILES)
+
+
+def write(dir_path: str, batches: Iterable[list[dict]], keep_ids: np.ndarray) -> int:
+    """
+    Stream chunk rows ({chunk_id, text, page, source, doc_type, and
+    canonical_chunk_id for near-duplicates}, chunk_id ascending) into the
+    store, keeping only the ids present in the index. A duplicate whose
+    canonical chunk is in the index becomes an alias row.
+    Rows go straight into a memory-mapped chunks.npy sized from keep_ids, so
+    memory stays flat whatever the corpus size. Returns the number of chunks
+    written.
+    """
+    keep_ids = np.sort(np.asarray(keep_ids, dtype="int64"))
+    rows_path = os.path.join(dir_path, ROWS_FILE)
+    rows = np.lib.format.open_memmap(rows_path, mode="w+", dtype=ROW_DTYPE, shape=(len(keep_ids),))
+    aliases: list[np.ndarray] = []
+    docs: list[dict] = []
+    doc_pos: dict[tuple, int] = {}
+    offset = 0
+    n = 0
+    last_id = None
+    in_order = True
+
+    with open(os.path.join(dir_path, TEXT_FILE), "wb") as blob:
+        for batch in batches:
+            ids = np.asarray([c["chunk_id"] for c in batch], dtype="int64")
+            keep = np.isin(ids, keep_ids, assume_unique=True)
+            canonical = np.asarray([c.get("canonical_chunk_id") or -1 for c in batch], dtype="int64")
+            alias = ~keep & np.isin(canonical, keep_ids)
+            batch_aliases = []
+            for c, k, a, canon in zip(batch, keep, alias, canonical):
+                if not k and not a:
+                    continue
+                key = (c["source"], c["doc_type"])
+                doc = doc_pos.get(key)
+                if doc is None:
+                    doc = doc_pos[key] = len(docs)
+                    docs.append({"source": c["source"], "doc_type": c["doc_type"]})
+                page = NO_PAGE if c["page"] is None else int(c["page"])
+                if a:
+                    batch_aliases.append((int(canon), page, doc))
+                    continue
+                data = (c["text"] or "").encode("utf-8")
+                blob.write(data)
+                chunk_id = int(c["chunk_id"])
+                rows[n] = (chunk_id, offset, len(data), page, doc)
+                in_order = in_order and (last_id is None or chunk_id > last_id)
+                last_id = chunk_id
+                offset += len(data)
+                n += 1
+            if batch_aliases:
+                aliases.append(np.array(batch_aliases, dtype=ALIAS_DTYPE))
+
+    if not in_order:
+        rows[:n].sort(order="faiss_id")
+    rows.flush()
+    if n < len(rows):
+        # ids of the index without a chunk row (deleted meanwhile): rewrite
+        # with the exact row count, disk to disk
+        tmp_path = rows_path + ".tmp"
+        out = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=ROW_DTYPE, shape=(n,))
+        out[:] = rows[:n]
+        out.flush()
+        del out, rows
+        os.replace(tmp_path, rows_path)
+    else:
+        del rows
+    alias_rows = np.concatenate(aliases) if aliases else np.zeros(0, dtype=ALIAS_DTYPE)
+    np.save(os.path.join(dir_path, ALIAS_FILE), alias_rows, allow_pickle=False)
+    with open(os.path.join(dir_path, DOCS_FILE), "w", encoding="utf-8") as f:
+        json.dump({"format": FORMAT, "docs": docs}, f, ensure_ascii=False)
+    return n
+
+
+class ChunkStore:
+    def __init__(self, dir_path: str):
+        self.path = dir_path
+        self.rows = np.load(os.path.join(dir_path, ROWS_FILE), mmap_mode="r", allow_pickle=False)
+        alias_path = os.path.join(dir_path, ALIAS_FILE)
+        if os.path.exists(alias_path):
+            self.aliases = np.load(alias_path, mmap_mode="r", allow_pickle=False)
+        else:
+            self.aliases = np.zeros(0, dtype=ALIAS_DTYPE)
+        text_path = os.path.join(dir_path, TEXT_FILE)
+        # np.memmap refuses empty files
+        if os.path.getsize(text_path):
+            self.text = np.memmap(text_path, dtype=np.uint8, mode="r")
+        else:
+            self.text = np.zeros(0, dtype=np.uint8)
+        with open(os.path.join(dir_path, DOCS_FILE), "r", encoding="utf-8") as f:
+            payload = json.load(f)
+        if payload.get("format") != FORMAT:
+            raise RuntimeError(f"Unsupported chunk store format in {dir_path}: {payload.get('format')!r}")
+        self.docs: list[dict] = payload["docs"]
+
+    def __len__(self) -> int:
+        return int(self.rows.shape[0])
+
+    def _positions(self, faiss_ids: list[int]) -> Iterator[tuple[int, int]]:
+        if not len(self) or not faiss_ids:
+            return
+        ids = np.asarray(faiss_ids, dtype="int64")
+        keys = self.rows["faiss_id"]
+        pos = np.searchsorted(keys, ids)
+        for fid, p in zip(ids.tolist(), pos.tolist()):
+            if p < len(keys) and int(keys[p]) == fid:
+                yield fid, p
+
+    def get_many(self, faiss_ids: list[int]) -> dict[int, dict]:
+        # same row shape as queries.fetch_chunk_map_by_faiss_ids
+        out = {}
+        for fid, p in self._positions(faiss_ids):
+            r = self.rows[p]
+            start = int(r["offset"])
+            page = int(r["page"])
+            text = self.text[start : start + int(r["length"])].tobytes().decode("utf-8")
+            out[fid] = {
+                "faiss_id": fid,
+                "chunk_id": fid,
+                "text": text,
+                "page": None if page == NO_PAGE else page,
+                "source": self.docs[int(r["doc"])]["source"],
+            }
+        return out
+
+    def nbytes(self) -> int:
+        paths = [os.path.join(self.path, name) for name in FILES]
+        return sum(os.path.getsize(p) for p in paths if os.path.exists(p))
@@ -0,0 +1,42 @@
+import hashlib
+import numpy as np
+
+from app.db.queries import fetch_cached_embeddings, store_cached_embeddings
+
+
+def text_digest(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Persistent (Postgres) cache of normalized embeddings keyed by
+    (model_name, sha256(text)). Keeps hit/miss counters for reporting.
+    """
+
+    def __init__(self, model_name: str):
+        self.model_name = model_name
+        self.hits = 0
+        self.misses = 0
+
+    def get_many(self, digests: list[str]) -> dict[str, np.ndarray]:
+        found = fetch_cached_embeddings(self.model_name, digests)
+        out = {d: np.frombuffer(v, dtype="float32") for d, v in found.items()}
+        self.hits += len(out)
+        self.misses += len(digests) - len(out)
+        return out
+
+    def put_many(self, vectors: dict[str, np.ndarray]) -> None:
+        if not vectors:
+            return
+        dim = len(next(iter(vectors.values())))
+        store_cached_embeddings(
+            self.model_name,
+            dim,
+            {d: np.asarray(v, dtype="float32").tobytes() for d, v in vectors.items()},
+        )
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return (self.hits / total) if total else 0.0
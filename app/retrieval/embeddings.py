@@ -1,12 +1,218 @@
-from sentence_transformers import SentenceTransformer
+import os
+import json
+from typing import Optional
+
 import numpy as np
 
-class Embedder:
+from app.core.config import settings
+
+# EMBEDDING_BACKEND values
+BACKENDS = ("sentence_transformers", "onnx")
+
+
+class SentenceTransformersBackend:
+    """fp32 torch through sentence-transformers (reference implementation)."""
+
     def __init__(self, model_name: str):
-        self.model_name = model_name
+        from sentence_transformers import SentenceTransformer
+
         self.model = SentenceTransformer(model_name)
 
-    def encode(self, texts: list[str]) -> np.ndarray:
-        # returns float32 matrix [n, dim]
-        embs = self.model.encode(texts, normalize_embeddings=True, show_progress_bar=True)
+    @property
+    def dim(self) -> int:
+        return int(self.model.get_sentence_embedding_dimension())
+
+    def encode(self, texts: list[str], show_progress_bar: bool) -> np.ndarray:
+        embs = self.model.encode(texts, normalize_embeddings=True, show_progress_bar=show_progress_bar)
         return np.asarray(embs, dtype="float32")
+
+
+def _local_model_dir(model_name: str) -> str:
+    # a local path, or the HF cache snapshot sentence-transformers already uses;
+    # only downloads when the model isn't cached yet
+    if os.path.isdir(model_name):
+        return model_name
+    from huggingface_hub import snapshot_download
+
+    try:
+        return snapshot_download(model_name, local_files_only=True)
+    except Exception:
+        return snapshot_download(model_name)
+
+
+def _read_json(path: str) -> dict:
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+class OnnxBackend:
+    """
+    Same transformer exported to ONNX and run with onnxruntime on CPU, with
+    optional dynamic int8 quantization of the weights. The export is done once
+    from the local HF snapshot and cached under ONNX_CACHE_DIR/<model>/.
+    Pooling and normalization follow the sentence-transformers config of the model.
+    """
+
+    def __init__(self, model_name: str, quantize: bool = False, cache_dir: Optional[str] = None):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        src = _local_model_dir(model_name)
+        self.tokenizer = AutoTokenizer.from_pretrained(src)
+
+        st_config = _read_json(os.path.join(src, "sentence_bert_config.json"))
+        self.max_seq_length = int(st_config.get("max_seq_length") or self.tokenizer.model_max_length)
+        pooling = _read_json(os.path.join(src, "1_Pooling", "config.json"))
+        self.pooling = "cls" if pooling.get("pooling_mode_cls_token") else "mean"
+
+        out_dir = os.path.join(cache_dir or settings.onnx_cache_dir, model_name.replace("/", "__"))
+        path = self._export(src, out_dir)
+        if quantize:
+            path = self._quantize(path)
+        self.path = path
+
+        opts = ort.SessionOptions()
+        if settings.onnx_threads > 0:
+            opts.intra_op_num_threads = settings.onnx_threads
+        self.session = ort.InferenceSession(path, sess_options=opts, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        self._dim = int(self.session.get_outputs()[0].shape[-1])
+
+    @staticmethod
+    def _export(src: str, out_dir: str) -> str:
+        path = os.path.join(out_dir, "model.onnx")
+        if os.path.exists(path):
+            return path
+
+        import torch
+        from transformers import AutoModel, AutoTokenizer
+
+        os.makedirs(out_dir, exist_ok=True)
+        model = AutoModel.from_pretrained(src).eval()
+        tokenizer = AutoTokenizer.from_pretrained(src)
+        sample = tokenizer(["warm up"], return_tensors="pt")
+        names = [n for n in ("input_ids", "attention_mask", "token_type_ids") if n in sample]
+        dynamic = {n: {0: "batch", 1: "seq"} for n in names}
+        dynamic["last_hidden_state"] = {0: "batch", 1: "seq"}
+
+        # write next to the target and rename, so a concurrent loader never
+        # sees a half-written file
+        tmp = path + f".tmp{os.getpid()}"
+        with torch.no_grad():
+            torch.onnx.export(
+                model,
+                tuple(sample[n] for n in names),
+                tmp,
+                input_names=names,
+                output_names=["last_hidden_state"],
+                dynamic_axes=dynamic,
+                opset_version=14,
+            )
+        os.replace(tmp, path)
+        return path
+
+    @staticmethod
+    def _quantize(fp32_path: str) -> str:
+        path = fp32_path.replace("model.onnx", "model.int8.onnx")
+        if os.path.exists(path):
+            return path
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        tmp = path + f".tmp{os.getpid()}"
+        quantize_dynamic(fp32_path, tmp, weight_type=QuantType.QInt8)
+        os.replace(tmp, path)
+        return path
+
+    @property
+    def dim(self) -> int:
+        return self._dim
+
+    def encode(self, texts: list[str], show_progress_bar: bool) -> np.ndarray:
+        out = np.zeros((len(texts), self.dim), dtype="float32")
+        bs = settings.onnx_batch_size
+        for start in range(0, len(texts), bs):
+            enc = self.tokenizer(
+                texts[start : start + bs],
+                padding=True,
+                truncation=True,
+                max_length=self.max_seq_length,
+                return_tensors="np",
+            )
+            feed = {k: v.astype("int64") for k, v in enc.items() if k in self.input_names}
+            hidden = self.session.run(None, feed)[0]  # [b, seq, dim]
+            if self.pooling == "cls":
+                pooled = hidden[:, 0]
+            else:
+                mask = enc["attention_mask"][..., None].astype("float32")
+                pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            norms = np.linalg.norm(pooled, axis=1, keepdims=True)
+            out[start : start + len(pooled)] = pooled / np.clip(norms, 1e-12, None)
+        return out
+
+
+def make_backend(model_name: str, backend: Optional[str] = None, quantize: Optional[bool] = None):
+    backend = backend or settings.embedding_backend
+    if backend == "sentence_transformers":
+        return SentenceTransformersBackend(model_name)
+    if backend == "onnx":
+        return OnnxBackend(model_name, quantize=settings.onnx_quantize if quantize is None else quantize)
+    raise ValueError(f"Unknown EMBEDDING_BACKEND={backend!r}. Expected one of {BACKENDS}")
+
+
+class Embedder:
+    def __init__(
+        self,
+        model_name: str,
+        cache=None,
+        backend: Optional[str] = None,
+        quantize: Optional[bool] = None,
+    ):
+        # cache: optional EmbeddingCache (app.retrieval.embedding_cache); when set,
+        # only texts not seen before with this model go through the transformer
+        # backend/quantize default to EMBEDDING_BACKEND / ONNX_QUANTIZE
+        self.model_name = model_name
+        self.backend_name = backend or settings.embedding_backend
+        self.quantized = self.backend_name == "onnx" and (settings.onnx_quantize if quantize is None else quantize)
+        self.backend = make_backend(model_name, self.backend_name, self.quantized)
+        self.cache = cache
+
+    @property
+    def variant(self) -> str:
+        """
+        Identifies the vectors this embedder produces: the model name for the
+        reference backend, model@onnx / model@onnx-int8 otherwise. Used as the
+        embedding cache key so backends never share cached vectors.
+        """
+        if self.backend_name == "sentence_transformers":
+            return self.model_name
+        return f"{self.model_name}@onnx{'-int8' if self.quantized else ''}"
+
+    @property
+    def dim(self) -> int:
+        return self.backend.dim
+
+    def _encode(self, texts: list[str], show_progress_bar: bool) -> np.ndarray:
+        return self.backend.encode(texts, show_progress_bar)
+
+    def encode(self, texts: list[str], show_progress_bar: bool = True) -> np.ndarray:
+        # returns float32 matrix [n, dim]
+        if self.cache is None or not texts:
+            return self._encode(texts, show_progress_bar)
+
+        from app.retrieval.embedding_cache import text_digest
+
+        digests = [text_digest(t) for t in texts]
+        unique = list(dict.fromkeys(digests))
+        vectors = self.cache.get_many(unique)
+
+        missing = [d for d in unique if d not in vectors]
+        if missing:
+            text_by_digest = dict(zip(digests, texts))
+            fresh = self._encode([text_by_digest[d] for d in missing], show_progress_bar)
+            new = dict(zip(missing, fresh))
+            self.cache.put_many(new)
+            vectors.update(new)
+
+        return np.stack([vectors[d] for d in digests]).astype("float32", copy=False)
@@ -0,0 +1,115 @@
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Optional
+
+import numpy as np
+
+from app.retrieval.chunk_store import NO_PAGE, ChunkStore
+
+if TYPE_CHECKING:
+    import faiss
+
+
+@dataclass(frozen=True)
+class SearchFilters:
+    """Metadata restriction applied inside the ANN scan (None = no restriction)."""
+    sources: Optional[tuple[str, ...]] = None
+    doc_type: Optional[str] = None
+    page_min: Optional[int] = None
+    page_max: Optional[int] = None
+
+    @classmethod
+    def build(
+        cls,
+        sources: Optional[list[str]] = None,
+        doc_type: Optional[str] = None,
+        page_min: Optional[int] = None,
+        page_max: Optional[int] = None,
+    ) -> Optional["SearchFilters"]:
+        f = cls(
+            sources=tuple(sorted(set(sources))) if sources else None,
+            doc_type=doc_type or None,
+            page_min=page_min,
+            page_max=page_max,
+        )
+        return None if f.is_empty() else f
+
+    def is_empty(self) -> bool:
+        return self.sources is None and self.doc_type is None and self.page_min is None and self.page_max is None
+
+    def as_dict(self) -> dict:
+        return {
+            "sources": list(self.sources) if self.sources else None,
+            "doc_type": self.doc_type,
+            "page_min": self.page_min,
+            "page_max": self.page_max,
+        }
+
+
+class FilterIndex:
+    """
+    Per-document faiss_id sets precomputed from the version's chunk store, and a
+    small cache of built IDSelectors so repeated filters don't rebuild them.
+    Near-duplicate chunks (the store's alias rows) match through their
+    canonical chunk's faiss_id, with their own source, doc_type and page.
+    """
+
+    def __init__(self, store: ChunkStore, max_selectors: int = 128):
+        # doc position -> positions of its rows / alias rows in the store
+        self._rows_by_doc = self._by_doc(store.rows, len(store.docs))
+        self._aliases_by_doc = self._by_doc(store.aliases, len(store.docs))
+        self._store = store
+        self._selectors: OrderedDict[SearchFilters, tuple[np.ndarray, "faiss.IDSelector"]] = OrderedDict()
+        self._max_selectors = max_selectors
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _by_doc(rows: np.ndarray, num_docs: int) -> list[np.ndarray]:
+        order = np.argsort(rows["doc"], kind="stable")
+        bounds = np.searchsorted(rows["doc"][order], np.arange(num_docs + 1))
+        return [order[bounds[i] : bounds[i + 1]] for i in range(num_docs)]
+
+    def _matching(self, rows: np.ndarray, by_doc: list[np.ndarray], filters: SearchFilters) -> np.ndarray:
+        positions = [
+            by_doc[i]
+            for i, d in enumerate(self._store.docs)
+            if (filters.sources is None or d["source"] in filters.sources)
+            and (filters.doc_type is None or d["doc_type"] == filters.doc_type)
+        ]
+        if not positions:
+            return np.zeros(0, dtype="int64")
+        pos = np.concatenate(positions)
+        if filters.page_min is not None or filters.page_max is not None:
+            pages = rows["page"][pos]
+            keep = pages != NO_PAGE
+            if filters.page_min is not None:
+                keep &= pages >= filters.page_min
+            if filters.page_max is not None:
+                keep &= pages <= filters.page_max
+            pos = pos[keep]
+        return np.asarray(rows["faiss_id"][pos], dtype="int64")
+
+    def ids_for(self, filters: SearchFilters) -> np.ndarray:
+        ids = self._matching(self._store.rows, self._rows_by_doc, filters)
+        if len(self._store.aliases):
+            aliased = self._matching(self._store.aliases, self._aliases_by_doc, filters)
+            # a canonical chunk can match both itself and its duplicates
+            ids = np.unique(np.concatenate([ids, aliased]))
+        return np.ascontiguousarray(ids, dtype="int64")
+
+    def selector(self, filters: SearchFilters) -> tuple[np.ndarray, "faiss.IDSelector"]:
+        with self._lock:
+            hit = self._selectors.get(filters)
+            if hit is not None:
+                self._selectors.move_to_end(filters)
+                return hit
+        import faiss
+
+        ids = self.ids_for(filters)
+        built = (ids, faiss.IDSelectorBatch(len(ids), faiss.swig_ptr(ids)))
+        with self._lock:
+            self._selectors[filters] = built
+            while len(self._selectors) > self._max_selectors:
+                self._selectors.popitem(last=False)
+        return built
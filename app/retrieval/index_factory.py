@@ -0,0 +1,207 @@
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+from app.core.config import settings
+from app.retrieval.binary_index import BinaryRescoreIndex, RescoreSearchParams, is_binary_rescore_file
+
+# faiss is imported where it's used so importing this module (and the API
+# modules that use it) stays cheap
+if TYPE_CHECKING:
+    import faiss
+
+INDEX_TYPES = ("flat", "hnsw", "ivf_flat", "ivf_pq", "sq_fp16", "sq_int8", "binary_rescore")
+
+# index_params that shape the stored index; changing one needs a full build.
+# The rest are query-time knobs (taken from the current settings at load) or
+# training sample sizes.
+BUILD_KEYS = ("index_type", "hnsw_m", "hnsw_ef_construction", "ivf_nlist", "pq_m", "pq_nbits")
+QUERY_KEYS = ("hnsw_ef_search", "ivf_nprobe", "rescore_factor")
+
+
+def index_params_from_settings(kind: str | None = None) -> dict:
+    """
+    Build-time index description, recorded in meta.json["index_params"] and
+    re-applied by index_store when loading. kind defaults to INDEX_TYPE.
+    """
+    kind = kind or settings.index_type
+    if kind not in INDEX_TYPES:
+        raise ValueError(f"Unknown INDEX_TYPE={kind!r}. Expected one of {INDEX_TYPES}")
+
+    params: dict = {"index_type": kind}
+    if kind == "hnsw":
+        params.update(
+            hnsw_m=settings.hnsw_m,
+            hnsw_ef_construction=settings.hnsw_ef_construction,
+            hnsw_ef_search=settings.hnsw_ef_search,
+        )
+    elif kind in ("ivf_flat", "ivf_pq"):
+        params.update(
+            ivf_nlist=settings.ivf_nlist,
+            ivf_nprobe=settings.ivf_nprobe,
+            ivf_train_size=settings.ivf_train_size,
+        )
+        if kind == "ivf_pq":
+            params.update(pq_m=settings.pq_m, pq_nbits=settings.pq_nbits)
+    elif kind == "sq_int8":
+        # per-dimension value ranges are learned from a sample
+        params.update(sq_train_size=settings.sq_train_size)
+    elif kind == "binary_rescore":
+        params.update(rescore_factor=settings.binary_rescore_factor)
+    return params
+
+
+def build_params(params: dict) -> dict:
+    return {k: params[k] for k in BUILD_KEYS if k in params}
+
+
+def with_query_settings(params: dict) -> dict:
+    # params with nprobe / efSearch / rescore factor from the current settings,
+    # so tuning them doesn't need a rebuild
+    current = index_params_from_settings(params.get("index_type", "flat"))
+    return {**params, **{k: current[k] for k in QUERY_KEYS if k in current}}
+
+
+def train_size(params: dict) -> int:
+    # vectors buffered to train an untrained index before the first add
+    return int(params.get("ivf_train_size") or params.get("sq_train_size") or 0)
+
+
+def min_train_vectors(index: "faiss.Index") -> int:
+    import faiss
+
+    try:
+        return faiss.extract_index_ivf(index.index).nlist
+    except RuntimeError:
+        return 1
+
+
+def create_index(dim: int, params: dict) -> "faiss.Index":
+    """
+    Empty index for normalized vectors (inner product == cosine), wrapped in an
+    IndexIDMap2 so faiss ids are chunk ids. IVF variants must be trained before
+    adding (see `index.is_trained`).
+    """
+    import faiss
+
+    kind = params["index_type"]
+    metric = faiss.METRIC_INNER_PRODUCT
+
+    if kind == "binary_rescore":
+        return BinaryRescoreIndex(dim, params["rescore_factor"])
+
+    if kind == "flat":
+        base = faiss.IndexFlatIP(dim)
+    elif kind == "hnsw":
+        base = faiss.IndexHNSWFlat(dim, params["hnsw_m"], metric)
+        base.hnsw.efConstruction = params["hnsw_ef_construction"]
+    elif kind == "ivf_flat":
+        quantizer = faiss.IndexFlatIP(dim)
+        base = faiss.IndexIVFFlat(quantizer, dim, params["ivf_nlist"], metric)
+    elif kind == "ivf_pq":
+        quantizer = faiss.IndexFlatIP(dim)
+        base = faiss.IndexIVFPQ(quantizer, dim, params["ivf_nlist"], params["pq_m"], params["pq_nbits"], metric)
+    elif kind == "sq_fp16":
+        base = faiss.IndexScalarQuantizer(dim, faiss.ScalarQuantizer.QT_fp16, metric)
+    elif kind == "sq_int8":
+        base = faiss.IndexScalarQuantizer(dim, faiss.ScalarQuantizer.QT_8bit, metric)
+    else:
+        raise ValueError(f"Unknown index_type={kind!r}")
+
+    index = faiss.IndexIDMap2(base)
+    apply_search_params(index, params)
+    return index
+
+
+def apply_search_params(index: "faiss.Index", params: dict) -> None:
+    # query-time knobs (nprobe / efSearch); no-op for flat
+    import faiss
+
+    kind = params.get("index_type", "flat")
+    if isinstance(index, BinaryRescoreIndex):
+        if "rescore_factor" in params:
+            index.rescore_factor = int(params["rescore_factor"])
+        return
+    inner = faiss.downcast_index(index.index) if hasattr(index, "id_map") else index
+    if kind == "hnsw" and "hnsw_ef_search" in params:
+        inner.hnsw.efSearch = int(params["hnsw_ef_search"])
+    elif kind in ("ivf_flat", "ivf_pq") and "ivf_nprobe" in params:
+        faiss.extract_index_ivf(inner).nprobe = int(params["ivf_nprobe"])
+
+
+def search_parameters(
+    params: dict, sel: "faiss.IDSelector", ids: np.ndarray
+) -> "faiss.SearchParameters | RescoreSearchParams":
+    """
+    Per-call parameters restricting the search to the ids accepted by `sel`
+    (built from `ids`). Their type must match the index (IVF/HNSW reject plain
+    SearchParameters), and they replace the index-level knobs, so
+    nprobe/efSearch are carried over. Passed to the IndexIDMap2, which
+    translates `sel` to internal ids. binary_rescore takes the ids themselves.
+    """
+    import faiss
+
+    kind = params.get("index_type", "flat")
+    if kind == "binary_rescore":
+        return RescoreSearchParams(ids)
+    if kind == "hnsw":
+        sp = faiss.SearchParametersHNSW()
+        if "hnsw_ef_search" in params:
+            sp.efSearch = int(params["hnsw_ef_search"])
+    elif kind in ("ivf_flat", "ivf_pq"):
+        sp = faiss.SearchParametersIVF()
+        if "ivf_nprobe" in params:
+            sp.nprobe = int(params["ivf_nprobe"])
+    else:
+        sp = faiss.SearchParameters()
+    sp.sel = sel
+    return sp
+
+
+def supports_remove(params: dict) -> bool:
+    # HNSW graphs can't drop vectors; incremental updates with deletions need a rebuild
+    return params.get("index_type", "flat") != "hnsw"
+
+
+def index_ids(index: "faiss.Index") -> np.ndarray:
+    # faiss ids (chunk ids) of every vector in the index
+    import faiss
+
+    if isinstance(index, BinaryRescoreIndex):
+        return index.id_array()
+    return faiss.vector_to_array(index.id_map).astype("int64")
+
+
+def index_nbytes(index: "faiss.Index") -> int:
+    import faiss
+
+    if isinstance(index, BinaryRescoreIndex):
+        return index.nbytes()
+    return int(faiss.serialize_index(index).nbytes)
+
+
+def write_index(index: "faiss.Index", path: str) -> None:
+    import faiss
+
+    if isinstance(index, BinaryRescoreIndex):
+        index.write(path)
+    else:
+        faiss.write_index(index, path)
+
+
+def read_index(path: str, load_mode: str = "memory") -> "faiss.Index":
+    """
+    load_mode "memory": private copy. "mmap": read-only mmap; the inverted lists
+    of IVF indexes and the fp16 vectors of binary_rescore stay in the file and
+    are served from the page cache, shared by every worker on the host.
+    Flat/HNSW/SQ storage is still copied to the heap by faiss 1.8.
+    """
+    import faiss
+
+    if load_mode not in ("memory", "mmap"):
+        raise ValueError(f"Unknown INDEX_LOAD_MODE={load_mode!r}. Expected 'memory' or 'mmap'")
+    if is_binary_rescore_file(path):
+        return BinaryRescoreIndex.read(path, mmap=load_mode == "mmap")
+    if load_mode == "mmap":
+        return faiss.read_index(path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+    return faiss.read_index(path)
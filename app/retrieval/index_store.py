@@ -1,28 +1,110 @@
 import os
 import json
+import time
+import hashlib
+import logging
 import threading
-from dataclasses import dataclass
-import faiss
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING
 import numpy as np
 from app.core.config import settings
+from app.core import metrics
 from app.retrieval.embeddings import Embedder
+from app.retrieval.index_factory import apply_search_params, read_index, search_parameters, with_query_settings
+from app.retrieval import chunk_store, versions
+from app.retrieval.chunk_store import ChunkStore
+from app.retrieval.batcher import MicroBatcher
+from app.retrieval.filters import FilterIndex, SearchFilters
+from app.db.queries import fetch_faiss_ids_matching
+
+# faiss (and torch, through the embedder) are imported on first load, not when
+# the API imports this module
+if TYPE_CHECKING:
+    import faiss
+
+logger = logging.getLogger("app.index_store")
 
 @dataclass
 class IndexBundle:
     embedder: Embedder
-    index: faiss.Index
+    index: "faiss.Index"
     meta: dict
+    path: str = ""
+    load_mode: str = "memory"
+    version: str = versions.LEGACY_VERSION
+    chunks: ChunkStore | None = None
+    filters: FilterIndex | None = None
+    # per-phase load timings (model_load, index_read, chunk_store, warm_up)
+    timings_ms: dict = field(default_factory=dict)
 
 _lock = threading.Lock()
 _bundle: IndexBundle | None = None
 
-def _paths():
-    base = settings.index_dir
-    return {
-        "dir": base,
-        "faiss": os.path.join(base, "index.faiss"),
-        "meta": os.path.join(base, "meta.json"),
-    }
+_batcher: MicroBatcher | None = None
+_batcher_lock = threading.Lock()
+
+_reloader: threading.Thread | None = None
+_reloader_stop = threading.Event()
+
+def _load_version(version: str, embedder: Embedder | None) -> IndexBundle:
+    base = versions.version_dir(version)
+    faiss_path = os.path.join(base, "index.faiss")
+    meta_path = os.path.join(base, "meta.json")
+    if not os.path.exists(faiss_path) or not os.path.exists(meta_path):
+        raise RuntimeError(f"Index not found. Build it first. Missing {faiss_path} or {meta_path}")
+
+    timings: dict[str, float] = {}
+    t0 = time.perf_counter()
+    with open(meta_path, "r", encoding="utf-8") as f:
+        meta = json.load(f)
+    versions.verify_checksums(base, meta)
+    timings["verify_checksums"] = (time.perf_counter() - t0) * 1000
+
+    t0 = time.perf_counter()
+    index = read_index(faiss_path, settings.index_load_mode)
+    # nprobe / efSearch from the current settings over the build-time values.
+    # Kept in meta so filtered searches use them too and index_fingerprint
+    # (the query cache key) changes with them.
+    built = meta.get("index_params") or {"index_type": meta.get("index_type", "flat")}
+    meta["index_params"] = with_query_settings(built)
+    apply_search_params(index, meta["index_params"])
+    timings["index_read"] = (time.perf_counter() - t0) * 1000
+
+    t0 = time.perf_counter()
+    store = ChunkStore(base) if chunk_store.exists(base) else None
+    filter_index = FilterIndex(store) if store is not None else None
+    timings["chunk_store"] = (time.perf_counter() - t0) * 1000
+
+    if embedder is None:
+        t0 = time.perf_counter()
+        embedder = Embedder(settings.embedding_model_name)
+        timings["model_load"] = (time.perf_counter() - t0) * 1000
+
+    b = IndexBundle(
+        embedder=embedder,
+        index=index,
+        meta=meta,
+        path=faiss_path,
+        load_mode=settings.index_load_mode,
+        version=version,
+        # versions published before the chunk store existed have none
+        chunks=store,
+        filters=filter_index,
+        timings_ms=timings,
+    )
+    t0 = time.perf_counter()
+    _warm_up(b)
+    timings["warm_up"] = (time.perf_counter() - t0) * 1000
+    return b
+
+def _warm_up(b: IndexBundle) -> None:
+    # touch the model and the index once so the first real query doesn't pay for it
+    q = b.embedder.encode(["warm up"], show_progress_bar=False)
+    if b.index.ntotal:
+        b.index.search(q, 1)
+
+def _publish_metrics(b: IndexBundle) -> None:
+    metrics.set_index(b.version, b.meta.get("index_type", "flat"), int(b.index.ntotal))
 
 def load_index_bundle() -> IndexBundle:
     global _bundle
@@ -33,23 +115,142 @@ def load_index_bundle() -> IndexBundle:
         if _bundle is not None:
             return _bundle
 
-        p = _paths()
-        if not os.path.exists(p["faiss"]) or not os.path.exists(p["meta"]):
-            raise RuntimeError(f"Index not found. Build it first. Missing {p['faiss']} or {p['meta']}")
+        version = versions.read_current()
+        if version is None:
+            raise RuntimeError(f"Index not found. Build it first. Nothing published in {settings.index_dir}")
+        _bundle = _load_version(version, embedder=None)
+        _publish_metrics(_bundle)
+        return _bundle
+
+def reload_if_changed() -> bool:
+    """
+    Load the version CURRENT points to (if it changed) next to the live one,
+    warm it up, then swap the module-level reference. Requests that already hold
+    the old bundle finish on it; new requests get the new one.
+    """
+    global _bundle
+    current = _bundle
+    version = versions.read_current()
+    if current is None or version is None or version == current.version:
+        return False
 
-        with open(p["meta"], "r", encoding="utf-8") as f:
-            meta = json.load(f)
+    fresh = _load_version(version, embedder=current.embedder)  # reuse the model
+    with _lock:
+        _bundle = fresh
+    _publish_metrics(fresh)
+    logger.info("index_reloaded version=%s previous=%s vectors=%d", version, current.version, fresh.index.ntotal)
+    return True
 
-        index = faiss.read_index(p["faiss"])
-        embedder = Embedder(settings.embedding_model_name)
+def _reload_loop() -> None:
+    while not _reloader_stop.wait(settings.index_reload_interval_s):
+        try:
+            reload_if_changed()
+        except Exception:
+            # keep serving the old version; retry on the next tick
+            logger.exception("index_reload_failed")
 
-        _bundle = IndexBundle(embedder=embedder, index=index, meta=meta)
-        return _bundle
+def start_reloader() -> None:
+    global _reloader
+    if _reloader is not None or settings.index_reload_interval_s <= 0:
+        return
+    _reloader_stop.clear()
+    _reloader = threading.Thread(target=_reload_loop, name="index-reloader", daemon=True)
+    _reloader.start()
+
+def stop_reloader() -> None:
+    global _reloader
+    if _reloader is None:
+        return
+    _reloader_stop.set()
+    _reloader.join(timeout=5)
+    _reloader = None
+
+def index_fingerprint(meta: dict) -> str:
+    # changes whenever a different index is published
+    raw = json.dumps(meta, sort_keys=True).encode("utf-8")
+    return hashlib.sha256(raw).hexdigest()[:16]
 
-def search(query: str, top_k: int) -> tuple[list[int], list[float]]:
+def _selector(b: IndexBundle, filters: SearchFilters) -> tuple[np.ndarray, "faiss.IDSelector"]:
+    import faiss
+
+    if b.filters is not None:
+        return b.filters.selector(filters)
+    # no chunk store for this version: resolve the id set in Postgres
+    ids = np.asarray(
+        fetch_faiss_ids_matching(
+            settings.embedding_model_name, filters.sources, filters.doc_type, filters.page_min, filters.page_max
+        ),
+        dtype="int64",
+    )
+    return ids, faiss.IDSelectorBatch(len(ids), faiss.swig_ptr(ids))
+
+def search_batch(
+    queries: list[str],
+    top_k: int,
+    filters: SearchFilters | None = None,
+) -> list[tuple[list[int], list[float]]]:
+    # one encode for the [q, dim] matrix and one index.search for all of them
     b = load_index_bundle()
-    q = b.embedder.encode([query])  # [1, dim]
-    D, I = b.index.search(q, top_k)  # cosine sim if using IndexFlatIP + normalized
-    ids = [int(x) for x in I[0].tolist() if int(x) != -1]
-    scores = [float(x) for x in D[0].tolist()[:len(ids)]]
-    return ids, scores
+    params = None
+    if filters is not None:
+        # restrict the scan itself to the matching ids, so a selective filter
+        # still returns top_k hits instead of whatever survives post-filtering
+        ids, sel = _selector(b, filters)
+        if not len(ids):
+            return [([], []) for _ in queries]
+        params = search_parameters(b.meta.get("index_params") or {}, sel, ids)
+    t0 = time.perf_counter()
+    Q = b.embedder.encode(queries, show_progress_bar=False)  # [q, dim]
+    t1 = time.perf_counter()
+    D, I = b.index.search(Q, top_k, params=params)  # cosine sim if using IndexFlatIP + normalized
+    t2 = time.perf_counter()
+    metrics.STAGE_LATENCY.labels("embed").observe(t1 - t0)
+    metrics.STAGE_LATENCY.labels("faiss_search").observe(t2 - t1)
+    metrics.SEARCH_BATCH_SIZE.observe(len(queries))
+    out = []
+    for d_row, i_row in zip(D.tolist(), I.tolist()):
+        ids = [int(x) for x in i_row if int(x) != -1]
+        scores = [float(x) for x in d_row[:len(ids)]]
+        out.append((ids, scores))
+    return out
+
+def lookup_chunks(faiss_ids: list[int]) -> dict[int, dict] | None:
+    """
+    faiss_id -> {faiss_id, chunk_id, text, page, source} from the local chunk
+    store of the live version, or None when it has no store (caller uses the DB).
+    """
+    store = load_index_bundle().chunks
+    if store is None:
+        return None
+    return store.get_many(faiss_ids)
+
+def get_batcher() -> MicroBatcher | None:
+    global _batcher
+    if not settings.query_batching_enabled:
+        return None
+    if _batcher is None:
+        with _batcher_lock:
+            if _batcher is None:
+                _batcher = MicroBatcher(
+                    search_batch,
+                    window_ms=settings.query_batch_window_ms,
+                    max_batch=settings.query_batch_max_size,
+                )
+    return _batcher
+
+def stop_batcher() -> None:
+    global _batcher
+    with _batcher_lock:
+        if _batcher is not None:
+            _batcher.close()
+            _batcher = None
+
+def search(query: str, top_k: int, filters: SearchFilters | None = None) -> tuple[list[int], list[float]]:
+    if filters is not None:
+        # filtered queries carry their own selector; they don't share a batch
+        return search_batch([query], top_k, filters)[0]
+    batcher = get_batcher()
+    if batcher is not None:
+        # concurrent requests are encoded/searched together
+        return batcher.submit(query, top_k)
+    return search_batch([query], top_k)[0]
@@ -0,0 +1,156 @@
+import json
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+import redis
+
+from app.core.config import settings
+from app.core import metrics
+from app.retrieval.index_store import index_fingerprint, load_index_bundle
+from app.retrieval.retrieve import run_retrieval
+from app.retrieval.filters import SearchFilters
+
+logger = logging.getLogger("app.query_cache")
+
+KEY_PREFIX = "docassistant:retrieval:v1:"
+
+
+def normalize_query(query: str) -> str:
+    return " ".join((query or "").split())
+
+
+def cache_key(query: str, fingerprint: str, filters: Optional[SearchFilters] = None) -> str:
+    # Everything that changes the result of run_retrieval is part of the key:
+    # the query, the filters, the published index and the retrieval thresholds.
+    payload = {
+        "q": normalize_query(query),
+        "filters": filters.as_dict() if filters is not None else None,
+        "index": fingerprint,
+        "search_candidates_k": settings.search_candidates_k,
+        "max_citations": settings.max_citations,
+        "min_top_score": settings.min_top_score,
+        "min_top_score_margin": settings.min_top_score_margin,
+        "min_row_score": settings.min_row_score,
+        "min_score_gap": settings.min_score_gap,
+    }
+    raw = json.dumps(payload, sort_keys=True).encode("utf-8")
+    return KEY_PREFIX + hashlib.sha256(raw).hexdigest()
+
+
+class LRUCache:
+    """Thread-safe in-process LRU with per-entry TTL (fallback when Redis is down)."""
+
+    def __init__(self, max_entries: int, ttl_s: float):
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self._data: OrderedDict[str, tuple[float, str]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str) -> None:
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl_s, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+
+class QueryCache:
+    """
+    Redis first; on any Redis error it switches to the local LRU and only retries
+    Redis after query_cache_redis_retry_s, so an outage costs one timeout, not one
+    per request.
+    """
+
+    def __init__(self):
+        self._redis: Optional[redis.Redis] = None
+        self._redis_down_until = 0.0
+        self._local = LRUCache(settings.query_cache_max_entries, settings.query_cache_ttl_s)
+
+    def _client(self) -> Optional[redis.Redis]:
+        if time.monotonic() < self._redis_down_until:
+            return None
+        if self._redis is None:
+            self._redis = redis.Redis.from_url(
+                settings.redis_url,
+                socket_timeout=settings.query_cache_redis_timeout_s,
+                socket_connect_timeout=settings.query_cache_redis_timeout_s,
+            )
+        return self._redis
+
+    def _mark_down(self, exc: Exception) -> None:
+        logger.warning("query_cache redis unavailable, using local LRU: %s", exc)
+        self._redis_down_until = time.monotonic() + settings.query_cache_redis_retry_s
+
+    def get(self, key: str) -> Optional[str]:
+        client = self._client()
+        if client is not None:
+            try:
+                value = client.get(key)
+                return value.decode("utf-8") if value is not None else None
+            except redis.RedisError as exc:
+                self._mark_down(exc)
+        return self._local.get(key)
+
+    def set(self, key: str, value: str) -> None:
+        if len(value.encode("utf-8")) > settings.query_cache_max_value_bytes:
+            return
+        client = self._client()
+        if client is not None:
+            try:
+                client.set(key, value, ex=settings.query_cache_ttl_s)
+                return
+            except redis.RedisError as exc:
+                self._mark_down(exc)
+        self._local.set(key, value)
+
+
+_cache = QueryCache()
+
+
+def cached_retrieval(
+    query: str,
+    filters: Optional[SearchFilters] = None,
+) -> tuple[list[dict], Optional[dict], float]:
+    """
+    Read-through cache around run_retrieval, same return shape.
+    With DEBUG_RAG the debug dict carries cache="hit"|"miss".
+    """
+    if not settings.query_cache_enabled:
+        return run_retrieval(query, filters=filters)
+
+    t0 = time.perf_counter()
+    key = cache_key(query, index_fingerprint(load_index_bundle().meta), filters)
+
+    cached = _cache.get(key)
+    metrics.QUERY_CACHE.labels("hit" if cached is not None else "miss").inc()
+    if cached is not None:
+        payload = json.loads(cached)
+        dbg = payload.get("dbg")
+        if settings.debug_rag:
+            dbg = dict(dbg or {})
+            dbg["cache"] = "hit"
+        latency_ms = (time.perf_counter() - t0) * 1000
+        return payload["rows"], dbg, latency_ms
+
+    rows, dbg, _ = run_retrieval(query, filters=filters)
+    _cache.set(key, json.dumps({"rows": rows, "dbg": dbg}, ensure_ascii=False))
+    if dbg is not None:
+        dbg["cache"] = "miss"
+    latency_ms = (time.perf_counter() - t0) * 1000
+    return rows, dbg, latency_ms
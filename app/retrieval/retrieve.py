@@ -1,9 +1,33 @@
 import time
+from dataclasses import dataclass
 from typing import Optional
 
 from app.core.config import settings
-from app.retrieval.index_store import search
-from app.db.queries import fetch_chunks_by_faiss_ids
+from app.core import metrics
+from app.retrieval.index_store import lookup_chunks, search, search_batch
+from app.retrieval.filters import SearchFilters
+from app.db.queries import fetch_chunk_map_by_faiss_ids
+
+
+@dataclass(frozen=True)
+class RetrievalParams:
+    search_candidates_k: int
+    max_citations: int
+    min_top_score: Optional[float]
+    min_top_score_margin: Optional[float]
+    min_row_score: Optional[float]
+    min_score_gap: Optional[float]
+
+    @classmethod
+    def from_settings(cls) -> "RetrievalParams":
+        return cls(
+            search_candidates_k=settings.search_candidates_k,
+            max_citations=settings.max_citations,
+            min_top_score=settings.min_top_score,
+            min_top_score_margin=settings.min_top_score_margin,
+            min_row_score=settings.min_row_score,
+            min_score_gap=settings.min_score_gap,
+        )
 
 
 def _dedupe_keep_best_score(rows: list[dict]) -> list[dict]:
@@ -23,80 +47,54 @@ def _dedupe_keep_best_score(rows: list[dict]) -> list[dict]:
     return list(best.values())
 
 
-def run_retrieval(query: str) -> tuple[list[dict], Optional[dict], float]:
+def abstention(faiss_ids: list[int], scores: list[float], params: RetrievalParams) -> tuple[Optional[str], dict]:
     """
-    Returns: (rows, debug, latency_ms)
-    rows: list of dicts with at least {source, page, chunk_id, text, _score}
+    Abstention rule on the raw candidates (robust no-evidence).
+    Returns (reason or None, {top1, top2, gap}).
     """
-    t0 = time.perf_counter()
-
-    t_search0 = time.perf_counter()
-    faiss_ids, scores = search(query, settings.search_candidates_k)
     top1 = scores[0] if scores else None
     top2 = scores[1] if scores and len(scores) > 1 else None
     gap = (top1 - top2) if (top1 is not None and top2 is not None) else None
-    t_search1 = time.perf_counter()
+    stats = {"top1": top1, "top2": top2, "gap": gap}
 
-    # --- Abstention rule (robust no-evidence) ---
-    min_top = settings.min_top_score
-    min_gap = settings.min_score_gap  # nuevo setting
-
-    should_abstain = (not faiss_ids)
+    min_top = params.min_top_score
+    min_gap = params.min_score_gap
 
     # If we have scores, apply thresholds
-    if not should_abstain and top1 is not None:
-        margin = settings.min_top_score_margin
+    if faiss_ids and top1 is not None:
+        margin = params.min_top_score_margin
         # 1) low top score
         if min_top is not None and top1 < min_top:
-            should_abstain = True
-            abstain_reason = "no_evidence_or_low_top_score"
+            return "no_evidence_or_low_top_score", stats
         # 2) low separation between top1 and top2 (flat ranking)
-        elif (gap is not None and min_gap is not None and margin is not None
+        if (gap is not None and min_gap is not None and margin is not None and min_top is not None
             and top1 < (min_top + margin) and gap < min_gap):
-            should_abstain = True
-            abstain_reason = "no_evidence_low_score_gap_near_threshold"
-        else:
-            abstain_reason = None
-    else:
-        abstain_reason = "no_evidence_empty_search"
+            return "no_evidence_low_score_gap_near_threshold", stats
+        return None, stats
+    return "no_evidence_empty_search", stats
 
-    if should_abstain:
-        latency_ms = (time.perf_counter() - t0) * 1000
-        dbg = None
-        if settings.debug_rag:
-            dbg = {
-                "model": settings.embedding_model_name,
-                "index_dir": settings.index_dir,
-                "search_candidates_k": settings.search_candidates_k,
-                "max_citations": settings.max_citations,
-                "min_top_score": settings.min_top_score,
-                "min_row_score": settings.min_row_score,
-                "min_score_gap": settings.min_score_gap,
-                "faiss_ids": faiss_ids,
-                "scores": scores,
-                "top1": top1,
-                "top2": top2,
-                "gap": gap,
-                "timings_ms": {
-                    "search_total": (t_search1 - t_search0) * 1000,
-                    "total": latency_ms,
-                },
-                "reason": abstain_reason,
-            }
-        return [], dbg, latency_ms
 
+def select_rows(
+    faiss_ids: list[int],
+    scores: list[float],
+    chunk_by_faiss_id: dict[int, dict],
+    params: RetrievalParams,
+) -> list[dict]:
+    """
+    Pair candidates with their chunk rows and _score, filter by min_row_score,
+    dedupe by (source,page) and cap to max_citations.
+    """
     # Build score lookup by faiss_id (IMPORTANT: don't assume DB returns same order)
     score_by_id = {}
     if scores:
         for _id, _s in zip(faiss_ids, scores):
             score_by_id[int(_id)] = float(_s)
 
-    t_db0 = time.perf_counter()
-    rows = fetch_chunks_by_faiss_ids(faiss_ids, settings.embedding_model_name)
-    t_db1 = time.perf_counter()
-
     paired: list[dict] = []
-    for row in rows:
+    for fid in faiss_ids:
+        row = chunk_by_faiss_id.get(int(fid))
+        if row is None:
+            continue
         r = dict(row)
 
         # Try to read the id used in your DB table for mapping scores
@@ -121,7 +119,7 @@ def run_retrieval(query: str) -> tuple[list[dict], Optional[dict], float]:
     paired.sort(key=lambda x: (x.get("_score") is not None, x.get("_score") or -1e9), reverse=True)
 
     # Optional: filter out weak rows as well (not just top_score)
-    min_row = settings.min_row_score
+    min_row = params.min_row_score
     if min_row is not None:
         paired = [r for r in paired if (r.get("_score") is not None and r["_score"] >= min_row)]
 
@@ -132,58 +130,183 @@ def run_retrieval(query: str) -> tuple[list[dict], Optional[dict], float]:
     paired.sort(key=lambda x: (x.get("_score") is not None, x.get("_score") or -1e9), reverse=True)
 
     # Apply max citations
-    paired = paired[: settings.max_citations]
+    return paired[: params.max_citations]
+
+
+def _fetch_chunks(faiss_ids: list[int]) -> tuple[dict[int, dict], str]:
+    """
+    Candidate rows by faiss_id, plus the timing label of where they came from:
+    the local chunk store (RETRIEVAL_MODE=local) or Postgres.
+    """
+    if settings.retrieval_mode == "local":
+        rows = lookup_chunks(faiss_ids)
+        if rows is not None:
+            return rows, "store_fetch"
+    return fetch_chunk_map_by_faiss_ids(faiss_ids, settings.embedding_model_name), "db_fetch"
 
-    latency_ms = (time.perf_counter() - t0) * 1000
+
+def _observe(timings_ms: dict) -> None:
+    # embed / faiss_search are observed inside index_store.search_batch
+    metrics.observe_stages({k: v for k, v in timings_ms.items() if k != "search_total"})
+
+
+def _debug_base(
+    params: RetrievalParams,
+    faiss_ids: list[int],
+    scores: list[float],
+    filters: Optional[SearchFilters],
+) -> dict:
+    dbg = {
+        "model": settings.embedding_model_name,
+        "index_dir": settings.index_dir,
+        "search_candidates_k": params.search_candidates_k,
+        "max_citations": params.max_citations,
+        "min_top_score": params.min_top_score,
+        "min_row_score": params.min_row_score,
+        "faiss_ids": faiss_ids,
+        "scores": scores,
+    }
+    if filters is not None:
+        dbg["filters"] = filters.as_dict()
+    return dbg
+
+
+def _finish(
+    faiss_ids: list[int],
+    scores: list[float],
+    reason: Optional[str],
+    stats: dict,
+    paired: list[dict],
+    params: RetrievalParams,
+    timings_ms: dict,
+    filters: Optional[SearchFilters] = None,
+) -> tuple[list[dict], Optional[dict]]:
+    # rows + debug block for one query, once its timings are known
+    if reason is not None:
+        metrics.ABSTENTIONS.labels(reason).inc()
+        dbg = None
+        if settings.debug_rag:
+            dbg = _debug_base(params, faiss_ids, scores, filters)
+            dbg["min_score_gap"] = params.min_score_gap
+            dbg.update(stats)
+            dbg["timings_ms"] = timings_ms
+            dbg["reason"] = reason
+        return [], dbg
 
     # If after filtering we have nothing => abstain
     if not paired:
+        metrics.ABSTENTIONS.labels("all_candidates_filtered_by_min_row_score").inc()
         dbg = None
         if settings.debug_rag:
-            dbg = {
-                "model": settings.embedding_model_name,
-                "index_dir": settings.index_dir,
-                "search_candidates_k": settings.search_candidates_k,
-                "max_citations": settings.max_citations,
-                "min_top_score": settings.min_top_score,
-                "min_row_score": settings.min_row_score,
-                "faiss_ids": faiss_ids,
-                "scores": scores,
-                "timings_ms": {
-                    "search_total": (t_search1 - t_search0) * 1000,
-                    "db_fetch": (t_db1 - t_db0) * 1000,
-                    "total": latency_ms,
-                },
-                "reason": "all_candidates_filtered_by_min_row_score",
-            }
-        return [], dbg, latency_ms
+            dbg = _debug_base(params, faiss_ids, scores, filters)
+            dbg["timings_ms"] = timings_ms
+            dbg["reason"] = "all_candidates_filtered_by_min_row_score"
+        return [], dbg
 
     dbg = None
     if settings.debug_rag:
-        dbg = {
-            "model": settings.embedding_model_name,
-            "index_dir": settings.index_dir,
-            "search_candidates_k": settings.search_candidates_k,
-            "max_citations": settings.max_citations,
-            "min_top_score": settings.min_top_score,
-            "min_row_score": settings.min_row_score,
-            "faiss_ids": faiss_ids,
-            "scores": scores,
-            "returned_chunks": [
-                {
-                    "chunk_id": r.get("chunk_id"),
-                    "faiss_id": r.get("faiss_id", r.get("id")),
-                    "source": r.get("source"),
-                    "page": r.get("page"),
-                    "_score": r.get("_score"),
-                }
-                for r in paired
-            ],
-            "timings_ms": {
-                "search_total": (t_search1 - t_search0) * 1000,
-                "db_fetch": (t_db1 - t_db0) * 1000,
-                "total": latency_ms,
-            },
-        }
-
-    return paired, dbg, latency_ms
+        dbg = _debug_base(params, faiss_ids, scores, filters)
+        dbg["returned_chunks"] = [
+            {
+                "chunk_id": r.get("chunk_id"),
+                "faiss_id": r.get("faiss_id", r.get("id")),
+                "source": r.get("source"),
+                "page": r.get("page"),
+                "_score": r.get("_score"),
+            }
+            for r in paired
+        ]
+        dbg["timings_ms"] = timings_ms
+    return paired, dbg
+
+
+def run_retrieval(
+    query: str,
+    params: Optional[RetrievalParams] = None,
+    filters: Optional[SearchFilters] = None,
+) -> tuple[list[dict], Optional[dict], float]:
+    """
+    Returns: (rows, debug, latency_ms)
+    rows: list of dicts with at least {source, page, chunk_id, text, _score}
+    filters: restrict candidates to matching sources/doc_type/pages
+    """
+    params = params or RetrievalParams.from_settings()
+    t0 = time.perf_counter()
+
+    t_search0 = time.perf_counter()
+    faiss_ids, scores = search(query, params.search_candidates_k, filters)
+    t_search1 = time.perf_counter()
+
+    reason, stats = abstention(faiss_ids, scores, params)
+    if reason is not None:
+        latency_ms = (time.perf_counter() - t0) * 1000
+        timings = {"search_total": (t_search1 - t_search0) * 1000, "total": latency_ms}
+        rows, dbg = _finish(faiss_ids, scores, reason, stats, [], params, timings, filters)
+        metrics.STAGE_LATENCY.labels("total").observe(latency_ms / 1000)
+        return rows, dbg, latency_ms
+
+    t_db0 = time.perf_counter()
+    chunk_by_faiss_id, fetch_stage = _fetch_chunks(faiss_ids)
+    t_db1 = time.perf_counter()
+
+    paired = select_rows(faiss_ids, scores, chunk_by_faiss_id, params)
+    t_post1 = time.perf_counter()
+
+    latency_ms = (time.perf_counter() - t0) * 1000
+    timings = {
+        "search_total": (t_search1 - t_search0) * 1000,
+        fetch_stage: (t_db1 - t_db0) * 1000,
+        "postprocess": (t_post1 - t_db1) * 1000,
+        "total": latency_ms,
+    }
+    rows, dbg = _finish(faiss_ids, scores, None, stats, paired, params, timings, filters)
+    _observe(timings)
+    return rows, dbg, latency_ms
+
+
+def run_retrieval_batch(
+    queries: list[str],
+    params: Optional[RetrievalParams] = None,
+    filters: Optional[SearchFilters] = None,
+) -> tuple[list[tuple[list[dict], Optional[dict]]], dict]:
+    """
+    Same per-query semantics as run_retrieval (abstention, row filter, dedupe,
+    cap), but with one encode + one index.search for all queries and a single
+    DB query for the union of candidate ids. filters apply to every query.
+    Returns: ([(rows, debug) per query], timings_ms for the whole batch)
+    """
+    params = params or RetrievalParams.from_settings()
+    if not queries:
+        return [], {"search_total": 0.0, "total": 0.0}
+    t0 = time.perf_counter()
+
+    t_search0 = time.perf_counter()
+    candidates = search_batch(queries, params.search_candidates_k, filters)
+    t_search1 = time.perf_counter()
+
+    decisions = [abstention(ids, scores, params) for ids, scores in candidates]
+
+    wanted = sorted({fid for (ids, _), (reason, _) in zip(candidates, decisions) if reason is None for fid in ids})
+    t_db0 = time.perf_counter()
+    chunk_by_faiss_id, fetch_stage = _fetch_chunks(wanted)
+    t_db1 = time.perf_counter()
+
+    selected = [
+        select_rows(ids, scores, chunk_by_faiss_id, params) if reason is None else []
+        for (ids, scores), (reason, _) in zip(candidates, decisions)
+    ]
+    t_post1 = time.perf_counter()
+
+    latency_ms = (time.perf_counter() - t0) * 1000
+    timings = {
+        "search_total": (t_search1 - t_search0) * 1000,
+        fetch_stage: (t_db1 - t_db0) * 1000,
+        "postprocess": (t_post1 - t_db1) * 1000,
+        "total": latency_ms,
+    }
+    results = [
+        _finish(ids, scores, reason, stats, paired, params, timings, filters)
+        for (ids, scores), (reason, stats), paired in zip(candidates, decisions, selected)
+    ]
+    _observe(timings)
+    return results, timings
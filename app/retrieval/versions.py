@@ -0,0 +1,117 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import secrets
+from typing import Optional
+
+from app.core.config import settings
+
+# Layout under INDEX_DIR:
+#   versions/<version>/index.faiss, meta.json, ...   one immutable dir per build
+#   CURRENT                                          name of the published version
+# Indexes built before versioning (INDEX_DIR/index.faiss + meta.json) are still
+# served as the "legacy" version until the first versioned build is published.
+
+VERSIONS_DIR = "versions"
+CURRENT_FILE = "CURRENT"
+LEGACY_VERSION = "legacy"
+
+
+def _index_dir() -> str:
+    return settings.index_dir
+
+
+def version_dir(version: str) -> str:
+    if version == LEGACY_VERSION:
+        return _index_dir()
+    return os.path.join(_index_dir(), VERSIONS_DIR, version)
+
+
+def read_current() -> Optional[str]:
+    path = os.path.join(_index_dir(), CURRENT_FILE)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            version = f.read().strip()
+    except FileNotFoundError:
+        version = ""
+    if version:
+        return version
+    if os.path.exists(os.path.join(_index_dir(), "index.faiss")):
+        return LEGACY_VERSION
+    return None
+
+
+def current_dir() -> Optional[str]:
+    version = read_current()
+    return version_dir(version) if version else None
+
+
+def new_version() -> str:
+    # sortable, unique even for two builds in the same second
+    return time.strftime("%Y%m%dT%H%M%SZ", time.gmtime()) + "-" + secrets.token_hex(3)
+
+
+def swap_current(version: str) -> Optional[str]:
+    """Atomically point CURRENT at `version`. Returns the previous version."""
+    previous = read_current()
+    path = os.path.join(_index_dir(), CURRENT_FILE)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(version + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    return previous
+
+
+def restore_current(previous: Optional[str]) -> None:
+    path = os.path.join(_index_dir(), CURRENT_FILE)
+    if previous is None or previous == LEGACY_VERSION:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        return
+    swap_current(previous)
+
+
+def file_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def checksum_files(dir_path: str, names: list[str]) -> dict[str, str]:
+    return {name: file_sha256(os.path.join(dir_path, name)) for name in names}
+
+
+def verify_checksums(dir_path: str, meta: dict) -> None:
+    for name, expected in (meta.get("checksums") or {}).items():
+        actual = file_sha256(os.path.join(dir_path, name))
+        if actual != expected:
+            raise RuntimeError(f"Checksum mismatch for {os.path.join(dir_path, name)}")
+
+
+def gc_versions(keep: int) -> list[str]:
+    """Delete all but the `keep` newest versions; never the current one."""
+    base = os.path.join(_index_dir(), VERSIONS_DIR)
+    if not os.path.isdir(base):
+        return []
+    current = read_current()
+    versions = sorted(os.listdir(base), reverse=True)
+    removed = []
+    for v in versions[keep:]:
+        if v == current:
+            continue
+        shutil.rmtree(os.path.join(base, v), ignore_errors=True)
+        removed.append(v)
+    return removed
+
+
+def load_meta(dir_path: str) -> dict:
+    with open(os.path.join(dir_path, "meta.json"), "r", encoding="utf-8") as f:
+        return json.load(f)
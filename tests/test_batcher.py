@@ -0,0 +1,68 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app.retrieval.batcher import MicroBatcher
+
+
+def _fake_search(queries, top_k):
+    # ids encode the query position so callers can check they got their own result
+    return [([len(q)] * top_k, [1.0] * top_k) for q in queries]
+
+
+def test_batcher_fans_results_back_to_callers():
+    batcher = MicroBatcher(_fake_search, window_ms=20, max_batch=8)
+    try:
+        queries = ["a" * n for n in range(1, 9)]
+        with ThreadPoolExecutor(max_workers=8) as ex:
+            results = list(ex.map(lambda q: batcher.submit(q, 3), queries))
+    finally:
+        batcher.close()
+
+    assert [ids for ids, _ in results] == [[len(q)] * 3 for q in queries]
+    stats = batcher.stats()
+    assert stats["queries"] == 8
+    assert stats["batches"] < 8
+
+
+def test_batcher_truncates_to_each_callers_top_k():
+    batcher = MicroBatcher(_fake_search, window_ms=1, max_batch=4)
+    try:
+        ids, scores = batcher.submit("abc", 2)
+    finally:
+        batcher.close()
+    assert ids == [3, 3]
+    assert scores == [1.0, 1.0]
+
+
+def test_batcher_searches_directly_after_close():
+    batcher = MicroBatcher(_fake_search, window_ms=1, max_batch=4)
+    batcher.close()
+    assert batcher.submit("abcd", 2) == ([4, 4], [1.0, 1.0])
+    assert batcher.stats()["queries"] == 0
+
+
+def test_batcher_close_fails_queued_queries():
+    started, release = threading.Event(), threading.Event()
+
+    def slow_search(queries, top_k):
+        started.set()
+        release.wait(5)
+        return _fake_search(queries, top_k)
+
+    batcher = MicroBatcher(slow_search, window_ms=0, max_batch=1)
+    with ThreadPoolExecutor(max_workers=2) as ex:
+        first = ex.submit(batcher.submit, "a", 1)
+        started.wait(5)
+        second = ex.submit(batcher.submit, "bb", 1)
+        while batcher._queue.qsize() < 1:
+            time.sleep(0.001)
+        # the worker is busy past the join timeout
+        batcher._thread.join = lambda timeout=None: None
+        batcher.close()
+        release.set()
+        assert first.result(timeout=5) == ([1], [1.0])
+        with pytest.raises(RuntimeError, match="closed"):
+            second.result(timeout=5)
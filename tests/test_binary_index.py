@@ -0,0 +1,59 @@
+import numpy as np
+
+from app.retrieval.binary_index import BinaryRescoreIndex, RescoreSearchParams
+
+
+def _vectors(n=400, d=32, seed=0):
+    x = np.random.default_rng(seed).standard_normal((n, d)).astype("float32")
+    return x / np.linalg.norm(x, axis=1, keepdims=True)
+
+
+def test_rescored_scores_are_exact_inner_products():
+    xb = _vectors()
+    ids = np.arange(100, 500, dtype="int64")
+    index = BinaryRescoreIndex(32, rescore_factor=1000)  # rescore everything
+    index.add_with_ids(xb[:200], ids[:200])
+    index.add_with_ids(xb[200:], ids[200:])
+    assert index.ntotal == 400
+
+    D, I = index.search(xb[:3], 5)
+    exact = xb[:3] @ xb.T
+    for r in range(3):
+        top = np.argsort(-exact[r])[:5]
+        assert I[r].tolist() == ids[top].tolist()
+        np.testing.assert_allclose(D[r], exact[r][top], atol=1e-3)  # fp16 storage
+
+
+def test_filtered_search_and_remove(tmp_path):
+    xb = _vectors()
+    ids = np.arange(400, dtype="int64") * 2
+    index = BinaryRescoreIndex(32, rescore_factor=4)
+    index.add_with_ids(xb, ids)
+
+    allowed = ids[::7]
+    D, I = index.search(xb[:2], 3, params=RescoreSearchParams(allowed))
+    assert np.isin(I, allowed).all()
+
+    # fewer allowed ids than k: padded like faiss
+    D, I = index.search(xb[:1], 3, params=RescoreSearchParams(np.array([4, 999], dtype="int64")))
+    assert I[0].tolist() == [4, -1, -1]
+
+    assert index.remove_ids(ids[:10]) == 10
+    _, I = index.search(xb[:10], 5)
+    assert not np.isin(I, ids[:10]).any()
+
+
+def test_write_read_round_trip(tmp_path):
+    xb = _vectors(n=50, d=16)
+    ids = np.arange(50, dtype="int64") + 7
+    index = BinaryRescoreIndex(16, rescore_factor=3)
+    index.add_with_ids(xb, ids)
+    path = str(tmp_path / "index.faiss")
+    index.write(path)
+
+    for mmap in (False, True):
+        loaded = BinaryRescoreIndex.read(path, mmap=mmap)
+        assert loaded.ntotal == 50 and loaded.rescore_factor == 3
+        assert loaded.id_array().tolist() == ids.tolist()
+        np.testing.assert_array_equal(np.asarray(loaded.vectors), xb.astype(np.float16))
+        assert loaded.search(xb[:4], 2)[1].tolist() == index.search(xb[:4], 2)[1].tolist()
@@ -0,0 +1,46 @@
+import numpy as np
+
+from app.retrieval import chunk_store
+from app.retrieval.chunk_store import ChunkStore
+
+
+def _rows():
+    return [
+        [
+            {"chunk_id": 3, "text": "ñandú", "page": 1, "source": "a.pdf", "doc_type": "pdf"},
+            {"chunk_id": 5, "text": "skip me", "page": 2, "source": "a.pdf", "doc_type": "pdf"},
+        ],
+        [
+            {"chunk_id": 9, "text": "notes", "page": None, "source": "b.md", "doc_type": "md"},
+            {"chunk_id": 12, "text": "", "page": 4, "source": "a.pdf", "doc_type": "pdf"},
+        ],
+    ]
+
+
+def test_chunk_store_round_trip(tmp_path):
+    n = chunk_store.write(str(tmp_path), _rows(), np.array([12, 9, 3], dtype="int64"))
+    assert n == 3
+    assert chunk_store.exists(str(tmp_path))
+
+    store = ChunkStore(str(tmp_path))
+    got = store.get_many([9, 5, 3, 12, 100])
+    assert sorted(got) == [3, 9, 12]
+    assert got[3] == {"faiss_id": 3, "chunk_id": 3, "text": "ñandú", "page": 1, "source": "a.pdf"}
+    assert got[9]["page"] is None and got[9]["source"] == "b.md"
+    assert got[12]["text"] == ""
+
+
+def test_empty_chunk_store(tmp_path):
+    assert chunk_store.write(str(tmp_path), [], np.array([], dtype="int64")) == 0
+    assert ChunkStore(str(tmp_path)).get_many([1, 2]) == {}
+
+
+def test_chunk_store_index_ids_without_rows(tmp_path):
+    # 7 is in the index but its chunk is gone: the rows file holds only real rows
+    n = chunk_store.write(str(tmp_path), _rows(), np.array([3, 7, 9], dtype="int64"))
+    assert n == 2
+
+    store = ChunkStore(str(tmp_path))
+    assert len(store) == 2
+    assert list(store.rows["faiss_id"]) == [3, 9]
+    assert sorted(store.get_many([3, 7, 9])) == [3, 9]
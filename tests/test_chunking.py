@@ -0,0 +1,58 @@
+import re
+
+from app.ingest.chunking import chunk_text, token_chunk_text
+
+
+def _word_offsets(text):
+    # one token per word, like a whitespace tokenizer with offset mapping
+    return [(m.start(), m.end()) for m in re.finditer(r"\S+", text)]
+
+
+def test_token_chunks_fit_budget_and_offsets_are_exact():
+    text = " ".join(f"w{i}." if i % 7 == 6 else f"w{i}" for i in range(100))
+    offsets = _word_offsets(text)
+    chunks = token_chunk_text(3, text, offsets, max_tokens=20, overlap=4)
+
+    assert len(chunks) > 1
+    for ch in chunks:
+        assert ch["page"] == 3
+        assert ch["text"] == text[ch["char_start"]:ch["char_end"]]
+        assert ch["text"] == ch["text"].strip()
+        assert len(ch["text"].split()) <= 20
+    assert chunks[0]["char_start"] == 0
+    assert chunks[-1]["char_end"] == len(text)
+    # progress with overlap: every chunk starts inside or right after the previous one
+    for a, b in zip(chunks, chunks[1:]):
+        assert a["char_start"] < b["char_start"] <= a["char_end"] + 1
+
+
+def test_token_chunks_prefer_sentence_end():
+    text = "one two three four five six seven. eight nine ten eleven"
+    chunks = token_chunk_text(None, text, _word_offsets(text), max_tokens=9, overlap=0)
+    assert chunks[0]["text"] == "one two three four five six seven."
+    assert chunks[1]["text"] == "eight nine ten eleven"
+
+
+def test_token_chunks_hard_cut_inside_long_word():
+    # sub-word tokens of 4 chars, no whitespace to cut on
+    text = "x" * 40
+    offsets = [(i, i + 4) for i in range(0, 40, 4)]
+    chunks = token_chunk_text(1, text, offsets, max_tokens=3, overlap=1)
+    assert chunks[0] == {"page": 1, "char_start": 0, "char_end": 12, "text": "x" * 12}
+    assert "".join(c["text"] for c in chunks).count("x") >= 40
+    assert chunks[-1]["char_end"] == 40
+
+
+def test_short_text_is_one_chunk():
+    text = "short page"
+    assert token_chunk_text(2, text, _word_offsets(text), 50, 8) == [
+        {"page": 2, "char_start": 0, "char_end": 10, "text": "short page"}
+    ]
+    assert token_chunk_text(2, "", [], 50, 8) == []
+
+
+def test_char_chunking_unchanged():
+    text = "a " * 1200
+    chunks = chunk_text(1, text)
+    assert [c["char_start"] for c in chunks] == [0, 850, 1700]
+    assert chunks[-1]["char_end"] == len(" ".join(text.split()))
@@ -0,0 +1,73 @@
+import numpy as np
+
+from app.ingest.dedup import BANDS, NUM_PERM, assign_canonical, buckets, match_replaced, signature, similarity
+
+BOILERPLATE = (
+    "This document is provided for information purposes only and does not constitute "
+    "an offer. All rights reserved. No part of this publication may be reproduced, "
+    "stored in a retrieval system or transmitted in any form without prior written "
+    "permission of the publisher. Confidential, internal use only. Page {n} of 40."
+)
+
+
+def _chunk(i, text):
+    return {"chunk_index": i, "text": text, "minhash": signature(text)}
+
+
+def test_signature_is_stable_and_sized():
+    a = signature(BOILERPLATE.format(n=1))
+    assert a.dtype == np.uint32 and a.shape == (NUM_PERM,)
+    assert np.array_equal(a, signature(BOILERPLATE.format(n=1)))
+    assert len(buckets(a)) == BANDS
+    assert signature("  ... ") is None
+
+
+def test_near_duplicates_score_high_unrelated_low():
+    a = signature(BOILERPLATE.format(n=1))
+    b = signature(BOILERPLATE.format(n=1).upper())  # case is normalized away
+    c = signature("Quarterly revenue grew in every region, driven by the new subscription plans.")
+    assert similarity(a, b) == 1.0
+    assert similarity(a, c) < 0.2
+
+
+def test_assign_canonical_within_document_and_against_db():
+    existing = signature(BOILERPLATE.format(n=7))
+    chunks = [
+        _chunk(0, "Introduction to the retrieval pipeline and how chunks are embedded."),
+        _chunk(1, BOILERPLATE.format(n=2) + " Extra."),
+        _chunk(2, "A different paragraph about index versions and hot reload."),
+        _chunk(3, "Introduction to the retrieval pipeline and how chunks are embedded."),
+    ]
+    dups = assign_canonical(chunks, [(42, existing.tobytes())], threshold=0.6)
+
+    assert dups == 2
+    assert chunks[1]["canonical_chunk_id"] == 42
+    assert chunks[3]["canonical_index"] == 0
+    # every chunk keeps its LSH keys, so a duplicate can be promoted later
+    assert all(len(ch["buckets"]) == BANDS for ch in chunks)
+
+
+def test_threshold_keeps_distinct_chunks():
+    chunks = [_chunk(0, BOILERPLATE.format(n=1)), _chunk(1, BOILERPLATE.format(n=2))]
+    assert assign_canonical(chunks, [], threshold=1.0) == 0
+    assert "canonical_index" not in chunks[1]
+
+
+def test_match_replaced_follows_the_new_version():
+    old_boiler = signature(BOILERPLATE.format(n=3))
+    old_other = signature("Release notes for version one, removed in the new edition of the manual.")
+    chunks = [
+        _chunk(0, "Updated introduction for the second edition."),
+        _chunk(1, BOILERPLATE.format(n=3)),
+        _chunk(2, BOILERPLATE.format(n=3) + " Again."),
+    ]
+    assign_canonical(chunks, [], threshold=0.6)
+    assert chunks[2]["canonical_index"] == 1
+
+    repoint = match_replaced(chunks, [(7, old_boiler.tobytes()), (8, old_other.tobytes())], threshold=0.8)
+    # duplicates of chunk 7 move to the new canonical copy; chunk 8 has no
+    # successor, so the caller promotes one of its duplicates
+    assert repoint == {7: (1, None)}
+
+    chunks[1]["canonical_chunk_id"] = 99
+    assert match_replaced(chunks, [(7, old_boiler.tobytes())], threshold=0.8) == {7: (None, 99)}
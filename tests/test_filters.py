@@ -0,0 +1,66 @@
+import numpy as np
+
+from app.retrieval import chunk_store
+from app.retrieval.chunk_store import ChunkStore
+from app.retrieval.filters import FilterIndex, SearchFilters
+
+
+def _store(tmp_path):
+    rows = [[
+        {"chunk_id": 1, "text": "a1", "page": 1, "source": "a.pdf", "doc_type": "pdf"},
+        {"chunk_id": 2, "text": "b", "page": None, "source": "b.md", "doc_type": "md"},
+        {"chunk_id": 3, "text": "a2", "page": 2, "source": "a.pdf", "doc_type": "pdf"},
+        {"chunk_id": 4, "text": "c5", "page": 5, "source": "c.pdf", "doc_type": "pdf"},
+    ]]
+    chunk_store.write(str(tmp_path), rows, np.array([1, 2, 3, 4], dtype="int64"))
+    return ChunkStore(str(tmp_path))
+
+
+def test_filter_ids_by_source_doc_type_and_pages(tmp_path):
+    fi = FilterIndex(_store(tmp_path))
+
+    def ids(**kw):
+        return sorted(fi.ids_for(SearchFilters.build(**kw)).tolist())
+
+    assert ids(sources=["a.pdf"]) == [1, 3]
+    assert ids(doc_type="md") == [2]
+    assert ids(doc_type="pdf", page_min=2) == [3, 4]
+    assert ids(sources=["a.pdf", "b.md"], page_max=1) == [1]
+    assert ids(sources=["missing.pdf"]) == []
+
+
+def test_selector_is_reused(tmp_path):
+    fi = FilterIndex(_store(tmp_path))
+    f = SearchFilters.build(sources=["c.pdf"])
+    first = fi.selector(f)
+    assert fi.selector(f) is first
+    assert first[0].tolist() == [4]
+
+
+def test_filters_reach_deduplicated_chunks(tmp_path):
+    # b.pdf's disclaimer (chunk 6) is a near-duplicate of a.pdf's (chunk 1) and
+    # has no vector; filtering on b.pdf still finds it through chunk 1
+    rows = [[
+        {"chunk_id": 1, "text": "disclaimer", "page": 1, "source": "a.pdf", "doc_type": "pdf"},
+        {"chunk_id": 2, "text": "a body", "page": 2, "source": "a.pdf", "doc_type": "pdf"},
+        {"chunk_id": 5, "text": "b body", "page": 1, "source": "b.pdf", "doc_type": "pdf"},
+        {"chunk_id": 6, "text": "disclaimer", "page": 3, "source": "b.pdf", "doc_type": "pdf",
+         "canonical_chunk_id": 1},
+        {"chunk_id": 7, "text": "disclaimer", "page": 1, "source": "c.md", "doc_type": "md",
+         "canonical_chunk_id": 1},
+    ]]
+    assert chunk_store.write(str(tmp_path), rows, np.array([1, 2, 5], dtype="int64")) == 3
+    store = ChunkStore(str(tmp_path))
+    assert len(store) == 3 and len(store.aliases) == 2
+    fi = FilterIndex(store)
+
+    def ids(**kw):
+        return fi.ids_for(SearchFilters.build(**kw)).tolist()
+
+    assert ids(sources=["b.pdf"]) == [1, 5]
+    assert ids(sources=["b.pdf"], page_min=2) == [1]
+    assert ids(sources=["b.pdf"], page_max=2) == [5]
+    assert ids(doc_type="md") == [1]  # c.md has no vector of its own
+    assert ids(sources=["a.pdf"]) == [1, 2]
+    # hits resolve to the canonical chunk's text
+    assert store.get_many([1])[1]["text"] == "disclaimer"
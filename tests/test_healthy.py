@@ -1,4 +1,8 @@
 from fastapi.testclient import TestClient
+
+import app.main as main
+from app.api.routes import health
+from app.core.readiness import Readiness
 from app.main import app
 
 client = TestClient(app)
@@ -8,3 +12,65 @@ def test_health_ok():
     r = client.get("/health")
     assert r.status_code == 200
     assert r.json() == {"status": "ok"}
+
+
+def test_health_live_ok():
+    r = client.get("/health/live")
+    assert r.status_code == 200
+    assert r.json() == {"status": "ok"}
+
+
+def test_health_ready_reports_startup_state():
+    r = client.get("/health/ready")
+    data = r.json()
+    # 503 until the lifespan has loaded and warmed the index
+    assert r.status_code == (200 if data["status"] == "ready" else 503)
+    assert "phases_ms" in data
+
+
+def _fresh_readiness(monkeypatch):
+    r = Readiness()
+    monkeypatch.setattr(main, "readiness", r)
+    monkeypatch.setattr(health, "readiness", r)
+    monkeypatch.setattr(main.settings, "startup_retry_backoff_s", 0.0)
+    return r
+
+
+def test_background_startup_retries_until_ready(monkeypatch):
+    r = _fresh_readiness(monkeypatch)
+    calls = []
+
+    def flaky_startup():
+        calls.append(1)
+        if len(calls) < 3:
+            raise RuntimeError("db not up yet")
+        r.mark_ready()
+
+    monkeypatch.setattr(main, "_startup", flaky_startup)
+    monkeypatch.setattr(main.settings, "startup_retries", 5)
+    main._startup_in_background()
+
+    assert len(calls) == 3
+    snap = r.snapshot()
+    assert snap["status"] == "ready" and snap["failed_attempts"] == 2 and snap["error"] is None
+    assert client.get("/health/live").status_code == 200
+
+
+def test_background_startup_gives_up_and_fails_liveness(monkeypatch):
+    r = _fresh_readiness(monkeypatch)
+    calls = []
+
+    def broken_startup():
+        calls.append(1)
+        raise RuntimeError("Index not found")
+
+    monkeypatch.setattr(main, "_startup", broken_startup)
+    monkeypatch.setattr(main.settings, "startup_retries", 2)
+    main._startup_in_background()
+
+    assert len(calls) == 3
+    assert r.state == "failed"
+    live = client.get("/health/live")
+    assert live.status_code == 503
+    assert "Index not found" in live.json()["error"]
+    assert client.get("/health/ready").status_code == 503
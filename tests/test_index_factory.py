@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+
+from app.retrieval.index_factory import (
+    create_index,
+    index_ids,
+    index_params_from_settings,
+    min_train_vectors,
+    read_index,
+    write_index,
+)
+
+
+def _vectors(n=300, d=32, seed=0):
+    x = np.random.default_rng(seed).standard_normal((n, d)).astype("float32")
+    return x / np.linalg.norm(x, axis=1, keepdims=True)
+
+
+@pytest.mark.parametrize("kind", ["sq_fp16", "sq_int8"])
+def test_scalar_quantizer_round_trip(tmp_path, kind):
+    xb = _vectors()
+    ids = np.arange(300, dtype="int64") * 3 + 7
+    index = create_index(32, index_params_from_settings(kind))
+    assert min_train_vectors(index) == 1
+    if not index.is_trained:
+        index.train(xb)
+    index.add_with_ids(xb, ids)
+    D, I = index.search(xb[:5], 3)
+
+    path = str(tmp_path / "index.faiss")
+    write_index(index, path)
+    for load_mode in ("memory", "mmap"):
+        loaded = read_index(path, load_mode)
+        assert loaded.ntotal == 300
+        np.testing.assert_array_equal(np.sort(index_ids(loaded)), ids)
+        D2, I2 = loaded.search(xb[:5], 3)
+        np.testing.assert_array_equal(I2, I)
+        np.testing.assert_allclose(D2, D, atol=1e-5)
+        # every query finds itself first
+        assert I2[:, 0].tolist() == ids[:5].tolist()
@@ -0,0 +1,19 @@
+from fastapi.testclient import TestClient
+
+from app.core import metrics
+from app.main import app
+
+client = TestClient(app)
+
+
+def test_metrics_endpoint_exposes_retrieval_series():
+    metrics.observe_stages({"db_fetch": 2.0, "total": 5.0})
+    metrics.ABSTENTIONS.labels("no_evidence_empty_search").inc()
+    client.get("/health")
+
+    r = client.get("/metrics")
+    assert r.status_code == 200
+    body = r.text
+    assert 'docassistant_retrieval_stage_seconds_count{stage="db_fetch"}' in body
+    assert 'docassistant_abstentions_total{reason="no_evidence_empty_search"}' in body
+    assert 'docassistant_http_request_seconds_count{method="GET",route="/health",status="200"}' in body
@@ -0,0 +1,35 @@
+import time
+
+from app.retrieval.filters import SearchFilters
+from app.retrieval.query_cache import LRUCache, cache_key
+
+
+def test_cache_key_normalizes_whitespace():
+    assert cache_key("what is  overfitting?\n", "idx1") == cache_key(" what is overfitting?", "idx1")
+
+
+def test_cache_key_changes_with_index():
+    assert cache_key("what is overfitting?", "idx1") != cache_key("what is overfitting?", "idx2")
+
+
+def test_cache_key_changes_with_filters():
+    q = "what is overfitting?"
+    only_a = SearchFilters.build(sources=["a.pdf"])
+    assert cache_key(q, "idx1", only_a) != cache_key(q, "idx1")
+    assert cache_key(q, "idx1", only_a) == cache_key(q, "idx1", SearchFilters.build(sources=["a.pdf", "a.pdf"]))
+    assert SearchFilters.build() is None
+
+
+def test_lru_evicts_oldest_and_expires():
+    lru = LRUCache(max_entries=2, ttl_s=60)
+    lru.set("a", "1")
+    lru.set("b", "2")
+    lru.get("a")  # a is now most recent
+    lru.set("c", "3")
+    assert lru.get("b") is None
+    assert lru.get("a") == "1"
+
+    short = LRUCache(max_entries=2, ttl_s=0.01)
+    short.set("a", "1")
+    time.sleep(0.02)
+    assert short.get("a") is None
@@ -0,0 +1,60 @@
+from app.retrieval import retrieve
+from app.retrieval.retrieve import RetrievalParams, run_retrieval, run_retrieval_batch
+
+PARAMS = RetrievalParams(
+    search_candidates_k=4,
+    max_citations=2,
+    min_top_score=0.5,
+    min_top_score_margin=0.05,
+    min_row_score=0.4,
+    min_score_gap=0.02,
+)
+
+# query -> (faiss_ids, scores)
+CANDIDATES = {
+    "strong": ([1, 2, 3, 4], [0.9, 0.8, 0.45, 0.3]),
+    "weak": ([5, 6], [0.3, 0.2]),
+    "flat": ([7, 8], [0.52, 0.515]),
+    "empty": ([], []),
+}
+
+# 1 and 2 share (source, page): dedupe keeps 1
+CHUNKS = {
+    1: {"faiss_id": 1, "chunk_id": 1, "text": "a", "page": 1, "source": "x.pdf"},
+    2: {"faiss_id": 2, "chunk_id": 2, "text": "b", "page": 1, "source": "x.pdf"},
+    3: {"faiss_id": 3, "chunk_id": 3, "text": "c", "page": 2, "source": "x.pdf"},
+    4: {"faiss_id": 4, "chunk_id": 4, "text": "d", "page": 3, "source": "y.pdf"},
+}
+
+
+def _patch(monkeypatch, fetch_calls):
+    def fake_fetch(ids, model_name):
+        fetch_calls.append(sorted(ids))
+        return {i: CHUNKS[i] for i in ids if i in CHUNKS}
+
+    monkeypatch.setattr(retrieve, "search", lambda q, k, filters=None: CANDIDATES[q])
+    monkeypatch.setattr(retrieve, "search_batch", lambda qs, k, filters=None: [CANDIDATES[q] for q in qs])
+    monkeypatch.setattr(retrieve, "fetch_chunk_map_by_faiss_ids", fake_fetch)
+    monkeypatch.setattr(retrieve.settings, "retrieval_mode", "db")
+
+
+def test_batch_matches_single_query_results(monkeypatch):
+    fetch_calls = []
+    _patch(monkeypatch, fetch_calls)
+    queries = list(CANDIDATES)
+
+    single = [run_retrieval(q, PARAMS)[0] for q in queries]
+    fetch_calls.clear()
+    batch, timings = run_retrieval_batch(queries, PARAMS)
+
+    assert [rows for rows, _ in batch] == single
+    assert [r["chunk_id"] for r in single[0]] == [1, 3]
+    assert single[1] == single[2] == single[3] == []
+    # one DB round-trip, only for the queries that didn't abstain
+    assert fetch_calls == [[1, 2, 3, 4]]
+    assert timings["total"] >= timings["search_total"]
+
+
+def test_batch_of_nothing(monkeypatch):
+    _patch(monkeypatch, [])
+    assert run_retrieval_batch([], PARAMS)[0] == []
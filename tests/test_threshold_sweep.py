@@ -0,0 +1,30 @@
+from app.eval.threshold_sweep import _floats, _pareto
+
+
+def _row(recall, ne_acc, mrr=0.5, **kw):
+    return {"recall_at_k": recall, "no_evidence_accuracy": ne_acc, "mrr": mrr, **kw}
+
+
+def test_pareto_keeps_only_non_dominated():
+    a = _row(0.9, 0.5, name="a")
+    b = _row(0.8, 0.8, name="b")
+    c = _row(0.7, 0.7, name="c")  # dominated by b
+    d = _row(0.5, 0.9, name="d")
+    assert [r["name"] for r in _pareto([a, b, c, d])] == ["a", "b", "d"]
+
+
+def test_floats_accepts_none():
+    assert _floats(["0.3", "none", "None"]) == [0.3, None, None]
+
+
+def test_pareto_ignores_mrr_except_between_equal_points():
+    a = _row(0.8, 0.8, mrr=0.6, name="a")
+    b = _row(0.8, 0.8, mrr=0.4, name="b")  # same point as a, worse MRR
+    c = _row(0.7, 0.7, mrr=0.9, name="c")  # dominated by a despite the MRR
+    assert [r["name"] for r in _pareto([b, c, a])] == ["a"]
+
+
+def test_pareto_collapses_identical_metrics():
+    rows = [_row(0.9, 0.5, name="a"), _row(0.9, 0.5, name="a2"), _row(0.5, 0.9, name="b")]
+    front = _pareto(rows)
+    assert [(r["name"], r["equivalent"]) for r in front] == [("a", 1), ("b", 0)]